@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from aiohttp import web
+
+# --- API FALSA DO MENOR PREÇO (PARA BENCHMARK E TESTES LOCAIS) ---
+# Imita o GET /api/v1/produtos: mesmos parâmetros (termo, local, raio, offset), páginas de 50
+# notas e o mesmo formato de `produtos` + `estabelecimento`. Os resultados são determinísticos
+# para cada (termo, geohash): geohashes vizinhos e variações do mesmo produto devolvem notas
+# em comum, como na API real. Latência, limite de req/s (429), timeouts e tamanho dos resultados
+# são configuráveis.
+#
+# Rodar sozinha:  python tasks_python/bronze/api_falsa.py  (e apontar a extração para a URL impressa)
+
+PORTA = int(os.getenv("API_FALSA_PORTA", "8770"))
+LATENCIA_MS = os.getenv("API_FALSA_LATENCIA_MS", "20-120")      # faixa sorteada por requisição
+LIMITE_RPS = float(os.getenv("API_FALSA_LIMITE_RPS", "0"))      # acima disso (req/s, janela de 1s) responde 429; 0 = sem limite
+PROB_429 = float(os.getenv("API_FALSA_PROB_429", "0.0"))        # fração que leva 429 mesmo abaixo do limite
+PROB_TIMEOUT = float(os.getenv("API_FALSA_PROB_TIMEOUT", "0.0"))  # fração que demora mais que o timeout do cliente
+ATRASO_TIMEOUT = float(os.getenv("API_FALSA_ATRASO_TIMEOUT", "25"))  # segundos "pendurados" nesses casos
+MAX_NOTAS = int(os.getenv("API_FALSA_MAX_NOTAS", "500"))        # teto de notas de uma busca (a real para em 500)
+
+TAMANHO_PAGINA = 50
+MUNICIPIOS_FALSOS = ["CURITIBA", "LONDRINA", "MARINGA", "CASCAVEL", "PONTA GROSSA", "FOZ DO IGUACU"]
+SUFIXOS_DESC = ["", "PCT", "UN", "TRAD"]
+BAIRROS_FALSOS = ["CENTRO", "BATEL", "AGUA VERDE", "PORTAO", "BOQUEIRAO", "CAJURU", "SITIO CERCADO"]
+
+
+def _semente(*partes):
+    return int(hashlib.md5("|".join(partes).encode()).hexdigest()[:12], 16)
+
+
+def _faixa_latencia(texto):
+    minimo, _, maximo = texto.partition("-")
+    return float(minimo) / 1000, float(maximo or minimo) / 1000
+
+
+class ApiFalsa:
+    """
+    Servidor aiohttp numa thread própria. `iniciar()` devolve a URL do endpoint de produtos.
+
+    Quantidade de notas de uma busca: sorteada de forma estável a partir do produto (primeira
+    palavra do termo) e da região (4 primeiros caracteres do geohash, ~20 km), com cauda longa:
+    a maioria das buscas traz poucas páginas e algumas batem no teto.
+    """
+
+    def __init__(self, porta=PORTA, latencia_ms=LATENCIA_MS, limite_rps=LIMITE_RPS, prob_429=PROB_429,
+                 prob_timeout=PROB_TIMEOUT, atraso_timeout=ATRASO_TIMEOUT, max_notas=MAX_NOTAS):
+        self.porta = porta
+        self.latencia = _faixa_latencia(latencia_ms)
+        self.limite_rps = limite_rps
+        self.prob_429 = prob_429
+        self.prob_timeout = prob_timeout
+        self.atraso_timeout = atraso_timeout
+        self.max_notas = max_notas
+
+        self.requisicoes = 0
+        self.respostas_429 = 0
+        self.timeouts = 0
+        self._chegadas = deque()
+        self._loop = None
+        self._pronto = threading.Event()
+        # As mesmas notas aparecem em várias variações/geohashes: gera cada uma uma vez só
+        self._nota = lru_cache(maxsize=200_000)(self._gerar_nota)
+
+    def _total_notas(self, produto, regiao):
+        sorteio = random.Random(_semente(produto, regiao))
+        return min(self.max_notas, int(sorteio.paretovariate(1.2) * 25) - 25)
+
+    def _acima_do_limite(self):
+        if not self.limite_rps:
+            return False
+        agora = time.monotonic()
+        self._chegadas.append(agora)
+        while agora - self._chegadas[0] > 1.0:
+            self._chegadas.popleft()
+        return len(self._chegadas) > self.limite_rps
+
+    def _gerar_nota(self, produto, regiao, indice):
+        """Campos da nota já em JSON, sem o `{` inicial e sem o `desc` (que depende do termo buscado)."""
+        sorteio = random.Random(_semente(produto, regiao, str(indice)))
+        loja = sorteio.randrange(40)
+        valor = round(sorteio.uniform(2, 40), 2)
+        return json.dumps({
+            "id": f"{_semente(produto, regiao, str(indice)):x}",
+            "valor": f"{valor:.2f}",
+            "valor_desconto": f"{valor * sorteio.choice([1, 1, 0.9]):.2f}",
+            "valor_tabela": f"{valor:.2f}",
+            "datahora": f"2026-10-{sorteio.randint(1, 28):02d}T{sorteio.randint(7, 22):02d}:{sorteio.randint(0, 59):02d}:00.000Z",
+            "distkm": round(sorteio.uniform(0, 20), 2),
+            "gtin": str(7890000000000 + _semente(produto) % 100000),
+            "ncm": "10063021",
+            "estabelecimento": {
+                "codigo": _semente(regiao, str(loja)) % 10**8,
+                "cnpj": f"{_semente(regiao, str(loja)) % 10**14:014d}",
+                "nm_emp": f"SUPERMERCADO {regiao.upper()} {loja} LTDA",
+                "nm_fan": f"MERCADO {loja}",
+                "tp_logr": "RUA",
+                "nm_logr": f"DAS FLORES {loja}",
+                "nr_logr": str(10 + loja * 7),
+                "complemento": "",
+                "bairro": BAIRROS_FALSOS[loja % len(BAIRROS_FALSOS)],
+                "mun": MUNICIPIOS_FALSOS[_semente(regiao) % len(MUNICIPIOS_FALSOS)],
+                "uf": "PR",
+            },
+        }, ensure_ascii=False)[1:]
+
+    async def _produtos(self, request):
+        self.requisicoes += 1
+        await asyncio.sleep(random.uniform(*self.latencia))
+
+        sorteio = random.random()
+        if self._acima_do_limite() or sorteio < self.prob_429:
+            self.respostas_429 += 1
+            return web.json_response({"erro": "Too Many Requests"}, status=429, headers={"Retry-After": "1"})
+        if sorteio < self.prob_429 + self.prob_timeout:
+            self.timeouts += 1
+            await asyncio.sleep(self.atraso_timeout)
+
+        termo = request.query.get("termo", "").upper()
+        geohash = request.query.get("local", "")
+        offset = int(request.query.get("offset", "0"))
+        produto, regiao = (termo.split() or [""])[0], geohash[:4]
+
+        total = self._total_notas(produto, regiao)
+        fim = min(total, offset + TAMANHO_PAGINA)
+        produtos = ",".join(
+            f'{{"desc": {json.dumps(f"{termo} {SUFIXOS_DESC[i % len(SUFIXOS_DESC)]}".strip())}, {self._nota(produto, regiao, i)}'
+            for i in range(offset, fim)
+        )
+        corpo = f'{{"tempo": 12, "total": {total}, "produtos": [{produtos}]}}'
+        return web.Response(text=corpo, content_type="application/json")
+
+    def _servir(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_get("/api/v1/produtos", self._produtos)
+        runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(runner.setup())
+        self._loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", self.porta).start())
+        self._pronto.set()
+        self._loop.run_forever()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.porta}/api/v1/produtos"
+
+    def iniciar(self):
+        threading.Thread(target=self._servir, name="api-falsa", daemon=True).start()
+        self._pronto.wait(10)
+        return self.url
+
+    def parar(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def main():
+    api = ApiFalsa()
+    print(f"🧪 API falsa do Menor Preço em {api.iniciar()}", flush=True)
+    print(f"   latência {LATENCIA_MS} ms | limite {LIMITE_RPS or '∞'} req/s | 429 extra: {PROB_429:.0%} | timeout: {PROB_TIMEOUT:.0%} | até {MAX_NOTAS} notas por busca", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        api.parar()
+
+
+if __name__ == "__main__":
+    main()
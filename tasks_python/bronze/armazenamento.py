@@ -0,0 +1,340 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+# --- CAMADA DE ARMAZENAMENTO ---
+# Antes o script fazia `if STORAGE_PROVIDER == "minio" ... else azure` em cada ponto que
+# tocava a nuvem e importava os dois SDKs logo no início (mesmo usando só um).
+# Agora cada destino é uma classe com a mesma cara (enviar / ler / listar / apagar) e o SDK
+# só é importado quando o backend escolhido é criado. Além de Azure e MinIO existem:
+#   - 'local':   pastas no disco com o mesmo layout Hive (ano_hive=/mes_hive=/dia_hive=)
+#   - 'memoria': um dict no processo, para testes e benchmarks sem nenhum serviço de nuvem
+
+load_dotenv()
+
+log = logging.getLogger("bronze")
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+
+CONTAINER_PADRAO = "bronze"
+# Raiz do backend local: cada container vira uma subpasta (lake/bronze/menor_preco/ano_hive=...)
+DIRETORIO_LAKE_LOCAL = os.getenv("DIRETORIO_LAKE_LOCAL", os.path.join(RAIZ_PROJETO, "lake"))
+
+# Lotes maiores que uma parte sobem em partes/blocos paralelos (multipart no MinIO, block blob na Azure)
+TAMANHO_PARTE_UPLOAD = max(5, int(os.getenv("TAMANHO_PARTE_UPLOAD_MB", "8"))) * 1024 * 1024 # S3 exige >= 5MB
+CONCORRENCIA_UPLOAD = int(os.getenv("CONCORRENCIA_UPLOAD", "4"))
+
+
+def enviar_partes_em_paralelo(pendentes, enviar_parte, concluidas):
+    """
+    Sobe as partes pendentes em paralelo e anota cada uma que deu certo em `concluidas`.
+    Se alguma falhar, as que subiram continuam anotadas e a próxima tentativa só reenvia o resto.
+    """
+    erro = None
+    with ThreadPoolExecutor(max_workers=CONCORRENCIA_UPLOAD) as pool:
+        futuros = {pool.submit(enviar_parte, numero, inicio): numero for numero, inicio in pendentes}
+        for futuro in as_completed(futuros):
+            try:
+                concluidas[futuros[futuro]] = futuro.result()
+            except Exception as e:
+                erro = erro or e
+    if erro:
+        raise erro
+
+
+class Armazenamento:
+    """
+    Interface comum dos destinos. Os caminhos são sempre relativos ao container/bucket,
+    com '/' como separador (ex: 'menor_preco/ano_hive=2026/mes_hive=10/dia_hive=17/x.parquet').
+
+    - `enviar(dados, caminho, progresso)` grava os bytes; `progresso` é um dict que sobrevive entre
+      as tentativas do chamador para retomar uploads em partes.
+    - `cancelar(caminho, progresso)` limpa o que ficou pela metade depois da última tentativa.
+    """
+
+    nome = ""
+    destino = ""  # usado nas mensagens: "salvo {destino}"
+
+    def __init__(self, container=CONTAINER_PADRAO):
+        self.container = container
+
+    def testar_conexao(self):
+        return True
+
+    def enviar(self, dados, caminho, progresso=None):
+        raise NotImplementedError
+
+    def cancelar(self, caminho, progresso):
+        pass
+
+    def ler(self, caminho):
+        raise NotImplementedError
+
+    def listar(self, prefixo=""):
+        """Caminhos (ordenados) que começam com `prefixo`."""
+        raise NotImplementedError
+
+    def apagar(self, caminho):
+        raise NotImplementedError
+
+    def fonte_scan(self, caminhos):
+        """
+        (uris, storage_options) para o `pl.scan_parquet` ler os arquivos direto do destino, com
+        projeção e filtros empurrados para o leitor. None quando o backend não tem URI (memória).
+        """
+        return None
+
+
+class ArmazenamentoAzure(Armazenamento):
+    nome = "azure"
+    destino = "na AZURE"
+
+    def __init__(self, container=CONTAINER_PADRAO, connection_string=None):
+        super().__init__(container)
+        from azure.storage.blob import BlobServiceClient
+
+        self.connection_string = connection_string or os.getenv("AZURE_CONNECTION_STRING")
+        # Um cliente por execução (com pool de conexões), reaproveitado em todos os lotes
+        self.cliente = BlobServiceClient.from_connection_string(self.connection_string)
+        self.container_client = self.cliente.get_container_client(container)
+
+    def testar_conexao(self):
+        log.info("☁️  Testando conexão com a Azure Blob Storage...")
+        try:
+            if not self.container_client.exists():
+                log.error(f"❌ Erro Azure: O container '{self.container}' não existe.")
+                return False
+            log.info("✅ Conexão Azure OK!")
+            return True
+        except Exception as e:
+            log.error(f"❌ Erro ao conectar na Azure: {e}")
+            return False
+
+    def enviar(self, dados, caminho, progresso=None):
+        from azure.storage.blob import BlobBlock
+
+        progresso = {} if progresso is None else progresso
+        blob_client = self.container_client.get_blob_client(caminho)
+        if len(dados) <= TAMANHO_PARTE_UPLOAD:
+            blob_client.upload_blob(dados, overwrite=True)
+            return
+
+        # Block blob: cada bloco fica "staged" na Azure, então a nova tentativa só manda os que faltam
+        blocos = progresso.setdefault("blocos", {})
+
+        def enviar_bloco(numero, inicio):
+            id_bloco = f"bloco-{numero:06d}"
+            blob_client.stage_block(block_id=id_bloco, data=dados[inicio:inicio + TAMANHO_PARTE_UPLOAD])
+            return id_bloco
+
+        offsets = list(enumerate(range(0, len(dados), TAMANHO_PARTE_UPLOAD), start=1))
+        enviar_partes_em_paralelo([(n, ini) for n, ini in offsets if n not in blocos], enviar_bloco, blocos)
+        blob_client.commit_block_list([BlobBlock(block_id=blocos[n]) for n, _ in offsets])
+
+    def ler(self, caminho):
+        return self.container_client.download_blob(caminho).readall()
+
+    def listar(self, prefixo=""):
+        return sorted(b.name for b in self.container_client.list_blobs(name_starts_with=prefixo or None))
+
+    def apagar(self, caminho):
+        self.container_client.delete_blob(caminho)
+
+    def fonte_scan(self, caminhos):
+        # O leitor do Polars não aceita a connection string: usa só o nome e a chave da conta
+        partes = dict(p.split("=", 1) for p in self.connection_string.split(";") if "=" in p)
+        opcoes = {"account_name": partes.get("AccountName"), "account_key": partes.get("AccountKey")}
+        return [f"az://{self.container}/{c}" for c in caminhos], opcoes
+
+
+class ArmazenamentoMinio(Armazenamento):
+    nome = "minio"
+    destino = "no MINIO"
+
+    def __init__(self, container=CONTAINER_PADRAO, endpoint=None, access_key=None, secret_key=None):
+        super().__init__(container)
+        import boto3
+        from botocore.config import Config
+
+        self.endpoint = endpoint or os.getenv("MINIO_ENDPOINT")
+        self.access_key = access_key or os.getenv("MINIO_ACCESS_KEY")
+        self.secret_key = secret_key or os.getenv("MINIO_SECRET_KEY")
+        self.cliente = boto3.client(
+            's3',
+            endpoint_url=self.endpoint,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            config=Config(max_pool_connections=CONCORRENCIA_UPLOAD * 2),
+        )
+
+    def testar_conexao(self):
+        log.info("🪣  Testando conexão com o MinIO...")
+        try:
+            self.cliente.head_bucket(Bucket=self.container)
+            log.info("✅ Conexão MinIO OK!")
+            return True
+        except Exception as e:
+            log.error(f"❌ Erro MinIO: {e}")
+            return False
+
+    def enviar(self, dados, caminho, progresso=None):
+        progresso = {} if progresso is None else progresso
+        if len(dados) <= TAMANHO_PARTE_UPLOAD:
+            self.cliente.put_object(Bucket=self.container, Key=caminho, Body=dados)
+            return
+
+        # Multipart: o upload_id e as partes já enviadas ficam em `progresso` entre as tentativas
+        if "upload_id" not in progresso:
+            progresso["upload_id"] = self.cliente.create_multipart_upload(Bucket=self.container, Key=caminho)["UploadId"]
+            progresso["partes"] = {}
+        upload_id, partes = progresso["upload_id"], progresso["partes"]
+
+        def enviar_parte(numero, inicio):
+            resposta = self.cliente.upload_part(
+                Bucket=self.container, Key=caminho, UploadId=upload_id, PartNumber=numero,
+                Body=dados[inicio:inicio + TAMANHO_PARTE_UPLOAD]
+            )
+            return resposta["ETag"]
+
+        offsets = enumerate(range(0, len(dados), TAMANHO_PARTE_UPLOAD), start=1)
+        enviar_partes_em_paralelo([(n, ini) for n, ini in offsets if n not in partes], enviar_parte, partes)
+        self.cliente.complete_multipart_upload(
+            Bucket=self.container, Key=caminho, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": partes[n]} for n in sorted(partes)]}
+        )
+
+    def cancelar(self, caminho, progresso):
+        # Evita deixar partes órfãs ocupando espaço no bucket
+        if "upload_id" in progresso:
+            try:
+                self.cliente.abort_multipart_upload(Bucket=self.container, Key=caminho, UploadId=progresso["upload_id"])
+            except Exception:
+                pass
+
+    def ler(self, caminho):
+        return self.cliente.get_object(Bucket=self.container, Key=caminho)["Body"].read()
+
+    def listar(self, prefixo=""):
+        caminhos = []
+        paginador = self.cliente.get_paginator("list_objects_v2")
+        for pagina in paginador.paginate(Bucket=self.container, Prefix=prefixo):
+            caminhos.extend(obj["Key"] for obj in pagina.get("Contents", []))
+        return sorted(caminhos)
+
+    def apagar(self, caminho):
+        self.cliente.delete_object(Bucket=self.container, Key=caminho)
+
+    def fonte_scan(self, caminhos):
+        opcoes = {
+            "aws_endpoint_url": self.endpoint,
+            "aws_access_key_id": self.access_key,
+            "aws_secret_access_key": self.secret_key,
+            "aws_region": "us-east-1",  # o MinIO ignora, mas o leitor exige uma região
+            "aws_allow_http": str(str(self.endpoint).startswith("http://")).lower(),
+        }
+        return [f"s3://{self.container}/{c}" for c in caminhos], opcoes
+
+
+class ArmazenamentoLocal(Armazenamento):
+    nome = "local"
+    destino = "no DISCO LOCAL"
+
+    def __init__(self, container=CONTAINER_PADRAO, raiz=None):
+        super().__init__(container)
+        self.raiz = os.path.join(raiz or DIRETORIO_LAKE_LOCAL, container)
+
+    def _arquivo(self, caminho):
+        return os.path.join(self.raiz, *caminho.split("/"))
+
+    def testar_conexao(self):
+        log.info(f"💾 Usando o disco local: {self.raiz}")
+        try:
+            os.makedirs(self.raiz, exist_ok=True)
+            log.info("✅ Pasta local OK!")
+            return True
+        except OSError as e:
+            log.error(f"❌ Erro na pasta local: {e}")
+            return False
+
+    def enviar(self, dados, caminho, progresso=None):
+        arquivo = self._arquivo(caminho)
+        os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+        # Grava num temporário e renomeia: quem lê a pasta nunca vê um Parquet pela metade
+        temporario = f"{arquivo}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(temporario, "wb") as f:
+            f.write(dados)
+        os.replace(temporario, arquivo)
+
+    def ler(self, caminho):
+        with open(self._arquivo(caminho), "rb") as f:
+            return f.read()
+
+    def listar(self, prefixo=""):
+        caminhos = []
+        for pasta, _, arquivos in os.walk(self.raiz):
+            for nome in arquivos:
+                if ".tmp-" in nome:
+                    continue
+                relativo = os.path.relpath(os.path.join(pasta, nome), self.raiz).replace(os.sep, "/")
+                if relativo.startswith(prefixo):
+                    caminhos.append(relativo)
+        return sorted(caminhos)
+
+    def apagar(self, caminho):
+        os.remove(self._arquivo(caminho))
+
+    def fonte_scan(self, caminhos):
+        return [self._arquivo(c) for c in caminhos], None
+
+
+class ArmazenamentoMemoria(Armazenamento):
+    nome = "memoria"
+    destino = "na MEMÓRIA"
+
+    def __init__(self, container=CONTAINER_PADRAO):
+        super().__init__(container)
+        self.objetos = {}
+        self._trava = threading.Lock()
+
+    def enviar(self, dados, caminho, progresso=None):
+        with self._trava:
+            self.objetos[caminho] = bytes(dados)
+
+    def ler(self, caminho):
+        with self._trava:
+            return self.objetos[caminho]
+
+    def listar(self, prefixo=""):
+        with self._trava:
+            return sorted(c for c in self.objetos if c.startswith(prefixo))
+
+    def apagar(self, caminho):
+        with self._trava:
+            del self.objetos[caminho]
+
+
+BACKENDS = {
+    "azure": ArmazenamentoAzure,
+    "minio": ArmazenamentoMinio,
+    "local": ArmazenamentoLocal,
+    "memoria": ArmazenamentoMemoria,
+}
+
+# Um backend por (provedor, container) por processo: clientes e pools de conexão são reaproveitados
+_instancias = {}
+_trava_instancias = threading.Lock()
+
+
+def obter_armazenamento(provedor=None, container=CONTAINER_PADRAO):
+    """Backend do `provedor` (padrão: STORAGE_PROVIDER do .env, ou 'azure' se não houver)."""
+    provedor = (provedor or os.getenv("STORAGE_PROVIDER") or "azure").lower()
+    if provedor not in BACKENDS:
+        raise ValueError(f"STORAGE_PROVIDER desconhecido: '{provedor}'. Use um de: {', '.join(BACKENDS)}")
+    with _trava_instancias:
+        chave = (provedor, container)
+        if chave not in _instancias:
+            _instancias[chave] = BACKENDS[provedor](container)
+        return _instancias[chave]
@@ -0,0 +1,235 @@
+import heapq
+import json
+import os
+import statistics
+import threading
+from datetime import datetime
+import polars as pl
+from trava_arquivo import travar, gravar_parquet
+
+# --- FATIAS BALANCEADAS PELO CUSTO HISTÓRICO ---
+# O fatiamento cortava a lista de geohashes em 7 pedaços com o mesmo número de linhas. Só que a
+# região de Curitiba devolve muito mais páginas que o interior: alguns dias demoravam várias vezes
+# mais que outros e chegavam a estourar o timeout do job.
+# Aqui cada execução grava o custo de cada geohash (buscas, requisições, notas e o tempo de parede
+# proporcional às requisições), suavizado entre execuções. Com esse histórico, as 7 fatias são
+# montadas por LPT (longest processing time first): do geohash mais caro para o mais barato, cada
+# um vai para a fatia mais leve até ali. O plano fica salvo e vale a semana inteira (ISO), para
+# nenhum geohash ser pulado ou feito duas vezes se os custos mudarem no meio da semana: um plano
+# novo só é adotado (ou trocado) na fatia 1. Se a semana começou sem plano (primeira execução no
+# meio da semana, estado perdido, histórico ainda curto), as outras fatias continuam com o que
+# havia (o plano salvo de uma semana anterior ou as fatias iguais) até a próxima fatia 1.
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+ARQUIVO_CUSTOS = os.path.join(DIRETORIO_ESTADO, "custos_geohash.parquet")
+ARQUIVO_PLANO = os.path.join(DIRETORIO_ESTADO, "plano_fatias.json")
+
+QTD_FATIAS = 7
+PESO_EXECUCAO_NOVA = 0.5  # média móvel exponencial: metade execução nova, metade histórico
+PAGINAS_MAXIMAS = 10
+# Só troca as fatias iguais pelo plano quando o histórico cobre quase todos os geohashes
+# (na prática depois da primeira semana completa com o corte antigo)
+COBERTURA_MINIMA = 0.9
+
+
+def requisicoes_estimadas(qtd_notas):
+    """Requisições de uma busca: uma por página de 50 (e a última, vazia ou incompleta), até 10."""
+    return min(PAGINAS_MAXIMAS, qtd_notas // 50 + 1)
+
+
+class CustosGeohash:
+    """
+    Custo histórico por geohash. `registrar` acumula as buscas da execução e `salvar(segundos)`
+    distribui o tempo de extração entre os geohashes pela fração de requisições de cada um e
+    mistura com o histórico.
+    """
+
+    def __init__(self, caminho=ARQUIVO_CUSTOS):
+        self.caminho = caminho
+        self._execucao = {}
+        self._trava = threading.Lock()
+        self.historico = pl.read_parquet(caminho) if os.path.exists(caminho) else None
+
+    def registrar(self, tarefa_info, qtd_notas):
+        geohash = tarefa_info[1]
+        with self._trava:
+            custo = self._execucao.setdefault(geohash, {"buscas": 0, "requisicoes": 0, "notas": 0, "no_limite": 0})
+            custo["buscas"] += 1
+            custo["requisicoes"] += requisicoes_estimadas(qtd_notas)
+            custo["notas"] += qtd_notas
+            custo["no_limite"] += int(qtd_notas >= PAGINAS_MAXIMAS * 50)
+
+    def por_geohash(self):
+        """{geohash: segundos estimados} do histórico."""
+        if self.historico is None:
+            return {}
+        return dict(zip(self.historico.get_column("geohash").to_list(), self.historico.get_column("segundos").to_list()))
+
+    def fixos_cobertura(self, geohashes):
+        """
+        Geohashes que o planejador de cobertura não pode tirar nem usar para cobrir vizinhos: sem
+        histórico, ou com alguma busca que já bateu o teto da API (10 páginas de 50 notas).
+        """
+        if self.historico is None or "no_limite" not in self.historico.columns:
+            return set(geohashes)
+        no_limite = dict(zip(self.historico.get_column("geohash").to_list(), self.historico.get_column("no_limite").to_list()))
+        return {g for g in geohashes if no_limite.get(g) is None or no_limite[g] > 0}
+
+    def salvar(self, segundos_extracao):
+        with self._trava:
+            execucao, self._execucao = self._execucao, {}
+        total_requisicoes = sum(c["requisicoes"] for c in execucao.values())
+        if not total_requisicoes:
+            return 0
+
+        hoje = datetime.now().strftime("%Y-%m-%d")
+        df_novo = pl.DataFrame([
+            {"geohash": g, **c, "segundos": segundos_extracao * c["requisicoes"] / total_requisicoes, "atualizado_em": hoje}
+            for g, c in execucao.items()
+        ]).with_columns(pl.col(["buscas", "requisicoes", "notas", "no_limite"]).cast(pl.Float64))
+
+        # Mistura com o histórico do disco, não o lido no começo: outro worker pode ter gravado no meio
+        with travar(self.caminho):
+            historico = pl.read_parquet(self.caminho) if os.path.exists(self.caminho) else None
+            if historico is not None:
+                colunas = ["buscas", "requisicoes", "notas", "no_limite", "segundos"]
+                if "no_limite" not in historico.columns:  # histórico de antes da contagem: desconhecido
+                    historico = historico.with_columns(pl.lit(None, dtype=pl.Float64).alias("no_limite"))
+                df_novo = (
+                    df_novo.join(historico, on="geohash", how="full", coalesce=True, suffix="_antigo")
+                    .with_columns([
+                        pl.when(pl.col(c).is_null()).then(pl.col(f"{c}_antigo"))
+                        .when(pl.col(f"{c}_antigo").is_null()).then(pl.col(c))
+                        .otherwise(PESO_EXECUCAO_NOVA * pl.col(c) + (1 - PESO_EXECUCAO_NOVA) * pl.col(f"{c}_antigo"))
+                        .alias(c)
+                        for c in colunas
+                    ] + [pl.coalesce("atualizado_em", "atualizado_em_antigo").alias("atualizado_em")])
+                    .select(["geohash", *colunas, "atualizado_em"])
+                )
+            gravar_parquet(df_novo.sort("geohash"), self.caminho, compression="zstd")
+        self.historico = df_novo
+        return len(execucao)
+
+
+def balancear_lpt(cidades, custos, qtd_fatias=QTD_FATIAS):
+    """
+    Distribui as cidades (dicts com nome e geohash) em `qtd_fatias` fatias por LPT.
+    Geohash sem histórico entra com a mediana dos custos conhecidos.
+    Retorna a lista de fatias: {"cidades": [...], "segundos_estimados": float}.
+    """
+    conhecidos = [custos[c["geohash"]] for c in cidades if c["geohash"] in custos]
+    padrao = statistics.median(conhecidos) if conhecidos else 1.0
+    custo = lambda c: custos.get(c["geohash"], padrao)
+
+    fatias = [{"cidades": [], "segundos_estimados": 0.0} for _ in range(qtd_fatias)]
+    carga = [(0.0, i) for i in range(qtd_fatias)]
+    # Empate no custo: ordem do CSV, para o plano sair igual com o mesmo histórico
+    for _, cidade in sorted(enumerate(cidades), key=lambda p: (-custo(p[1]), p[0])):
+        total, i = heapq.heappop(carga)
+        fatias[i]["cidades"].append(cidade)
+        fatias[i]["segundos_estimados"] += custo(cidade)
+        heapq.heappush(carga, (total + custo(cidade), i))
+    return fatias
+
+
+def semana_iso(data):
+    ano, semana, _ = data.isocalendar()
+    return f"{ano}-W{semana:02d}"
+
+
+def carregar_ou_planejar(cidades, custos, fatia, caminho=ARQUIVO_PLANO, hoje=None, refazer=False):
+    """
+    Plano para a fatia (1 a 7) de hoje. Na fatia 1 (ou com `refazer`) recalcula pelos custos e
+    salva; nas outras reaproveita o plano salvo, mesmo de outra semana, desde que seja das
+    mesmas cidades. Na fatia 1 sem histórico de COBERTURA_MINIMA dos geohashes, o plano salvo
+    (se houver) continua valendo. Retorna None para usar as fatias iguais.
+    """
+    hoje = hoje or datetime.now()
+    geohashes = sorted(c["geohash"] for c in cidades)
+
+    salvo = None
+    if os.path.exists(caminho):
+        with open(caminho) as f:
+            salvo = json.load(f)
+        if salvo.get("geohashes") != geohashes:
+            salvo = None
+    if salvo is not None and not refazer and (fatia != 1 or salvo.get("semana") == semana_iso(hoje)):
+        return salvo
+    if fatia != 1 and not refazer:
+        return None
+
+    custos_por_geohash = custos.por_geohash()
+    com_historico = sum(1 for g in geohashes if g in custos_por_geohash)
+    if not geohashes or com_historico / len(geohashes) < COBERTURA_MINIMA:
+        # Sem histórico para um plano novo: a semana segue com o que havia (plano antigo ou iguais)
+        return salvo
+
+    fatias = balancear_lpt(cidades, custos_por_geohash)
+    plano = {
+        "semana": semana_iso(hoje),
+        "gerado_em": hoje.isoformat(timespec="seconds"),
+        "geohashes": geohashes,
+        "fatias": [
+            {"fatia": i + 1, "segundos_estimados": round(f["segundos_estimados"], 1), "cidades": f["cidades"]}
+            for i, f in enumerate(fatias)
+        ],
+    }
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w") as f:
+        json.dump(plano, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+    return plano
+
+
+def relatorio_plano(plano):
+    tempos = [f["segundos_estimados"] for f in plano["fatias"]]
+    media = sum(tempos) / len(tempos) if tempos else 0
+    linhas = [f"⚖️  Fatias balanceadas pelo custo histórico (semana {plano['semana']}):"]
+    for f in plano["fatias"]:
+        linhas.append(f"   fatia {f['fatia']}: {len(f['cidades']):>3} geohashes, ~{f['segundos_estimados'] / 60:.1f} min")
+    if media:
+        linhas.append(f"   maior fatia {max(tempos) / media:.2f}x a média (~{media / 60:.1f} min)")
+    return "\n".join(linhas)
+
+
+def relatorio_fatias_iguais(cidades, custos, qtd_fatias=QTD_FATIAS):
+    """Tempo estimado das 7 fatias de tamanho igual (o corte antigo), para comparar com o plano."""
+    custos_por_geohash = custos.por_geohash()
+    conhecidos = list(custos_por_geohash.values())
+    padrao = statistics.median(conhecidos) if conhecidos else 1.0
+    tamanho = -(-len(cidades) // qtd_fatias)
+    tempos = [sum(custos_por_geohash.get(c["geohash"], padrao) for c in cidades[i * tamanho:(i + 1) * tamanho])
+              for i in range(qtd_fatias)]
+    media = sum(tempos) / len(tempos) if tempos else 0
+    return (f"📏 Fatias iguais: " + ", ".join(f"{t / 60:.1f}" for t in tempos) + " min"
+            + (f" (maior {max(tempos) / media:.2f}x a média)" if media else ""))
+
+
+def main():
+    import sys
+    from planejador_cobertura import planejar_cobertura, ARQUIVO_GEOHASHES
+
+    df_geos = pl.read_csv(ARQUIVO_GEOHASHES)
+    custos = CustosGeohash()
+    if os.getenv("PLANEJAR_COBERTURA", "0") == "1":
+        municipios = df_geos.select(["nome", "geohash", "latitude", "longitude"]).to_dicts()
+        fixos = custos.fixos_cobertura(m["geohash"] for m in municipios)
+        cidades = [{"nome": c["nome"], "geohash": c["geohash"]} for c in planejar_cobertura(municipios, fixos=fixos)]
+    else:
+        cidades = df_geos.select(["nome", "geohash"]).to_dicts()
+
+    fatia = int(os.getenv("FATIA") or datetime.now().weekday() + 1)
+    plano = carregar_ou_planejar(cidades, custos, fatia, refazer="--refazer" in sys.argv)
+    if plano is None:
+        print(f"⚠️ Sem plano para a fatia {fatia}: o corte em fatias iguais vale até a próxima fatia 1 com custos "
+              f"históricos de {COBERTURA_MINIMA:.0%} dos geohashes (estado/custos_geohash.parquet).")
+        return
+    print(relatorio_plano(plano))
+    print(relatorio_fatias_iguais(cidades, custos))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# --- BENCHMARK DE PONTA A PONTA DA EXTRAÇÃO BRONZE ---
+# Roda o main() de verdade contra a api_falsa.py (subprocesso) gravando no backend 'local'
+# numa pasta temporária: nenhuma chamada à API do governo nem à nuvem. Cada cenário roda num
+# processo novo (o main() usa estado global) e o resultado sai numa tabela:
+# requisições/s, notas/s, pico de memória (RSS), latência http (média e p90) e o tempo gasto em
+# parse, montagem do DataFrame + compressão e upload (histogramas do telemetria.py).
+#
+#   python tasks_python/bronze/benchmark_bronze.py
+#   BENCH_CENARIOS=limpo,threads BENCH_SAIDA=bench.json python tasks_python/bronze/benchmark_bronze.py
+#   BENCH_REFERENCIA=bench.json python tasks_python/bronze/benchmark_bronze.py   # falha se notas/s cair
+#
+# A taxa da API fica alta por padrão (TAXA_API_INICIAL/TAXA_API_MAXIMA) para medir o pipeline,
+# não o limitador; defina as variáveis para medir com os valores de produção.
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_API_FALSA = os.path.join(DIRETORIO_SCRIPT, "api_falsa.py")
+
+BENCH_CENARIOS = os.getenv("BENCH_CENARIOS", "limpo,com_429")
+BENCH_FATIA = os.getenv("BENCH_FATIA", "1")                  # fatia fixa: todo benchmark faz as mesmas buscas
+BENCH_ARMAZENAMENTO = os.getenv("BENCH_ARMAZENAMENTO", "local")  # 'local' ou 'memoria'
+BENCH_SAIDA = os.getenv("BENCH_SAIDA")                        # grava os resultados em JSON
+BENCH_REFERENCIA = os.getenv("BENCH_REFERENCIA")              # JSON de um benchmark anterior para comparar
+BENCH_TOLERANCIA = float(os.getenv("BENCH_TOLERANCIA", "0.10"))  # queda de notas/s aceita antes de falhar
+BENCH_PORTA = int(os.getenv("BENCH_PORTA", "8770"))
+
+# Variáveis de ambiente de cada cenário (API falsa + pipeline)
+CENARIOS = {
+    "limpo": {},
+    "com_429": {"API_FALSA_LIMITE_RPS": "150"},
+    "timeouts": {"API_FALSA_PROB_TIMEOUT": "0.002"},
+    "lento": {"API_FALSA_LATENCIA_MS": "200-800"},
+    "threads": {"MOTOR_EXTRACAO": "threads"},
+}
+
+MARCADOR_RESULTADO = "RESULTADO_BENCH "
+
+
+def executar_pipeline():
+    """Roda dentro do subprocesso: o ambiente já vem pronto do processo pai."""
+    sys.path.insert(0, DIRETORIO_SCRIPT)
+    import bronze_menor_preco
+    from telemetria import metricas
+
+    bronze_menor_preco.API_URL = os.environ["BENCH_API_URL"]
+    inicio = time.perf_counter()
+    resumo = bronze_menor_preco.main() or {}
+    resumo["segundos"] = round(time.perf_counter() - inicio, 2)
+    resumo["pico_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    resumo["fases"] = metricas.snapshot()["latencias_segundos"]
+    print(MARCADOR_RESULTADO + json.dumps(resumo), flush=True)
+
+
+def aguardar_porta(porta, limite=15):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", porta)) == 0:
+                return True
+        time.sleep(0.1)
+    return False
+
+
+def rodar_cenario(nome, pasta_logs):
+    pasta = tempfile.mkdtemp(prefix=f"bench_{nome}_")
+    ambiente = {
+        **os.environ,
+        "STORAGE_PROVIDER": BENCH_ARMAZENAMENTO,
+        "DIRETORIO_LAKE_LOCAL": os.path.join(pasta, "lake"),
+        "DIRETORIO_ESTADO": os.path.join(pasta, "estado"),
+        "FATIA": BENCH_FATIA,
+        "TELEGRAM_BOT_TOKEN": "",  # nunca notifica o grupo a partir do benchmark
+        "API_FALSA_PORTA": str(BENCH_PORTA),
+        "BENCH_API_URL": f"http://127.0.0.1:{BENCH_PORTA}/api/v1/produtos",
+        **CENARIOS[nome],
+    }
+    ambiente.setdefault("TAXA_API_INICIAL", "1000")
+    ambiente.setdefault("TAXA_API_MAXIMA", "5000")
+
+    api = subprocess.Popen([sys.executable, SCRIPT_API_FALSA], env=ambiente,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not aguardar_porta(BENCH_PORTA):
+            print(f"❌ [{nome}] A API falsa não subiu na porta {BENCH_PORTA}.", flush=True)
+            return None
+
+        arquivo_log = os.path.join(pasta_logs, f"{nome}.log")
+        print(f"⏱️  [{nome}] Rodando a extração (log em {arquivo_log})...", flush=True)
+        with open(arquivo_log, "w") as log:
+            processo = subprocess.run([sys.executable, os.path.abspath(__file__), "--executar"],
+                                      env=ambiente, stdout=subprocess.PIPE, stderr=log, text=True)
+            log.write(processo.stdout)
+
+        linhas = [l for l in processo.stdout.splitlines() if l.startswith(MARCADOR_RESULTADO)]
+        if processo.returncode != 0 or not linhas:
+            print(f"❌ [{nome}] A extração falhou (código {processo.returncode}). Veja o log.", flush=True)
+            return None
+        return json.loads(linhas[-1][len(MARCADOR_RESULTADO):])
+    finally:
+        api.terminate()
+        api.wait()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def metricas(resultado):
+    segundos = max(resultado["segundos"], 1e-9)
+    fases = resultado.get("fases", {})
+    http = fases.get("http", {})
+    return {
+        "req_s": resultado["requisicoes"] / segundos,
+        "notas_s": resultado["notas"] / segundos,
+        "buscas_s": resultado["buscas"] / segundos,
+        "rss_mb": resultado["pico_rss_mb"],
+        "latencia_http_ms": 1000 * http.get("media", 0),
+        "latencia_http_p90_ms": 1000 * http.get("p90", 0),
+        "parse_s": fases.get("parse", {}).get("soma", 0),
+        "serializacao_s": sum(fases.get(f, {}).get("soma", 0) for f in ("dataframe", "compressao")),
+        "upload_s": fases.get("upload", {}).get("soma", 0),
+    }
+
+
+def imprimir_tabela(resultados):
+    print("\n📊 Resultado do benchmark (parse/serialização/upload somam o tempo de todas as threads)\n")
+    print(f"{'cenário':<10} {'tempo':>8} {'req/s':>8} {'notas/s':>9} {'429':>5} {'RSS MB':>7} "
+          f"{'http ms':>8} {'p90 ms':>7} {'parse s':>8} {'serial. s':>9} {'upload s':>9}")
+    for nome, r in resultados.items():
+        m = metricas(r)
+        print(f"{nome:<10} {r['segundos']:>7.1f}s {m['req_s']:>8.0f} {m['notas_s']:>9.0f} {r['respostas_429']:>5} "
+              f"{m['rss_mb']:>7.0f} {m['latencia_http_ms']:>8.1f} {m['latencia_http_p90_ms']:>7.0f} {m['parse_s']:>8.2f} "
+              f"{m['serializacao_s']:>9.2f} {m['upload_s']:>9.2f}")
+
+
+def comparar(resultados, referencia):
+    """Lista de cenários cuja vazão (notas/s) caiu mais que a tolerância em relação à referência."""
+    regressoes = []
+    print(f"\n🔎 Comparando com {BENCH_REFERENCIA} (tolerância {BENCH_TOLERANCIA:.0%})")
+    for nome, r in resultados.items():
+        if nome not in referencia:
+            continue
+        atual, antes = metricas(r)["notas_s"], metricas(referencia[nome])["notas_s"]
+        variacao = (atual - antes) / antes if antes else 0.0
+        marca = "✅"
+        if variacao < -BENCH_TOLERANCIA:
+            marca = "❌"
+            regressoes.append(nome)
+        print(f"  {marca} {nome}: {antes:.0f} → {atual:.0f} notas/s ({variacao:+.1%})")
+    return regressoes
+
+
+def main():
+    nomes = [n.strip() for n in BENCH_CENARIOS.split(",") if n.strip()]
+    desconhecidos = [n for n in nomes if n not in CENARIOS]
+    if desconhecidos:
+        print(f"❌ Cenários desconhecidos: {', '.join(desconhecidos)}. Disponíveis: {', '.join(CENARIOS)}")
+        sys.exit(2)
+
+    print(f"🚀 Benchmark Bronze - fatia {BENCH_FATIA}, armazenamento '{BENCH_ARMAZENAMENTO}', cenários: {', '.join(nomes)}", flush=True)
+    pasta_logs = tempfile.mkdtemp(prefix="bench_logs_")
+    resultados = {}
+    for nome in nomes:
+        resultado = rodar_cenario(nome, pasta_logs)
+        if resultado:
+            resultados[nome] = resultado
+
+    if not resultados:
+        sys.exit(1)
+    imprimir_tabela(resultados)
+
+    if BENCH_SAIDA:
+        with open(BENCH_SAIDA, "w") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"\n💾 Resultados salvos em {BENCH_SAIDA}")
+
+    if BENCH_REFERENCIA and os.path.exists(BENCH_REFERENCIA):
+        with open(BENCH_REFERENCIA) as f:
+            regressoes = comparar(resultados, json.load(f))
+        if regressoes:
+            print(f"\n❌ Regressão de vazão em: {', '.join(regressoes)}")
+            sys.exit(1)
+
+    if len(resultados) < len(nomes):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    if "--executar" in sys.argv:
+        executar_pipeline()
+    else:
+        main()
@@ -5,24 +5,35 @@ import time
 import os
 import io
 import threading
-from azure.storage.blob import BlobServiceClient 
-import boto3
-from botocore.exceptions import ClientError
+import math
+import random
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from armazenamento import obter_armazenamento
+from extracao_async import MotorExtracaoAsync
+from limitador_taxa import LimitadorTaxaAdaptativo, ler_retry_after
+from planejador_cobertura import planejar_cobertura, relatorio_economia
+from poda_variacoes import RegistroVariacoes, carregar_podas, relatorio_podas
+from diario_tarefas import DiarioTarefas, ARQUIVO_DIARIO
+from estagio_upload import EstagioUpload, SEM_NOTAS_NOVAS
+from lote_colunar import LoteColunar, ler_pagina, adicionar_origem, adicionar_termos, juntar
+from indice_notas import IndiceNotas
+from telemetria import metricas, classe_status, ExportadorMetricas, configurar_log, descarregar_log
+from marcas_incrementais import MarcasIncrementais
+from paginacao_adaptativa import IdsVistos, combinar_criterios
+from transbordo_lotes import TransbordoLotes, MEMORIA_RETIDA_MAX
+from fila_trabalho import FilaTrabalho, identificador_worker
+from balanceador_fatias import CustosGeohash, carregar_ou_planejar, relatorio_plano
+from plano_consultas import compilar_plano, carregar_plano, ler_plano, iterar_tarefas, termos_por_busca, relatorio_consultas
 
 load_dotenv() 
 
-# --- CONFIGURAÇÕES ---
-STORAGE_PROVIDER = os.getenv("STORAGE_PROVIDER") # azure ou minio
-
-AZURE_CONNECTION_STRING = os.getenv("AZURE_CONNECTION_STRING")
-AZURE_CONTAINER = "bronze"
+# Log com nível/formato configuráveis e bufferizado (telemetria.py)
+log = configurar_log()
 
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
-MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
-MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
-MINIO_BUCKET = "bronze"
+# --- CONFIGURAÇÕES ---
+STORAGE_PROVIDER = os.getenv("STORAGE_PROVIDER", "azure") # azure, minio, local ou memoria
+# Credenciais (AZURE_CONNECTION_STRING, MINIO_*) são lidas pelo próprio backend em armazenamento.py
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
@@ -33,43 +44,59 @@ ARQUIVO_TERMOS = os.path.join(RAIZ_PROJETO, "dados", "produtos_cesta_basica.csv"
 ARQUIVO_GEOHASHES = os.path.join(RAIZ_PROJETO, "dados", "municipios_pr_geohash.csv")
 API_URL = "https://menorpreco.notaparana.pr.gov.br/api/v1/produtos"
 
+# Motor de extração: 'async' (aiohttp, concorrência adaptativa) ou 'threads' (ThreadPoolExecutor antigo)
+MOTOR_EXTRACAO = os.getenv("MOTOR_EXTRACAO", "async")
+# Teto de conexões simultâneas do motor async (o limite real se ajusta sozinho abaixo disso)
+LIMITE_CONEXOES_ASYNC = int(os.getenv("LIMITE_CONEXOES_ASYNC", "200"))
+# Quantas buscas podem estar "em voo" ao mesmo tempo (o resto espera na fila, sem ocupar memória)
+JANELA_TAREFAS = int(os.getenv("JANELA_TAREFAS", "400"))
+# Troca a lista crua de municípios por um conjunto mínimo de centros que cobre a mesma área
+PLANEJAR_COBERTURA = os.getenv("PLANEJAR_COBERTURA", "0") == "1"
+# Remove as variações que o histórico mostra serem quase sempre subconjunto de outra
+PODAR_VARIACOES = os.getenv("PODAR_VARIACOES", "0") == "1"
+# Quantos lotes podem esperar na fila do upload em segundo plano antes de frear a extração
+FILA_UPLOAD = int(os.getenv("FILA_UPLOAD", "2"))
+# Espera base entre as tentativas de upload de um lote (dobra a cada tentativa, com jitter);
+# o upload roda no estágio em segundo plano, e uma espera longa ali segura a extração pela fila
+ESPERA_RETRY_UPLOAD = float(os.getenv("ESPERA_RETRY_UPLOAD", "2"))
+# Descarta as notas que já foram gravadas em outro lote/dia do mesmo mês (índice em indice_notas.py)
+DEDUPLICAR_ENTRE_LOTES = os.getenv("DEDUPLICAR_ENTRE_LOTES", "1") == "1"
+# Força uma fatia (1 a 7) em vez da do dia da semana: reprocessar um dia ou rodar o benchmark sempre igual
+FATIA = os.getenv("FATIA")
+# Para de paginar uma busca quando a página inteira é de notas que já estavam no storage (marcas_incrementais.py)
+MODO_INCREMENTAL = os.getenv("MODO_INCREMENTAL", "0") == "1"
+# Para de paginar quando menos que essa fração dos IDs da página é inédita na execução (0 desliga).
+# Desligado por padrão: a busca cortada perde as notas novas da página e das seguintes
+LIMIAR_IDS_NOVOS = float(os.getenv("LIMIAR_IDS_NOVOS", "0"))
+# Todos os geohashes do dia numa fila SQLite com leases, dividida entre quantos workers rodarem (fila_trabalho.py)
+MODO_FILA = os.getenv("MODO_FILA", "0") == "1"
+FILA_RODADA = os.getenv("FILA_RODADA")  # padrão: a data de hoje (uma rodada completa por dia)
+# Monta as 7 fatias pelo custo histórico de cada geohash em vez de pedaços iguais (balanceador_fatias.py)
+BALANCEAR_FATIAS = os.getenv("BALANCEAR_FATIAS", "1") == "1"
+
+# Limitador de taxa compartilhado (req/s) para TODAS as chamadas à API_URL
+TAXA_API_INICIAL = float(os.getenv("TAXA_API_INICIAL", "10"))
+TAXA_API_MAXIMA = float(os.getenv("TAXA_API_MAXIMA", "100"))
+
 # Criando o "botão de pânico" para as threads
 evento_parada = threading.Event()
 
-# --- FUNÇÕES DE INFRAESTRUTURA E REGRA DE NEGÓCIO ---
-
-def obter_cliente_minio():
-    return boto3.client('s3', endpoint_url=MINIO_ENDPOINT, aws_access_key_id=MINIO_ACCESS_KEY, aws_secret_access_key=MINIO_SECRET_KEY)
+# Um só limitador por processo: um 429 em qualquer worker freia todo mundo
+limitador_api = LimitadorTaxaAdaptativo(taxa_inicial=TAXA_API_INICIAL, taxa_maxima=TAXA_API_MAXIMA)
 
+# --- FUNÇÕES DE INFRAESTRUTURA E REGRA DE NEGÓCIO ---
 
 def testar_conexao_storage():
-    if STORAGE_PROVIDER == "minio":
-        print("🪣  Testando conexão com o MinIO...", flush=True)
-        try:
-            s3_client = obter_cliente_minio()
-            s3_client.head_bucket(Bucket=MINIO_BUCKET)
-            print("✅ Conexão MinIO OK!\n", flush=True)
-            return True
-        except Exception as e:
-            print(f"❌ Erro MinIO: {e}", flush=True)
-            return False
-    else:
-        print("☁️  Testando conexão com a Azure Blob Storage...", flush=True)
-        try:
-            blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-            container_client = blob_service_client.get_container_client(AZURE_CONTAINER)
-            if not container_client.exists(): 
-                print(f"❌ Erro Azure: O container não existe.", flush=True)
-                return False
-            print("✅ Conexão Azure OK!\n", flush=True)
-            return True
-        except Exception as e: 
-            print(f"❌ Erro ao conectar na Azure: {e}", flush=True)
-            return False
+    try:
+        return obter_armazenamento(STORAGE_PROVIDER).testar_conexao()
+    except Exception as e:
+        # SDK não instalado, credencial faltando ou provedor desconhecido
+        log.error(f"❌ Erro ao preparar o armazenamento '{STORAGE_PROVIDER}': {e}")
+        return False
 
 def enviar_alerta_telegram(mensagem):
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-        print("⚠️ Credenciais do Telegram não encontradas no .env. Pulando envio.", flush=True)
+        log.warning("⚠️ Credenciais do Telegram não encontradas no .env. Pulando envio.")
         return
 
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
@@ -80,161 +107,101 @@ def enviar_alerta_telegram(mensagem):
     }
     try:
         requests.post(url, json=payload, timeout=10)
-        print("📱 Notificação enviada para o Telegram!", flush=True)
+        log.info("📱 Notificação enviada para o Telegram!")
     except Exception as e:
-        print(f"⚠️ Erro ao enviar mensagem para o Telegram: {e}", flush=True)
+        log.warning(f"⚠️ Erro ao enviar mensagem para o Telegram: {e}")
 
-def gerar_variacoes(categoria, termo):
-    variacoes = [] 
-    
-    # --- Grãos ---
-    if categoria == "Grãos E Básicos": 
-        if "ARROZ BRANCO" in termo: 
-            variacoes.extend(["ARROZ TIPO 1 5KG", "ARROZ T1 5KG", "ARROZ 5KG"])
-        elif "ARROZ PARBOILIZADO" in termo:
-            variacoes.extend(["ARROZ PARBOILIZADO 5KG", "ARROZ PARB 5KG"])
-        elif "FEIJAO" in termo: 
-            variacoes.extend([f"{termo} 1KG", termo])
-        else: 
-            variacoes.extend([f"{termo} 1KG", termo])
-
-    # --- Farinhas e Milho ---
-    elif categoria == "Farinhas E Milho": 
-        if "FARINHA DE" in termo:
-            # Pulo do gato: "FARINHA DE TRIGO" -> "FAR TRIGO" ou "FARINHA TRIGO"
-            base = termo.replace("FARINHA DE ", "")
-            variacoes.extend([f"FAR {base} 1KG", f"FARINHA {base} 1KG", f"{termo} 1KG"])
-        else:
-            variacoes.extend([f"{termo} 1KG", f"{termo} 500G"])
-
-    # --- Óleos e Gorduras ---
-    elif categoria == "Óleos E Gorduras":
-        if "OLEO" in termo: 
-            variacoes.extend([f"{termo} 900ML", termo])
-        elif "AZEITE" in termo: 
-            variacoes.extend([f"{termo} 500ML"])
-        elif "MARGARINA" in termo:
-            # Cupom fiscal adora abreviar margarina
-            variacoes.extend(["MARGARINA 500G", "MARG 500G", termo])
-        else: 
-            variacoes.extend([f"{termo} 500G", termo])
-
-    # --- Café e Leite ---
-    elif categoria == "Café E Leite":
-        if "CAFE" in termo:
-            # Tira o "MOIDO" que quase ninguém usa na nota
-            variacoes.extend(["CAFE 500G", "CAFE TORRADO 500G", f"{termo} 500G"])
-        elif "LEITE INTEGRAL" in termo:
-            # Adiciona o UHT que os mercados grandes usam
-            variacoes.extend(["LEITE UHT INTEGRAL 1L", "LEITE INTEGRAL 1L", "LEITE 1L"])
-        elif "LEITE EM PO" in termo:
-            variacoes.extend(["LEITE PO 400G", f"{termo} 400G"])
-        else:
-            variacoes.append(termo)
-
-    # --- Limpeza ---
-    elif categoria == "Limpeza": 
-        if "SABAO EM PO" in termo: 
-            # Foca na embalagem de 800g que é o padrão atual do mercado
-            variacoes.extend(["LAVA ROUPAS 800G", "SABAO PO 800G", "SABAO EM PO 800G"])
-        elif "DETERGENTE LIQUIDO" in termo: 
-            # Arranca o "liquido" que atrapalha a busca
-            variacoes.extend(["DETERGENTE 500ML"])
-        elif "DESINFETANTE" in termo or "AMACIANTE" in termo: 
-            variacoes.extend([f"{termo} 2L", f"{termo} 1L"])
-        elif "SACO LIXO" in termo: 
-            variacoes.extend([f"{termo} 50L", f"{termo} 30L", termo])
-        else: 
-            variacoes.append(termo)
-
-    # --- Higiene ---
-    elif categoria == "Higiene":
-        if "CREME DENTAL" in termo:
-            variacoes.extend(["CREME DENTAL 90G", "PASTA DENTAL 90G", termo])
-        elif "PAPEL HIGIENICO" in termo:
-            # Mercados usam a quantidade de rolos ou metragem
-            variacoes.extend(["PAPEL HIGIENICO 4", "PAPEL HIGIENICO 30M", termo])
-        elif "SABONETE" in termo:
-            variacoes.extend(["SABONETE 90G", "SABONETE 85G", termo])
-        else:
-            variacoes.append(termo)
-
-    # --- Biscoitos e Massas ---
-    elif categoria in ["Padaria E Biscoitos", "Massas"]: 
-        if "MACARRAO" in termo: 
-            # MACARRAO ESPAGUETE -> MAC ESPAGUETE 500G
-            tipo = termo.replace("MACARRAO ", "")
-            variacoes.extend([f"MAC {tipo} 500G", f"{termo} 500G"])
-        elif "PAO" in termo: 
-            variacoes.extend([f"{termo} 400G", f"{termo} 500G", termo])
-        elif "BISCOITO" in termo:
-            # Abreviação clássica
-            tipo = termo.replace("BISCOITO ", "")
-            variacoes.extend([f"BISC {tipo} 400G", f"BISC {tipo}", f"{termo} 400G"])
-        else: 
-            variacoes.extend([f"{termo} 400G", f"{termo} 200G", termo])
-
-    # --- O Resto (Proteínas Frescas, Enlatados, Bebidas, etc) ---
-    else: 
-        if "OVOS" in termo:
-            variacoes.extend(["OVO BRANCO", "OVOS DUZIA", termo])
-        else:
-            variacoes.append(termo)
-            
-    return variacoes
+def serializar_lote(dados_lote, dia_da_semana, numero_lote, indice=None):
+    """DataFrame deduplicado, Parquet zstd e caminho Hive do lote (None se não sobrar nota nova)."""
+    agora = datetime.now()
 
-def processar_e_salvar_lote(dados_lote, dia_da_semana, numero_lote):
-    if not dados_lote:
-        return True # Retorna True para não travar se estiver vazio
-        
-    print(f"\n🛠️ Preparando upload do Lote {numero_lote} ({len(dados_lote)} notas)...", flush=True)
-    
-    # Deduplicação
-    df = pl.from_dicts(dados_lote)
-    if "estabelecimento" in df.columns: 
-        df = df.unnest("estabelecimento")
-    df = df.unique(subset=["id"])
+    with metricas.medir("dataframe"):
+        # Deduplicação (as páginas já chegam em colunas, com o estabelecimento achatado)
+        df = dados_lote.para_dataframe()
+        df = df.unique(subset=["id"])
+
+        # ...e contra tudo que já subiu neste mês (outros lotes, outras fatias, outros dias)
+        if indice is not None:
+            qtd_lote = df.height
+            df = indice.filtrar_novas(df, agora.year, agora.month)
+            metricas.incrementar("notas_descartadas", qtd_lote - df.height)
+            if df.height < qtd_lote:
+                log.info(f"♻️  {qtd_lote - df.height} notas do Lote {numero_lote} já estavam gravadas neste mês e foram descartadas.")
+    if df.height == 0:
+        return None # Nada novo: não cria arquivo vazio
 
     # Compressão
     buffer = io.BytesIO()
-    df.write_parquet(buffer, compression="zstd")
+    with metricas.medir("compressao"):
+        df.write_parquet(buffer, compression="zstd")
     
-    agora = datetime.now()
     timestamp_arquivo = agora.strftime('%H%M')
+    # Na fila vários workers gravam ao mesmo tempo: o nome do worker evita colisão de arquivos
+    origem = f"fila_{identificador_worker()}" if MODO_FILA else f"fatia_{dia_da_semana + 1}"
     
     caminho_blob = (
         f"menor_preco/ano_hive={agora.year}/"
         f"mes_hive={agora.month:02d}/"
         f"dia_hive={agora.day:02d}/"
-        f"fatia_{dia_da_semana + 1}_{timestamp_arquivo}_lote_{numero_lote}.parquet"
+        f"{origem}_{timestamp_arquivo}_lote_{numero_lote}.parquet"
     )
     
+    return df, buffer.getvalue(), caminho_blob, agora
+
+def processar_e_salvar_lote(dados_lote, dia_da_semana, numero_lote, indice=None):
+    if not dados_lote:
+        return SEM_NOTAS_NOVAS # Confirma o lote sem travar se estiver vazio
+        
+    log.info(f"🛠️ Preparando upload do Lote {numero_lote} ({len(dados_lote)} notas)...")
+    lote = serializar_lote(dados_lote, dia_da_semana, numero_lote, indice)
+    if lote is None:
+        return SEM_NOTAS_NOVAS # Tudo já estava gravado: confirma sem contar como enviado
+    df, dados, caminho_blob, agora = lote
+
+    armazenamento = obter_armazenamento(STORAGE_PROVIDER)
+    progresso = {} # Partes/blocos já enviados: as retentativas continuam de onde pararam
+
     # Adicionando sistema de retries para a nuvem
     for tentativa in range(1, 4): # Tenta até 3 vezes
         try:
-            if STORAGE_PROVIDER == "minio":
-                s3_client = obter_cliente_minio()
-                s3_client.put_object(Bucket=MINIO_BUCKET, Key=caminho_blob, Body=buffer.getvalue())
-                print(f"📦 Lote {numero_lote} salvo no MINIO: {caminho_blob}", flush=True)
-            else:
-                blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-                blob_client = blob_service_client.get_blob_client(container=AZURE_CONTAINER, blob=caminho_blob)
-                blob_client.upload_blob(buffer.getvalue(), overwrite=True)
-                print(f"📦 Lote {numero_lote} salvo na AZURE: {caminho_blob}", flush=True)
-            
+            with metricas.medir("upload"):
+                armazenamento.enviar(dados, caminho_blob, progresso)
+            metricas.incrementar("lotes_enviados")
+            metricas.incrementar("bytes_enviados", len(dados))
+            log.info(f"📦 Lote {numero_lote} salvo {armazenamento.destino}: {caminho_blob}",
+                     extra={"campos": {"notas": df.height, "bytes": len(dados)}})
+            if indice is not None:
+                indice.registrar(df, agora.year, agora.month)
+
             return True # Sucesso! Sai da função e retorna True
             
         except Exception as e:
-            print(f"⚠️ Erro no upload (Tentativa {tentativa}/3): {e}", flush=True)
-            time.sleep(20 * tentativa) # Espera 5s, depois 10s...
+            metricas.incrementar("falhas_upload")
+            log.warning(f"⚠️ Erro no upload (Tentativa {tentativa}/3): {e}")
+            if tentativa < 3:
+                time.sleep(ESPERA_RETRY_UPLOAD * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5)) # ~2s, depois ~4s
             
-    print(f"❌ FALHA CRÍTICA: Não foi possível salvar o Lote {numero_lote} na nuvem.", flush=True)
+    armazenamento.cancelar(caminho_blob, progresso)
+    metricas.incrementar("lotes_falhos")
+    log.error(f"❌ FALHA CRÍTICA: Não foi possível salvar o Lote {numero_lote} na nuvem.")
     return False # Falhou todas as vezes
 
+def transbordar_lote(dados_lote, dia_da_semana, numero_lote, transbordo, indice=None):
+    """Grava no disco o Parquet que iria para a nuvem; a drenagem sobe depois (transbordo_lotes.py)."""
+    lote = serializar_lote(dados_lote, dia_da_semana, numero_lote, indice)
+    if lote is not None:
+        df, dados, caminho_blob, agora = lote
+        transbordo.guardar(dados, caminho_blob)
+        metricas.incrementar("lotes_transbordados")
+        # No disco já conta como guardado: a drenagem não volta a passar pelo índice
+        if indice is not None:
+            indice.registrar(df, agora.year, agora.month)
+    return True
+
 # --- FUNÇÃO ISOLADA PARA A THREAD (WORKER) ---
 
-def extrair_dados_variacao(sessao, busca, geohash, termo_base, cidade_nome):
-    notas_coletadas = []
+def extrair_dados_variacao(sessao, busca, geohash, termo_base, cidade_nome, criterio_parada=None):
+    paginas = []
     offset = 0
     continua_variacao = True
 
@@ -251,40 +218,48 @@ def extrair_dados_variacao(sessao, busca, geohash, termo_base, cidade_nome):
             if evento_parada.is_set():
                 break
 
+            # Espera a vez no limitador compartilhado (desiste se apertarem o botão de pânico)
+            if not limitador_api.adquirir(evento_parada):
+                break
+
+            if tentativa > 1:
+                metricas.incrementar("retentativas")
             try:
-                r = sessao.get(API_URL, params=params, timeout=20) 
+                with metricas.medir("http"):
+                    r = sessao.get(API_URL, params=params, timeout=20) 
+                metricas.incrementar("requisicoes", status=classe_status(r.status_code))
                 
                 if r.status_code == 200:
-                    dados = r.json().get("produtos", [])
-                    if not dados:
+                    limitador_api.registrar_sucesso()
+                    with metricas.medir("parse"):
+                        dados = ler_pagina(r.content)
+                    if dados.height == 0:
                         sucesso_chamada = True
                         continua_variacao = False 
                         break
                     
-                    for d in dados:
-                        d['termo_origem'] = termo_base 
-                        d['cidade_origem'] = cidade_nome 
-                        d['geohash_origem'] = geohash
-                    
-                    notas_coletadas.extend(dados)
+                    paginas.append(dados)
+                    metricas.incrementar("paginas")
                     
-                    if len(dados) < 50: 
+                    # O critério vê toda página (para contabilizar) e pode encerrar a busca antes do fim
+                    parar = criterio_parada is not None and criterio_parada(dados)
+                    if len(dados) < 50 or parar: 
                         continua_variacao = False
                     else:
                         offset += 50
                     
                     sucesso_chamada = True
-                    # Usa um sleep pequeno que pode ser interrompido
-                    evento_parada.wait(0.05) 
                     break 
                 
                 elif r.status_code == 429: 
-                    evento_parada.wait(5 * tentativa) # Pausa amigável que obedece o Ctrl+C
+                    # Freia o limitador para todos os workers (pausa coletiva que obedece o Ctrl+C)
+                    limitador_api.registrar_429(ler_retry_after(r.headers.get("Retry-After")))
                 
                 else:
                     evento_parada.wait(2 * tentativa) 
                     
-            except requests.exceptions.RequestException:
+            except (requests.exceptions.RequestException, pl.exceptions.PolarsError):
+                metricas.incrementar("requisicoes", status="erro")
                 if tentativa == 5:
                     continua_variacao = False 
                     break
@@ -293,7 +268,51 @@ def extrair_dados_variacao(sessao, busca, geohash, termo_base, cidade_nome):
         if not sucesso_chamada: 
             break 
             
-    return notas_coletadas
+    return adicionar_origem(juntar(paginas), termo_base, cidade_nome, geohash)
+
+
+# --- PROGRESSO NO TERMINAL ---
+
+class ProgressoPorCidade:
+    """
+    Guarda só as linhas de progresso (não as notas) de cada cidade e imprime o bloco
+    da cidade inteiro quando a última busca dela termina, na ordem original das buscas.
+    """
+
+    def __init__(self, tarefas, lista_cidades):
+        self.total_cidades = len(lista_cidades)
+        self.cidades_impressas = 0
+        self.buscas_por_cidade = {}
+        self.indice_busca = {}
+        self.pendentes = {}
+        self.adicionar(tarefas)
+
+    def adicionar(self, tarefas):
+        # Na fila de trabalho as buscas chegam aos poucos: cada cidade fecha com o que este worker pegou
+        for t in tarefas:
+            geohash = t[1]
+            self.buscas_por_cidade[geohash] = self.buscas_por_cidade.get(geohash, 0) + 1
+            self.indice_busca[(t[0], geohash, t[2])] = self.buscas_por_cidade[geohash]
+
+    def registrar(self, tarefa_info, qtd_encontrada):
+        busca, geohash, termo_base, nome_cidade = tarefa_info
+        linhas = self.pendentes.setdefault(geohash, [])
+        linhas.append((self.indice_busca.pop((busca, geohash, termo_base), 0), busca, qtd_encontrada))
+
+        total = self.buscas_por_cidade[geohash]
+        if len(linhas) < total:
+            return
+
+        self.cidades_impressas += 1
+        # Uma linha por cidade no INFO; o detalhe de cada busca só com LOG_NIVEL=DEBUG
+        for busca_idx, busca_atual, qtd in sorted(linhas):
+            log.debug(f"  🔍 [{busca_idx}/{total}] {busca_atual}... ✅ {qtd} notas",
+                      extra={"campos": {"geohash": geohash, "busca": busca_atual, "notas": qtd}})
+        log.info(f"🏙️  [{self.cidades_impressas}/{self.total_cidades}] Região: {nome_cidade}",
+                 extra={"campos": {"geohash": geohash, "buscas": total, "notas": sum(l[2] for l in linhas),
+                                   "taxa_api": round(limitador_api.taxa, 1)}})
+        del self.pendentes[geohash]
+        del self.buscas_por_cidade[geohash]
 
 
 # --- FLUXO PRINCIPAL ---
@@ -302,113 +321,311 @@ def main():
     tempo_inicio = time.time()
     total_notas_dia = 0
     agora = datetime.now()
-    dia_da_semana = agora.weekday() 
+    dia_da_semana = int(FATIA) - 1 if FATIA else agora.weekday() 
     
-    print(f"🚀 Iniciando Pipeline Bronze (Paralelizado) - Fatiamento Dia {dia_da_semana + 1}/7", flush=True)
-    print(f"🔧 Provedor: {STORAGE_PROVIDER.upper()}", flush=True)
-    if not testar_conexao_storage(): return 
+    if MODO_FILA:
+        log.info(f"🚀 Iniciando Pipeline Bronze (Paralelizado) - Fila de trabalho, worker {identificador_worker()}")
+    else:
+        log.info(f"🚀 Iniciando Pipeline Bronze (Paralelizado) - Fatiamento Dia {dia_da_semana + 1}/7")
+    log.info(f"🔧 Provedor: {STORAGE_PROVIDER.upper()}")
+    log.info(f"⚙️  Motor de extração: {MOTOR_EXTRACAO}")
+    if not testar_conexao_storage():
+        descarregar_log()
+        return 
+
+    # Snapshot das métricas em JSON a cada METRICAS_INTERVALO (e endpoint HTTP se METRICAS_PORTA)
+    metricas.zerar()
+    metricas.medidor("taxa_api", lambda: round(limitador_api.taxa, 2))
+    exportador = ExportadorMetricas().iniciar()
 
     df_referencia = pl.read_csv(ARQUIVO_TERMOS)
     linhas_referencia = df_referencia.to_dicts()
     
     df_geos = pl.read_csv(ARQUIVO_GEOHASHES)
-    tamanho_fatia = 57
+    # Custo de cada geohash nesta execução (alimenta o balanceamento das próximas semanas)
+    custos = CustosGeohash()
+    if PLANEJAR_COBERTURA:
+        municipios = df_geos.select(["nome", "geohash", "latitude", "longitude"]).to_dicts()
+        centros = planejar_cobertura(municipios, fixos=custos.fixos_cobertura(m["geohash"] for m in municipios))
+        buscas_por_cidade = compilar_plano(linhas_referencia).height
+        log.info(relatorio_economia(len(municipios), len(centros), buscas_por_cidade))
+        df_geos = pl.DataFrame([{"nome": c["nome"], "geohash": c["geohash"]} for c in centros])
+
+    # 7 fatias iguais (com os 399 municípios crus dá as mesmas 57 linhas por dia de antes);
+    # na fila de trabalho a rodada é o mapa inteiro, dividido entre os workers
+    tamanho_fatia = math.ceil(len(df_geos) / 7)
     inicio = dia_da_semana * tamanho_fatia
-    df_lote = df_geos.slice(inicio, tamanho_fatia) if dia_da_semana < 6 else df_geos.slice(inicio)
+    if MODO_FILA:
+        df_lote = df_geos
+    else:
+        df_lote = df_geos.slice(inicio, tamanho_fatia) if dia_da_semana < 6 else df_geos.slice(inicio)
     lista_cidades = df_lote.select(["nome", "geohash"]).to_dicts()
-    
-    print(f"📅 Processando {len(lista_cidades)} cidades.", flush=True)
-
-    tarefas = []
-    for polo in lista_cidades:
-        for linha in linhas_referencia:
-            termo_base = linha["descricao_busca"]
-            variacoes = gerar_variacoes(linha.get("categoria", "Geral"), termo_base)
-            for busca in variacoes:
-                tarefas.append((busca, polo["geohash"], termo_base, polo["nome"]))
 
-    print(f"📋 Total de requisições base mapeadas: {len(tarefas)}", flush=True)
-    print("⚡ Iniciando extração massiva. Por favor, aguarde...", flush=True)
-
-    todas_as_notas = []
+    if BALANCEAR_FATIAS and not MODO_FILA:
+        plano = carregar_ou_planejar(df_geos.select(["nome", "geohash"]).to_dicts(), custos, dia_da_semana + 1)
+        if plano is not None:
+            log.info(relatorio_plano(plano))
+            lista_cidades = plano["fatias"][dia_da_semana]["cidades"]
+            log.info(f"⚖️  Fatia {dia_da_semana + 1}: ~{plano['fatias'][dia_da_semana]['segundos_estimados'] / 60:.1f} min estimados")
+    
+    log.info(f"📅 Processando {len(lista_cidades)} cidades.")
+
+    podas = {}
+    if PODAR_VARIACOES:
+        podas, df_podas = carregar_podas()
+        log.info(relatorio_podas(df_podas))
+
+    # Plano compilado (plano_consultas.py): buscas distintas, já sem as podadas; só recompila
+    # quando o CSV, as regras ou as podas mudam
+    caminho_plano, versao_plano, compilado = carregar_plano(linhas_referencia, podas)
+    plano_buscas = ler_plano(caminho_plano)
+    log.info(relatorio_consultas(plano_buscas, versao_plano, compilado))
+    termos_da_busca = termos_por_busca(plano_buscas)
+    variacoes_por_termo = {}
+    for busca, termos in termos_da_busca.items():
+        for termo in termos:
+            variacoes_por_termo.setdefault(termo, []).append(busca)
+
+    tarefas = list(iterar_tarefas(plano_buscas, lista_cidades))
+
+    log.info(f"📋 Total de requisições base mapeadas: {len(tarefas)}")
+
+    # Fila compartilhada: todo worker popula a mesma rodada (idempotente) e pega blocos com lease
+    fila = None
+    if MODO_FILA:
+        fila = FilaTrabalho(rodada=FILA_RODADA)
+        fila.popular(tarefas)
+        fila.iniciar()
+        log.info(fila.resumo())
+
+    # Diário local: se o job caiu mais cedo hoje nessa fatia, pula o que já foi feito
+    # (na fila quem manda é o lease; o diário só devolve as notas que não chegaram a subir)
+    if fila is None:
+        diario = DiarioTarefas(fatia=dia_da_semana + 1)
+    else:
+        # Um diário por worker: vários processos no mesmo host não podem dividir os números de lote.
+        # O de um worker que morreu (o nome padrão muda com o pid) é adotado por quem sobe depois
+        diario = DiarioTarefas(fatia=dia_da_semana + 1, caminho=ARQUIVO_DIARIO.replace(".sqlite3", f"_{fila.worker}.sqlite3"),
+                               exclusivo=True)
+        adotadas = diario.adotar_orfaos()
+        if adotadas:
+            log.info(f"♻️  {adotadas} buscas com notas pendentes adotadas do diário de workers encerrados.")
+    concluidas = diario.tarefas_concluidas()
+    todas_as_notas = LoteColunar()
+    if fila is not None:
+        todas_as_notas = diario.notas_pendentes()
+    elif concluidas:
+        tarefas = [t for t in tarefas if (t[0], t[1], t[2]) not in concluidas]
+        todas_as_notas = diario.notas_pendentes()
+        log.info(f"♻️  Retomando a fatia: {len(concluidas)} buscas já feitas hoje, "
+              f"{len(todas_as_notas)} notas ainda pendentes de envio, {len(tarefas)} buscas restantes.")
+
+    log.info("⚡ Iniciando extração massiva. Por favor, aguarde...")
+    inicio_extracao = time.time()
     
     # Variáveis de controle de lote
     TAMANHO_DO_LOTE = 2000
-    numero_lote = 1
+    numero_lote = diario.proximo_lote()
+    
+    # Agrupa o progresso por cidade mesmo com as buscas terminando fora de ordem
+    progresso = ProgressoPorCidade(tarefas if fila is None else [], lista_cidades)
+    # Guarda os IDs de cada variação para as estatísticas de sobreposição (poda_variacoes.py)
+    registro_variacoes = RegistroVariacoes(variacoes_por_termo)
     
-    # Descobre quantos produtos tem por cidade para fazer o [1/95]
-    buscas_por_cidade = len(tarefas) // len(lista_cidades)
+    # Serialização + upload rodam numa thread própria; a extração só entrega os lotes
+    def confirmar_lotes(numeros):
+        for numero in numeros:
+            diario.confirmar_lote(numero)
+        if marcas:
+            marcas.confirmar(numeros)
+        if fila is not None:
+            fila.confirmar(numeros)
+
+    # Índice de IDs já gravados no mês: só é atualizado depois que o lote chega no storage
+    indice = IndiceNotas() if DEDUPLICAR_ENTRE_LOTES else None
+    # Marcas d'água do modo incremental: também só avançam com o lote confirmado
+    marcas = MarcasIncrementais() if MODO_INCREMENTAL else None
+    if marcas:
+        log.info(f"⏩ Modo incremental: {len(marcas.marcas)} buscas com marca d'água de execuções anteriores.")
+
+    # Lotes que não subiram em execuções anteriores (ou no começo de uma queda) vão primeiro
+    transbordo = TransbordoLotes()
+    armazenamento = obter_armazenamento(STORAGE_PROVIDER)
+    if transbordo.pendentes():
+        transbordo.drenar(armazenamento)
+
+    def enviar_lote(notas, numero):
+        sucesso = processar_e_salvar_lote(notas, dia_da_semana, numero, indice)
+        # Se o storage respondeu, aproveita para esvaziar o que tinha ido para o disco
+        if sucesso is True and transbordo.pendentes():
+            transbordo.drenar(armazenamento)
+        return sucesso
+
+    estagio = EstagioUpload(
+        enviar_lote,
+        ao_confirmar=confirmar_lotes,
+        capacidade=FILA_UPLOAD,
+        transbordar=lambda notas, numero: transbordar_lote(notas, dia_da_semana, numero, transbordo, indice),
+        limite_memoria=MEMORIA_RETIDA_MAX,
+    )
+    metricas.medidor("fila_upload", estagio.pendentes)
     
     # 2. Execução Paralela
+    # IDs já baixados por qualquer busca desta execução (paginacao_adaptativa.py)
+    ids_vistos = IdsVistos(LIMIAR_IDS_NOVOS) if LIMIAR_IDS_NOVOS > 0 else None
+
+    # Buscas que pararam de paginar antes do fim: não entram nas estatísticas de poda
+    truncadas = set()
+
     with requests.Session() as sessao:
-        executor = ThreadPoolExecutor(max_workers=5)
+        # Quando parar de paginar cada busca antes do fim (None = pagina até acabar, como sempre)
+        def criterio(t):
+            combinado = combinar_criterios(
+                marcas.criterio_parada(t[0], t[1]) if marcas else None,
+                ids_vistos.criterio_parada() if ids_vistos is not None else None,
+            )
+            if combinado is None:
+                return None
+
+            def parar(dados):
+                if combinado(dados):
+                    truncadas.add(tuple(t[:3]))
+                    return True
+                return False
+
+            return parar
+
+        if MOTOR_EXTRACAO == "threads":
+            executor = ThreadPoolExecutor(max_workers=5)
+            submeter = lambda t: executor.submit(extrair_dados_variacao, sessao, t[0], t[1], t[2], t[3], criterio(t))
+        else:
+            # Um único event loop com pool de conexões limitado e concorrência que se ajusta à API
+            executor = MotorExtracaoAsync(API_URL, evento_parada, limitador_api, limite_conexoes=LIMITE_CONEXOES_ASYNC)
+            metricas.medidor("concorrencia_async", lambda: int(executor.controle.limite))
+            submeter = lambda t: executor.submit(t[0], t[1], t[2], t[3], criterio(t))
         
-        # Envia todas as tarefas para a fila e guarda a ordem exata delas
-        futuros_em_ordem = []
-        for t in tarefas:
-            futuro = executor.submit(extrair_dados_variacao, sessao, t[0], t[1], t[2], t[3])
-            futuros_em_ordem.append((t, futuro))
-            
+        # Janela fixa de tarefas em voo: só submete a próxima quando alguma termina
+        fila_tarefas = iter(tarefas)
+        em_andamento = {}
+
+        def proxima_tarefa():
+            if fila is None:
+                return next(fila_tarefas, None)
+            # Ocioso e sem nada livre na fila: espera os leases de workers que morreram expirarem
+            t = fila.proxima(esperar=not em_andamento, evento_parada=evento_parada)
+            if t is not None:
+                progresso.adicionar([t])
+            return t
+
+        def completar_janela():
+            while len(em_andamento) < JANELA_TAREFAS and not evento_parada.is_set():
+                t = proxima_tarefa()
+                if t is None:
+                    return
+                em_andamento[submeter(t)] = t
+
         try:
             tarefas_concluidas = 0
-            cidade_atual = ""
-            cidade_idx = 0
-            busca_idx = 1
-            
-            # Aqui está o truque: iteramos na ordem da lista, não na ordem de quem acaba primeiro
-            for tarefa_info, futuro in futuros_em_ordem:
-                busca_atual = tarefa_info[0]
-                nome_cidade = tarefa_info[3]
-                
-                # Se mudou a cidade, imprime o cabeçalho bonitão
-                if nome_cidade != cidade_atual:
-                    cidade_atual = nome_cidade
-                    cidade_idx += 1
-                    busca_idx = 1
-                    print(f"\n🏙️  [{cidade_idx}/{len(lista_cidades)}] Região: {cidade_atual}", flush=True)
-                
-                # futuro.result() bloqueia o loop até ESSA requisição específica terminar
-                resultado = futuro.result()
-                qtd_encontrada = len(resultado) if resultado else 0
-                
-                # Print na mesma linha, igualzinho ao original
-                print(f"  🔍 [{busca_idx}/{buscas_por_cidade}] {busca_atual}... ✅ {qtd_encontrada} notas", flush=True)
-
-                if resultado:
-                    todas_as_notas.extend(resultado)
-                    total_notas_dia += len(resultado)
-                    
-                tarefas_concluidas += 1
-                busca_idx += 1
-
-                # --- LÓGICA DE CHECKPOINT ---
-                if tarefas_concluidas % TAMANHO_DO_LOTE == 0:
-                    print(f"\n⚠️ Atingiu {tarefas_concluidas} buscas. Salvando checkpoint do Lote {numero_lote}...")
-                    sucesso_upload = processar_e_salvar_lote(todas_as_notas, dia_da_semana, numero_lote)
-                    
-                    if sucesso_upload:
-                        todas_as_notas.clear()
+            completar_janela()
+
+            # Consome na ordem de quem acaba primeiro: uma busca travada em retries não segura as outras
+            while em_andamento:
+                concluidos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+
+                for futuro in concluidos:
+                    tarefa_info = em_andamento.pop(futuro)
+                    resultado = futuro.result()
+                    qtd_encontrada = len(resultado) if resultado is not None else 0
+                    termos = termos_da_busca.get(tarefa_info[0], [tarefa_info[2]])
+                    if qtd_encontrada:
+                        # termo_origem é o principal; termos_origem guarda todos os que a busca atende
+                        resultado = adicionar_termos(resultado, termos)
+                        todas_as_notas.anexar(resultado)
+                        total_notas_dia += qtd_encontrada
+
+                    tarefas_concluidas += 1
+                    metricas.incrementar("buscas_concluidas")
+                    metricas.incrementar("notas_coletadas", qtd_encontrada)
+                    progresso.registrar(tarefa_info, qtd_encontrada)
+                    # Uma busca pode atender vários termos: as estatísticas de poda são por termo
+                    truncada = tuple(tarefa_info[:3]) in truncadas
+                    truncadas.discard(tuple(tarefa_info[:3]))
+                    for termo in termos:
+                        registro_variacoes.registrar((tarefa_info[0], tarefa_info[1], termo, tarefa_info[3]), resultado, truncada)
+                    diario.registrar_tarefa(tarefa_info, resultado)
+                    if marcas:
+                        marcas.observar(tarefa_info, resultado)
+                    if fila is not None:
+                        fila.coletada(tarefa_info)
+                    custos.registrar(tarefa_info, qtd_encontrada)
+
+                    # --- LÓGICA DE CHECKPOINT ---
+                    if tarefas_concluidas % TAMANHO_DO_LOTE == 0:
+                        log.warning(f"⚠️ Atingiu {tarefas_concluidas} buscas. Enviando checkpoint do Lote {numero_lote} para o upload...")
+                        diario.atribuir_lote(numero_lote)
+                        if marcas:
+                            marcas.fechar_lote(numero_lote)
+                        if fila is not None:
+                            fila.fechar_lote(numero_lote)
+                        # Entrega a lista para a thread de upload e começa uma nova (não pode dar clear!)
+                        estagio.enviar(todas_as_notas, numero_lote)
+                        todas_as_notas = LoteColunar()
                         numero_lote += 1
-                    else:
-                        print("⚠️ Retendo dados na memória para tentar enviar junto com o próximo lote...", flush=True)
+
+                completar_janela()
 
         except KeyboardInterrupt:
-            print("\n\n🛑 Interrupção manual (Ctrl+C) detectada! Cancelando threads pendentes...")
+            log.warning("🛑 Interrupção manual (Ctrl+C) detectada! Cancelando threads pendentes...")
             evento_parada.set() 
             executor.shutdown(wait=False, cancel_futures=True)
 
+        # Fecha o pool (no motor async isso também encerra a sessão HTTP e o event loop)
+        executor.shutdown(wait=True)
+        segundos_extracao = time.time() - inicio_extracao
+        if MOTOR_EXTRACAO != "threads":
+            log.info(f"⚙️  Concorrência final do motor async: {int(executor.controle.limite)} requisições simultâneas")
+        log.info(f"🚦 Limitador da API: {limitador_api.resumo()}")
+        if ids_vistos is not None:
+            log.info(ids_vistos.resumo())
+
+    registro_variacoes.salvar()
+    # Execução interrompida não representa o custo real dos geohashes
+    if not evento_parada.is_set():
+        custos.salvar(segundos_extracao)
+
     # 3. Processamento Final (Resíduo)
     if todas_as_notas:
         if evento_parada.is_set():
-            print("\n⚠️ Salvando os dados residuais coletados antes do cancelamento...")
+            log.warning("⚠️ Salvando os dados residuais coletados antes do cancelamento...")
         else:
-            print("\n✅ Extração massiva concluída. Salvando último lote residual...")
-            
-        processar_e_salvar_lote(todas_as_notas, dia_da_semana, numero_lote)
-    else:
-        # Só avisa que não tem nada se realmente não salvou nenhum lote antes
-        if numero_lote == 1 and not evento_parada.is_set():
-            print("\n⚠️ Nada coletado hoje.", flush=True)
+            log.info("✅ Extração massiva concluída. Salvando último lote residual...")
+        diario.atribuir_lote(numero_lote)
+    if marcas:
+        marcas.fechar_lote(numero_lote)
+    if fila is not None:
+        fila.fechar_lote(numero_lote)
+
+    # Sempre passa pelo estágio: mesmo sem resíduo ele ainda pode ter notas retidas de um lote que falhou
+    estagio.enviar(todas_as_notas, numero_lote)
+    if not estagio.encerrar():
+        log.warning("⚠️ Parte das notas não subiu e continua guardada no diário local para a próxima execução.")
+    elif transbordo.pendentes():
+        log.warning(f"⚠️ {len(transbordo.pendentes())} lotes ficaram no transbordo em disco; sobem na próxima execução "
+                    f"(ou com python transbordo_lotes.py).")
+    elif estagio.lotes_enviados == 0 and not evento_parada.is_set():
+        log.warning("⚠️ Nada coletado hoje.")
+
+    diario.fechar()
+    if fila is not None:
+        # Devolve para os outros workers o que foi pego e não subiu
+        log.info(fila.resumo())
+        fila.encerrar()
+
+    if marcas:
+        atualizadas = marcas.salvar()
+        log.info(f"⏩ Modo incremental: {marcas.paradas_antecipadas} buscas pararam de paginar em notas já conhecidas; "
+              f"{atualizadas} marcas d'água atualizadas."
+              + (" (parada desligada: a API não devolveu as notas da mais nova para a mais antiga)" if marcas.fora_de_ordem else ""))
 
     # Calcula o tempo total em minutos
     tempo_fim = time.time()
@@ -418,25 +635,48 @@ def main():
     nomes_dias = ["Segunda-Feira", "Terça-Feira", "Quarta-Feira", "Quinta-Feira", "Sexta-Feira", "Sábado", "Domingo"]
     nome_dia_atual = nomes_dias[dia_da_semana]
     
-    # Lógica simples para saber quantos lotes foram salvos de verdade
-    qtd_lotes_salvos = numero_lote if todas_as_notas else numero_lote - 1
-    if qtd_lotes_salvos == 0 and not todas_as_notas:
-        qtd_lotes_salvos = 0 # Prevenção se nada rodar
+    # O estágio de upload conta só os lotes que realmente chegaram na nuvem
+    qtd_lotes_salvos = estagio.lotes_enviados
+
+    # Latência e erros vistos pela telemetria (telemetria.py)
+    http = metricas.histograma("http")
+    requisicoes = sum(metricas.contador("requisicoes", status=s) for s in ("200", "429", "4xx", "5xx", "erro"))
+    taxa_429 = metricas.contador("requisicoes", status="429") / requisicoes if requisicoes else 0.0
+    exportador.encerrar()
 
     # Monta a mensagem formatada
     mensagem_telegram = f"""✅ *Extração Menor Preço concluída.*
 ⏱️ tempo: {minutos_processamento} min
 🧾 notas: {total_notas_dia}
 📍 geohashs: {len(lista_cidades)}
-🍰 fatia: {dia_da_semana + 1} ({nome_dia_atual})
+🍰 fatia: {f"fila {fila.rodada} (worker {fila.worker})" if fila is not None else f"{dia_da_semana + 1} ({nome_dia_atual})"}
 📦 lotes enviados: {qtd_lotes_salvos}
+💾 lotes no transbordo em disco: {len(transbordo.pendentes())} ({transbordo.lotes_drenados} drenados)
+♻️ notas repetidas descartadas: {indice.total_descartadas if indice is not None else 0}
+⏩ buscas encerradas cedo (incremental): {marcas.paradas_antecipadas if marcas else 0}
+🔁 páginas evitadas (IDs repetidos): {f"{ids_vistos.paginas_evitadas} a {ids_vistos.paginas_evitadas_teto}" if ids_vistos is not None else 0}
+🚦 taxa final da API: {limitador_api.taxa:.1f} req/s ({limitador_api.total_429} respostas 429)
+📶 latência http: p50 {http["p50"] * 1000:.0f} ms / p90 {http["p90"] * 1000:.0f} ms
+🔂 429: {taxa_429:.1%} das requisições, {metricas.contador("retentativas")} retentativas
 ☁️ provedor: {STORAGE_PROVIDER.lower()}
 📁 repositório: `mp_cesta_basica`"""
 
-    print(f"\n🏁 Fim do dia! Foram avaliadas {len(lista_cidades)} cidades e coletadas {total_notas_dia} notas no total.")
+    log.info(f"🏁 Fim do dia! Foram avaliadas {len(lista_cidades)} cidades e coletadas {total_notas_dia} notas no total.")
     
     # Dispara a mensagem!
     enviar_alerta_telegram(mensagem_telegram)
+    descarregar_log()
+
+    # Resumo para quem chama o main() de fora (benchmark_bronze.py)
+    return {
+        "buscas": tarefas_concluidas,
+        "notas": total_notas_dia,
+        "lotes": qtd_lotes_salvos,
+        "requisicoes": limitador_api.total_requisicoes,
+        "respostas_429": limitador_api.total_429,
+        "paradas_antecipadas": marcas.paradas_antecipadas if marcas else 0,
+        "paginas_evitadas": ids_vistos.paginas_evitadas if ids_vistos is not None else 0,
+    }
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,212 @@
+import io
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+import polars as pl
+
+from armazenamento import obter_armazenamento
+
+# --- COMPACTAÇÃO DAS PARTIÇÕES DO BRONZE ---
+# Cada execução grava vários `fatia_X_HHMM_lote_N.parquet` por dia, e no fim do mês a árvore
+# menor_preco/ano_hive=/mes_hive=/dia_hive= tem centenas de arquivos pequenos: toda leitura paga
+# abrir cada um e ler o rodapé de cada um. Este job junta os arquivos de um dia em poucos
+# arquivos grandes:
+#   - ordenados por cidade, termo e ID: linhas parecidas ficam vizinhas (o zstd comprime mais) e
+#     o min/max de cada row group passa a filtrar de verdade por cidade/termo;
+#   - row groups de LINHAS_POR_ROW_GROUP linhas e no máximo LINHAS_POR_ARQUIVO linhas por arquivo.
+# Só junta e ordena: nenhuma linha sai. A mesma nota achada por outro termo ou outra cidade
+# continua no bronze; deduplicar é papel da silver, que lê o resultado igual antes e depois.
+#
+# A troca usa só enviar/ler/listar/apagar, então vale para todos os backends (azure, minio,
+# local, memoria). Object storage não tem rename de vários arquivos de uma vez, então a troca é
+# feita com um diário na própria partição (`_compactacao.json`, que não casa com `*.parquet`):
+#   1. o diário grava quais originais serão substituídos e os nomes dos compactados;
+#   2. os compactados sobem; quando o último existe, a troca passa a valer;
+#   3. os originais são apagados e o diário some.
+# Quem lê a partição usa `arquivos_validos`: com o diário e todos os compactados presentes, lê
+# os compactados no lugar dos originais; com algum faltando, lê os originais e ignora os
+# compactados. Se o job morrer no meio, a próxima execução termina (ou desfaz) a troca antes
+# de compactar de novo.
+# Arquivos que chegarem durante a compactação não estão na lista e ficam para a próxima.
+#
+#   python tasks_python/bronze/compactar_bronze.py              # compacta o dia de ontem
+#   python tasks_python/bronze/compactar_bronze.py 2026-10-16   # um dia
+#   python tasks_python/bronze/compactar_bronze.py 2026-10      # todos os dias do mês
+
+PREFIXO_BRONZE = "menor_preco"
+ARQUIVO_DIARIO = "_compactacao.json"
+PREFIXO_COMPACTADO = "compactado_"
+
+LINHAS_POR_ROW_GROUP = int(os.getenv("COMPACTACAO_LINHAS_ROW_GROUP", "131072"))
+LINHAS_POR_ARQUIVO = int(os.getenv("COMPACTACAO_LINHAS_ARQUIVO", "2000000"))
+NIVEL_ZSTD = int(os.getenv("COMPACTACAO_NIVEL_ZSTD", "9"))  # roda fora da extração: dá para gastar mais CPU
+ORDENACAO = ["cidade_origem", "termo_origem", "id"]
+
+log = logging.getLogger("bronze")
+
+
+def prefixo_dia(ano, mes, dia):
+    return f"{PREFIXO_BRONZE}/ano_hive={ano}/mes_hive={mes:02d}/dia_hive={dia:02d}/"
+
+
+def _ler_diario(armazenamento, prefixo):
+    caminho = prefixo + ARQUIVO_DIARIO
+    if caminho not in armazenamento.listar(caminho):
+        return None
+    return json.loads(armazenamento.ler(caminho))
+
+
+def _troca_completa(diario, existentes):
+    return all(c in existentes for c in diario["compactados"])
+
+
+def arquivos_validos(armazenamento, prefixo, caminhos=None):
+    """Parquets de uma partição que devem ser lidos, respeitando uma compactação em andamento."""
+    caminhos = armazenamento.listar(prefixo) if caminhos is None else caminhos
+    parquets = [c for c in caminhos if c.endswith(".parquet")]
+    # Com a listagem em mãos, só vai ao storage ler o diário se ele estiver nela
+    diario = _ler_diario(armazenamento, prefixo) if prefixo + ARQUIVO_DIARIO in caminhos else None
+    if diario is None:
+        return parquets
+    if _troca_completa(diario, set(parquets)):
+        ignorados = set(diario["origens"])
+    else:
+        ignorados = set(diario["compactados"])
+    return [c for c in parquets if c not in ignorados]
+
+
+def recuperar(armazenamento, prefixo):
+    """Termina (ou desfaz) a compactação que ficou no meio. Retorna True se havia uma."""
+    diario = _ler_diario(armazenamento, prefixo)
+    if diario is None:
+        return False
+    existentes = set(armazenamento.listar(prefixo))
+    if _troca_completa(diario, existentes):
+        log.warning(f"🔧 Terminando compactação interrompida em {prefixo} ({len(diario['origens'])} originais)")
+        apagar = diario["origens"]
+    else:
+        log.warning(f"🧹 Desfazendo compactação interrompida em {prefixo} (os originais continuam valendo)")
+        apagar = diario["compactados"]
+    for caminho in apagar:
+        if caminho in existentes:
+            armazenamento.apagar(caminho)
+    armazenamento.apagar(prefixo + ARQUIVO_DIARIO)
+    return True
+
+
+def _serializar(df):
+    buffer = io.BytesIO()
+    df.write_parquet(
+        buffer,
+        compression="zstd",
+        compression_level=NIVEL_ZSTD,
+        row_group_size=LINHAS_POR_ROW_GROUP,
+        statistics=True,
+    )
+    return buffer.getvalue()
+
+
+def compactar_dia(armazenamento, ano, mes, dia, forcar=False):
+    """
+    Junta os Parquets de um dia. Retorna um dict com o antes/depois, ou None se não havia o que
+    compactar (partição vazia, com um arquivo só ou só com compactados).
+    """
+    prefixo = prefixo_dia(ano, mes, dia)
+    recuperar(armazenamento, prefixo)
+
+    listados = armazenamento.listar(prefixo)
+    origens = arquivos_validos(armazenamento, prefixo, listados)
+    pequenos = [c for c in origens if not c.rsplit("/", 1)[-1].startswith(PREFIXO_COMPACTADO)]
+    if not origens or (not pequenos and not forcar):
+        return None
+    if len(origens) == 1 and not forcar:
+        return None
+
+    bytes_antes = 0
+    partes = []
+    for caminho in origens:
+        dados = armazenamento.ler(caminho)
+        bytes_antes += len(dados)
+        partes.append(pl.read_parquet(io.BytesIO(dados)))
+    # diagonal_relaxed: lotes de dias diferentes da API podem ter uma coluna a mais ou a menos
+    df = pl.concat(partes, how="diagonal_relaxed", rechunk=True)
+    df = df.sort([c for c in ORDENACAO if c in df.columns], nulls_last=True)
+
+    carimbo = datetime.now().strftime("%Y%m%d%H%M%S")
+    total = max(1, -(-df.height // LINHAS_POR_ARQUIVO))
+    novos = [f"{prefixo}{PREFIXO_COMPACTADO}{carimbo}_{parte + 1}de{total}.parquet" for parte in range(total)]
+
+    # Passo 1: o diário vem antes de qualquer compactado (sem ele, ninguém sabe que são cópias)
+    diario = {"origens": origens, "compactados": novos, "em": datetime.now().isoformat(timespec="seconds")}
+    armazenamento.enviar(json.dumps(diario, indent=2).encode(), prefixo + ARQUIVO_DIARIO)
+
+    # Passo 2: os compactados sobem; a troca vale quando o último chega
+    bytes_depois = 0
+    for parte, caminho in enumerate(novos):
+        dados = _serializar(df.slice(parte * LINHAS_POR_ARQUIVO, LINHAS_POR_ARQUIVO))
+        armazenamento.enviar(dados, caminho)
+        bytes_depois += len(dados)
+
+    # Passo 3: limpeza dos originais
+    for caminho in origens:
+        armazenamento.apagar(caminho)
+    armazenamento.apagar(prefixo + ARQUIVO_DIARIO)
+
+    return {
+        "prefixo": prefixo,
+        "arquivos_antes": len(origens),
+        "arquivos_depois": len(novos),
+        "linhas": df.height,
+        "bytes_antes": bytes_antes,
+        "bytes_depois": bytes_depois,
+    }
+
+
+def dias_do_mes(armazenamento, ano, mes):
+    prefixo = f"{PREFIXO_BRONZE}/ano_hive={ano}/mes_hive={mes:02d}/"
+    dias = set()
+    for caminho in armazenamento.listar(prefixo):
+        pasta = caminho[len(prefixo):].split("/", 1)[0]
+        if pasta.startswith("dia_hive="):
+            dias.add(int(pasta.split("=", 1)[1]))
+    return sorted(dias)
+
+
+def relatorio_compactacao(resultado):
+    r = resultado
+    return (f"🗜️  {r['prefixo']}: {r['arquivos_antes']} → {r['arquivos_depois']} arquivos, "
+            f"{r['linhas']} linhas, "
+            f"{r['bytes_antes'] / 1e6:.1f} → {r['bytes_depois'] / 1e6:.1f} MB")
+
+
+def main():
+    from dotenv import load_dotenv
+    from telemetria import configurar_log, descarregar_log
+
+    load_dotenv()
+    configurar_log()
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    forcar = "--forcar" in sys.argv
+
+    armazenamento = obter_armazenamento(os.getenv("STORAGE_PROVIDER", "azure"))
+    if argumentos and len(argumentos[0]) == 7:
+        ano, mes = map(int, argumentos[0].split("-"))
+        dias = [(ano, mes, d) for d in dias_do_mes(armazenamento, ano, mes)]
+    else:
+        # Padrão: ontem (hoje ainda está recebendo lotes)
+        data = datetime.strptime(argumentos[0], "%Y-%m-%d") if argumentos else datetime.now() - timedelta(days=1)
+        dias = [(data.year, data.month, data.day)]
+
+    for ano, mes, dia in dias:
+        resultado = compactar_dia(armazenamento, ano, mes, dia, forcar=forcar)
+        if resultado is None:
+            log.info(f"✅ {prefixo_dia(ano, mes, dia)}: nada para compactar.")
+        else:
+            log.info(relatorio_compactacao(resultado))
+    descarregar_log()
+
+
+if __name__ == "__main__":
+    main()
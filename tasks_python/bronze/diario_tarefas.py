@@ -0,0 +1,246 @@
+import glob
+import io
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+import polars as pl
+from lote_colunar import LoteColunar
+from trava_arquivo import tentar_travar
+
+# --- DIÁRIO DE TAREFAS (RETOMADA APÓS CRASH) ---
+# Cada busca (busca, geohash, termo) concluída é gravada num SQLite local junto com as notas
+# que ainda não subiram para a nuvem. Se o job morrer no meio da fatia, rodar o main() de novo
+# no mesmo dia pula o que já foi feito e reenvia as notas que ficaram pendentes.
+# As buscas são gravadas em blocos (a cada GRAVAR_A_CADA buscas ou GRAVAR_A_CADA_SEGUNDOS) por
+# uma thread própria, não um commit por busca na thread que consome os resultados: numa queda se
+# perdem no máximo os últimos blocos, e essas buscas são só refeitas.
+# Na fila de trabalho cada worker tem o seu diário (`diario_bronze_<worker>.sqlite3`) e segura
+# uma trava nele enquanto vive. O nome padrão do worker muda a cada processo (host-pid), então
+# quem sobe adota os diários sem trava (de workers que morreram): as notas que eles não
+# chegaram a enviar passam para o diário novo e sobem no próximo lote.
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+ARQUIVO_DIARIO = os.path.join(DIRETORIO_ESTADO, "diario_bronze.sqlite3")
+
+DIAS_RETENCAO = 7  # entradas de dias mais antigos são apagadas ao abrir o diário
+GRAVAR_A_CADA = int(os.getenv("DIARIO_GRAVAR_A_CADA", "200"))
+GRAVAR_A_CADA_SEGUNDOS = float(os.getenv("DIARIO_GRAVAR_A_CADA_SEGUNDOS", "5"))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    data TEXT NOT NULL,
+    fatia INTEGER NOT NULL,
+    busca TEXT NOT NULL,
+    geohash TEXT NOT NULL,
+    termo_origem TEXT NOT NULL,
+    qtd_notas INTEGER NOT NULL,
+    lote INTEGER,
+    enviado INTEGER NOT NULL DEFAULT 0,
+    notas BLOB,
+    PRIMARY KEY (data, fatia, busca, geohash, termo_origem)
+);
+CREATE TABLE IF NOT EXISTS lotes (
+    data TEXT NOT NULL,
+    fatia INTEGER NOT NULL,
+    numero INTEGER NOT NULL,
+    caminho TEXT,
+    enviado_em TEXT NOT NULL,
+    PRIMARY KEY (data, fatia, numero)
+);
+"""
+
+
+class DiarioTarefas:
+    """
+    Diário durável de uma fatia (data + número da fatia).
+
+    - `registrar_tarefa` guarda a busca concluída e as notas dela; quando o bloco enche ou
+      envelhece, a thread de escrita grava tudo (Arrow IPC comprimido em zstd, uma transação só).
+      `atribuir_lote` e `fechar` esperam os blocos pendentes chegarem no disco.
+    - `atribuir_lote` marca as tarefas concluídas que ainda não têm lote como parte do lote N.
+    - `confirmar_lote` marca o lote como enviado e apaga as notas guardadas dele.
+    """
+
+    def __init__(self, fatia, data=None, caminho=ARQUIVO_DIARIO, exclusivo=False):
+        self.fatia = fatia
+        self.data = data or datetime.now().strftime("%Y-%m-%d")
+        self.caminho = caminho
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # Exclusivo: a trava fica com este processo até o fechar (é ela que marca o diário como vivo)
+        self._trava_arquivo = None
+        if exclusivo:
+            self._trava_arquivo = tentar_travar(caminho)
+            if self._trava_arquivo is None:
+                raise RuntimeError(f"Diário {caminho} em uso por outro processo (WORKER_ID repetido?)")
+
+        # O upload pode confirmar lotes de outra thread, por isso a trava própria
+        self._trava = threading.Lock()
+        self._bloco = []
+        self._ultima_entrega = time.monotonic()
+        self._blocos = queue.Queue(maxsize=4)  # cheia, o consumidor espera: a memória não cresce
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.executescript(ESQUEMA)
+
+        limite = (datetime.now() - timedelta(days=DIAS_RETENCAO)).strftime("%Y-%m-%d")
+        with self._conexao:
+            self._conexao.execute("DELETE FROM tarefas WHERE data < ?", (limite,))
+            self._conexao.execute("DELETE FROM lotes WHERE data < ?", (limite,))
+
+        self._escritor = threading.Thread(target=self._escrever, name="diario-escrita", daemon=True)
+        self._escritor.start()
+
+    def tarefas_concluidas(self):
+        """Conjunto de (busca, geohash, termo_origem) já feitos hoje nessa fatia."""
+        with self._trava:
+            linhas = self._conexao.execute(
+                "SELECT busca, geohash, termo_origem FROM tarefas WHERE data = ? AND fatia = ?",
+                (self.data, self.fatia),
+            ).fetchall()
+        return set(linhas)
+
+    def notas_pendentes(self):
+        """
+        Notas de tarefas concluídas que ainda não chegaram na nuvem (para reenviar).
+        Elas voltam a ficar sem lote, para entrarem no próximo `atribuir_lote`.
+        """
+        notas = LoteColunar()
+        with self._trava:
+            with self._conexao:
+                self._conexao.execute(
+                    "UPDATE tarefas SET lote = NULL WHERE data = ? AND fatia = ? AND enviado = 0",
+                    (self.data, self.fatia),
+                )
+            cursor = self._conexao.execute(
+                "SELECT notas FROM tarefas WHERE data = ? AND fatia = ? AND enviado = 0 AND notas IS NOT NULL",
+                (self.data, self.fatia),
+            )
+            for (blob,) in cursor:
+                notas.anexar(pl.read_ipc(io.BytesIO(blob)))
+        return notas
+
+    def adotar_orfaos(self, padrao=None):
+        """
+        Traz para este diário as notas pendentes de hoje dos diários sem trava que casam com
+        `padrao` (padrão: os outros diários por worker ao lado deste) e apaga esses arquivos.
+        Chame antes de `notas_pendentes`. Retorna o número de buscas adotadas.
+        """
+        padrao = padrao or ARQUIVO_DIARIO.replace(".sqlite3", "_*.sqlite3")
+        adotadas = 0
+        for caminho in sorted(glob.glob(padrao)):
+            if os.path.abspath(caminho) == os.path.abspath(self.caminho):
+                continue
+            trava = tentar_travar(caminho)
+            if trava is None:
+                continue  # worker vivo
+            try:
+                if not os.path.exists(caminho):
+                    continue  # outro processo adotou e apagou enquanto isto esperava
+                with self._trava:
+                    self._conexao.execute("ATTACH DATABASE ? AS orfao", (caminho,))
+                    try:
+                        with self._conexao:
+                            cursor = self._conexao.execute(
+                                "INSERT OR REPLACE INTO tarefas (data, fatia, busca, geohash, termo_origem, qtd_notas, lote, enviado, notas) "
+                                "SELECT data, ?, busca, geohash, termo_origem, qtd_notas, NULL, 0, notas "
+                                "FROM orfao.tarefas WHERE data = ? AND enviado = 0 AND notas IS NOT NULL",
+                                (self.fatia, self.data),
+                            )
+                            adotadas += cursor.rowcount
+                    finally:
+                        self._conexao.execute("DETACH DATABASE orfao")
+                for sufixo in ("", "-wal", "-shm"):
+                    if os.path.exists(caminho + sufixo):
+                        os.remove(caminho + sufixo)
+            finally:
+                trava.close()
+            os.remove(caminho + ".lock")
+        return adotadas
+
+    def proximo_lote(self):
+        with self._trava:
+            (ultimo,) = self._conexao.execute(
+                "SELECT COALESCE(MAX(numero), 0) FROM lotes WHERE data = ? AND fatia = ?",
+                (self.data, self.fatia),
+            ).fetchone()
+        return ultimo + 1
+
+    def registrar_tarefa(self, tarefa_info, resultado):
+        busca, geohash, termo_base, _ = tarefa_info
+        self._bloco.append((busca, geohash, termo_base, resultado))
+        if len(self._bloco) >= GRAVAR_A_CADA or time.monotonic() - self._ultima_entrega >= GRAVAR_A_CADA_SEGUNDOS:
+            self._entregar_bloco()
+
+    def _entregar_bloco(self):
+        self._ultima_entrega = time.monotonic()
+        if self._bloco:
+            self._blocos.put(self._bloco)
+            self._bloco = []
+
+    def _descarregar(self):
+        """Entrega o bloco aberto e espera a thread de escrita gravar tudo."""
+        self._entregar_bloco()
+        self._blocos.join()
+
+    def _escrever(self):
+        while True:
+            bloco = self._blocos.get()
+            try:
+                if bloco is None:
+                    return
+                self._gravar(bloco)
+            finally:
+                self._blocos.task_done()
+
+    def _gravar(self, bloco):
+        linhas = []
+        for busca, geohash, termo_base, resultado in bloco:
+            qtd_notas = len(resultado) if resultado is not None else 0
+            blob = None
+            if qtd_notas:
+                buffer = io.BytesIO()
+                resultado.write_ipc(buffer, compression="zstd")
+                blob = buffer.getvalue()
+            linhas.append((self.data, self.fatia, busca, geohash, termo_base, qtd_notas, blob))
+        with self._trava, self._conexao:
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO tarefas (data, fatia, busca, geohash, termo_origem, qtd_notas, lote, enviado, notas) "
+                "VALUES (?, ?, ?, ?, ?, ?, NULL, 0, ?)",
+                linhas,
+            )
+
+    def atribuir_lote(self, numero_lote):
+        # Só as tarefas ainda sem lote: um lote que falhou é reenviado junto com o próximo e
+        # confirmado pelo próprio número (o estágio de upload avisa todos os números de uma vez)
+        self._descarregar()
+        with self._trava, self._conexao:
+            self._conexao.execute(
+                "UPDATE tarefas SET lote = ? WHERE data = ? AND fatia = ? AND lote IS NULL",
+                (numero_lote, self.data, self.fatia),
+            )
+
+    def confirmar_lote(self, numero_lote, caminho_blob=None):
+        with self._trava, self._conexao:
+            self._conexao.execute(
+                "UPDATE tarefas SET enviado = 1, notas = NULL WHERE data = ? AND fatia = ? AND lote = ?",
+                (self.data, self.fatia, numero_lote),
+            )
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO lotes (data, fatia, numero, caminho, enviado_em) VALUES (?, ?, ?, ?, ?)",
+                (self.data, self.fatia, numero_lote, caminho_blob, datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def fechar(self):
+        self._descarregar()
+        self._blocos.put(None)
+        self._escritor.join()
+        with self._trava:
+            self._conexao.close()
+        if self._trava_arquivo is not None:
+            self._trava_arquivo.close()
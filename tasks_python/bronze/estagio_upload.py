@@ -0,0 +1,123 @@
+import logging
+import queue
+import threading
+
+# --- ESTÁGIO DE UPLOAD EM SEGUNDO PLANO ---
+# Montar o DataFrame, comprimir em zstd e subir para a nuvem (com retries de até 1 minuto)
+# travava a extração inteira. Agora o main() só entrega o lote numa fila curta e segue coletando;
+# uma thread dedicada serializa e envia. Se a fila encher, o main() espera (backpressure),
+# então a memória nunca passa de alguns lotes. Lotes que falham também têm teto: acima de
+# `limite_memoria` notas retidas, vão para o disco (transbordo_lotes.py) em vez de crescer na RAM.
+
+log = logging.getLogger("bronze")
+
+# Retorno de `funcao_envio` quando não sobrou nota nova para subir (lote vazio ou todo
+# deduplicado): os lotes são confirmados, mas não contam como enviados
+SEM_NOTAS_NOVAS = "sem_notas_novas"
+
+
+class EstagioUpload:
+    """
+    Thread única que consome lotes (LoteColunar) de uma fila limitada e chama `funcao_envio(notas, numero_lote)`.
+
+    - Se um lote falhar, as notas ficam retidas e vão junto com o próximo lote (como antes no main()).
+    - Se as retidas passarem de `limite_memoria`, `transbordar(notas, numero_lote)` grava tudo no
+      disco; dando certo, a memória é liberada e os lotes contam como entregues.
+    - `ao_confirmar(numeros)` é chamado com todos os números de lote que subiram, foram para o
+      disco ou não tinham nota nova (SEM_NOTAS_NOVAS): nenhum deles é reenviado na retomada.
+    - `encerrar()` espera a fila esvaziar, transborda o que ainda estiver retido e diz se sobrou
+      alguma nota só na memória.
+    """
+
+    def __init__(self, funcao_envio, ao_confirmar=None, capacidade=2, transbordar=None, limite_memoria=0):
+        self.funcao_envio = funcao_envio
+        self.ao_confirmar = ao_confirmar
+        self.transbordar = transbordar
+        self.limite_memoria = limite_memoria
+        self.lotes_enviados = 0
+        self.lotes_transbordados = 0
+        self.lotes_sem_notas_novas = 0
+
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._retidas = None
+        self._lotes_retidos = []
+        self._thread = threading.Thread(target=self._trabalhar, name="estagio-upload", daemon=True)
+        self._thread.start()
+
+    def enviar(self, notas, numero_lote):
+        # Bloqueia se já existirem `capacidade` lotes esperando: é o freio da extração
+        self._fila.put((notas, numero_lote))
+
+    def _trabalhar(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                return
+
+            notas, numero_lote = item
+            if self._retidas:
+                self._retidas.estender(notas)
+                dados = self._retidas
+            else:
+                dados = notas
+            numeros = self._lotes_retidos + [numero_lote]
+            if not dados:
+                # Lote sem notas: nada a subir, mas o diário e a fila precisam saber que ele acabou
+                self.lotes_sem_notas_novas += 1
+                self._liberar(numeros)
+                continue
+
+            try:
+                sucesso = self.funcao_envio(dados, numero_lote)
+            except Exception as e:
+                log.error(f"❌ Erro inesperado ao preparar o Lote {numero_lote}: {e}")
+                sucesso = False
+
+            if sucesso == SEM_NOTAS_NOVAS:
+                self.lotes_sem_notas_novas += 1
+                self._liberar(numeros)
+            elif sucesso:
+                self.lotes_enviados += 1
+                self._liberar(numeros)
+            else:
+                self._retidas = dados
+                self._lotes_retidos = numeros
+                if len(dados) > self.limite_memoria and self._transbordar(numero_lote):
+                    continue
+                log.warning("⚠️ Retendo dados na memória para tentar enviar junto com o próximo lote...")
+
+    def _liberar(self, numeros):
+        self._retidas = None
+        self._lotes_retidos = []
+        if self.ao_confirmar:
+            self.ao_confirmar(numeros)
+
+    def _transbordar(self, numero_lote):
+        """Grava as notas retidas no disco. Retorna True se a memória pôde ser liberada."""
+        if not self.transbordar or not self._retidas:
+            return False
+        try:
+            sucesso = self.transbordar(self._retidas, numero_lote)
+        except Exception as e:
+            log.error(f"❌ Erro ao transbordar o Lote {numero_lote} para o disco: {e}")
+            sucesso = False
+        if sucesso:
+            self.lotes_transbordados += 1
+            self._liberar(self._lotes_retidos)
+        return sucesso
+
+    def pendentes(self):
+        """Lotes esperando na fila do upload (o que ainda segura a extração)."""
+        return self._fila.qsize()
+
+    def notas_retidas(self):
+        """Quantidade de notas retidas de lotes que falharam."""
+        return len(self._retidas) if self._retidas else 0
+
+    def encerrar(self):
+        """Envia o que estiver na fila e para a thread. Retorna True se nada ficou retido."""
+        self._fila.put(None)
+        self._thread.join()
+        if self._lotes_retidos:
+            self._transbordar(self._lotes_retidos[-1])
+        return not self._retidas
@@ -0,0 +1,255 @@
+import asyncio
+import threading
+import time
+import aiohttp
+import polars as pl
+from limitador_taxa import ler_retry_after
+from lote_colunar import ler_pagina, adicionar_origem, juntar
+from telemetria import metricas, classe_status
+
+# --- MOTOR ASSÍNCRONO DE EXTRAÇÃO ---
+# Mantém centenas de consultas paginadas "no ar" usando um único event loop
+# rodando numa thread dedicada. O main() continua trabalhando com Futures
+# normais (concurrent.futures), igual fazia com o ThreadPoolExecutor.
+
+
+class ControleConcorrencia:
+    """
+    Limite adaptativo de requisições simultâneas (estilo AIMD do TCP).
+
+    - Começa em "slow start": cada sucesso soma 1 ao limite até o primeiro sinal de congestionamento.
+    - Depois cresce devagar (+1 a cada `limite` sucessos, ou seja, ~+1 por rodada).
+    - Corta o limite quando aparecem erros (timeout, 5xx, 429) ou quando a latência média
+      passa de `tolerancia_latencia` vezes a latência base observada.
+    """
+
+    def __init__(self, inicial=20, minimo=4, maximo=300, tolerancia_latencia=2.0):
+        self.limite = float(inicial)
+        self.minimo = minimo
+        self.maximo = maximo
+        self.tolerancia_latencia = tolerancia_latencia
+
+        self.em_voo = 0
+        self.latencia_media = None
+        self.latencia_base = None
+        self._slow_start = True
+        self._ultimo_corte = 0.0
+        self._condicao = None
+
+    def _obter_condicao(self):
+        # Criada sob demanda para nascer dentro do event loop do motor
+        if self._condicao is None:
+            self._condicao = asyncio.Condition()
+        return self._condicao
+
+    async def adquirir(self):
+        condicao = self._obter_condicao()
+        async with condicao:
+            await condicao.wait_for(lambda: self.em_voo < int(self.limite))
+            self.em_voo += 1
+
+    async def liberar(self, latencia, erro):
+        condicao = self._obter_condicao()
+        async with condicao:
+            self.em_voo -= 1
+            self._ajustar(latencia, erro)
+            condicao.notify_all()
+
+    def _cortar(self, fator):
+        agora = time.monotonic()
+        # Evita cortar várias vezes pelo mesmo "congestionamento" (uma vez por rodada)
+        janela = self.latencia_media or 1.0
+        if agora - self._ultimo_corte < janela:
+            return
+        self._ultimo_corte = agora
+        self._slow_start = False
+        self.limite = max(self.minimo, self.limite * fator)
+
+    def _ajustar(self, latencia, erro):
+        if erro:
+            self._cortar(0.75)
+            return
+
+        if self.latencia_media is None:
+            self.latencia_media = latencia
+        else:
+            self.latencia_media = 0.9 * self.latencia_media + 0.1 * latencia
+
+        if self.latencia_base is None or self.latencia_media < self.latencia_base:
+            self.latencia_base = self.latencia_media
+        else:
+            # Deixa a base "esquecer" devagar, para acompanhar mudanças reais da API
+            self.latencia_base *= 1.001
+
+        if self.latencia_media > self.latencia_base * self.tolerancia_latencia:
+            self._cortar(0.9)
+        elif self._slow_start:
+            self.limite = min(self.maximo, self.limite + 1)
+        else:
+            self.limite = min(self.maximo, self.limite + 1 / self.limite)
+
+
+class MotorExtracaoAsync:
+    """
+    Executa `extrair` (a versão assíncrona de extrair_dados_variacao) num event loop próprio.
+
+    A interface imita o ThreadPoolExecutor: `submit(...)` devolve um concurrent.futures.Future
+    e `shutdown(wait, cancel_futures)` encerra tudo. O `evento_parada` é o mesmo "botão de pânico"
+    usado pelas threads, então o Ctrl+C continua funcionando igual.
+    """
+
+    def __init__(self, api_url, evento_parada, limitador, limite_conexoes=200, controle=None):
+        self.api_url = api_url
+        self.evento_parada = evento_parada
+        self.limitador = limitador
+        self.limite_conexoes = limite_conexoes
+        self.controle = controle or ControleConcorrencia(maximo=limite_conexoes)
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="motor-async", daemon=True)
+        self._thread.start()
+        self._sessao = asyncio.run_coroutine_threadsafe(self._abrir_sessao(), self._loop).result()
+        self._futuros = set()
+        self._trava_futuros = threading.Lock()
+        self._encerrado = False
+
+    async def _abrir_sessao(self):
+        # Pool de conexões limitado: nunca abre mais sockets do que o teto de concorrência
+        conector = aiohttp.TCPConnector(limit=self.limite_conexoes, ttl_dns_cache=300)
+        return aiohttp.ClientSession(connector=conector, timeout=aiohttp.ClientTimeout(total=20))
+
+    async def _aguardar(self, segundos):
+        # Equivalente assíncrono do evento_parada.wait(): acorda cedo se apertarem o botão de pânico
+        limite = time.monotonic() + segundos
+        while not self.evento_parada.is_set():
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            await asyncio.sleep(min(restante, 0.25))
+
+    async def _requisitar(self, params):
+        # Primeiro a ficha do limitador de taxa (compartilhado pelo processo), depois a vaga de concorrência
+        if not await self.limitador.adquirir_async(self.evento_parada):
+            return None, None
+
+        await self.controle.adquirir()
+        inicio = time.monotonic()
+        erro = True
+        try:
+            async with self._sessao.get(self.api_url, params=params) as r:
+                metricas.incrementar("requisicoes", status=classe_status(r.status))
+                if r.status == 200:
+                    corpo = await r.read()
+                    metricas.observar("http", time.monotonic() - inicio)
+                    # JSON direto para colunas (sem passar por dicts Python)
+                    with metricas.medir("parse"):
+                        dados = ler_pagina(corpo)
+                    erro = False
+                    self.limitador.registrar_sucesso()
+                    return r.status, dados
+                metricas.observar("http", time.monotonic() - inicio)
+                if r.status == 429:
+                    self.limitador.registrar_429(ler_retry_after(r.headers.get("Retry-After")))
+                return r.status, None
+        finally:
+            await self.controle.liberar(time.monotonic() - inicio, erro)
+
+    async def extrair(self, busca, geohash, termo_base, cidade_nome, criterio_parada=None):
+        # Mesma lógica de paginação e retries do extrair_dados_variacao (versão com threads)
+        paginas = []
+        offset = 0
+        continua_variacao = True
+
+        while offset < 500 and continua_variacao:
+            if self.evento_parada.is_set():
+                break
+
+            params = {"termo": busca, "local": geohash, "raio": "20", "offset": str(offset)}
+            sucesso_chamada = False
+
+            for tentativa in range(1, 6):
+                if self.evento_parada.is_set():
+                    break
+                if tentativa > 1:
+                    metricas.incrementar("retentativas")
+
+                try:
+                    status, dados = await self._requisitar(params)
+
+                    if status is None:
+                        # Botão de pânico apertado enquanto esperava a vez no limitador
+                        break
+
+                    if status == 200:
+                        if dados.height == 0:
+                            sucesso_chamada = True
+                            continua_variacao = False
+                            break
+
+                        paginas.append(dados)
+                        metricas.incrementar("paginas")
+
+                        # O critério vê toda página (para contabilizar) e pode encerrar a busca antes do fim
+                        parar = criterio_parada is not None and criterio_parada(dados)
+                        if len(dados) < 50 or parar:
+                            continua_variacao = False
+                        else:
+                            offset += 50
+
+                        sucesso_chamada = True
+                        break
+
+                    elif status == 429:
+                        # A pausa agora é coletiva: o limitador já segurou todo mundo
+                        continue
+
+                    else:
+                        await self._aguardar(2 * tentativa)
+
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, pl.exceptions.PolarsError):
+                    metricas.incrementar("requisicoes", status="erro")
+                    if tentativa == 5:
+                        continua_variacao = False
+                        break
+                    await self._aguardar(20 * tentativa)
+
+            if not sucesso_chamada:
+                break
+
+        return adicionar_origem(juntar(paginas), termo_base, cidade_nome, geohash)
+
+    def submit(self, busca, geohash, termo_base, cidade_nome, criterio_parada=None):
+        futuro = asyncio.run_coroutine_threadsafe(
+            self.extrair(busca, geohash, termo_base, cidade_nome, criterio_parada), self._loop
+        )
+        with self._trava_futuros:
+            self._futuros.add(futuro)
+        futuro.add_done_callback(self._descartar_futuro)
+        return futuro
+
+    def _descartar_futuro(self, futuro):
+        with self._trava_futuros:
+            self._futuros.discard(futuro)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if self._encerrado:
+            return
+        self._encerrado = True
+
+        with self._trava_futuros:
+            pendentes = list(self._futuros)
+
+        if cancel_futures:
+            for futuro in pendentes:
+                futuro.cancel()
+        elif wait:
+            for futuro in pendentes:
+                try:
+                    futuro.result()
+                except Exception:
+                    pass
+
+        asyncio.run_coroutine_threadsafe(self._sessao.close(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if wait:
+            self._thread.join(timeout=10)
@@ -0,0 +1,252 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+# --- FILA DE TRABALHO COM LEASES (VÁRIOS WORKERS NA MESMA RODADA) ---
+# O fatiamento fixo (1/7 dos geohashes por dia, um processo só) não deixa colocar um segundo
+# worker para terminar mais rápido nem cobrir todos os municípios todo dia. Com MODO_FILA=1,
+# cada worker põe as buscas da rodada num SQLite compartilhado (INSERT OR IGNORE: tanto faz quem
+# chega primeiro) e vai pegando blocos delas com um lease. Uma thread de batimento renova os
+# leases do worker enquanto ele vive; se ele morrer, o lease expira e outro worker refaz a busca.
+# A busca só é dada como concluída quando o lote com as notas dela chega no storage; até lá ela
+# fica 'coletada' (ainda com lease, e refeita por outro worker se este morrer antes do upload).
+#
+# Sem serviço externo: basta os workers enxergarem o mesmo arquivo (mesmo host ou volume local
+# montado nos containers; o SQLite em WAL não funciona bem em compartilhamento de rede).
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+ARQUIVO_FILA = os.getenv("FILA_TRABALHO_ARQUIVO", os.path.join(DIRETORIO_ESTADO, "fila_bronze.sqlite3"))
+
+LEASE_SEGUNDOS = float(os.getenv("FILA_LEASE_SEGUNDOS", "120"))
+TAMANHO_RESERVA = int(os.getenv("FILA_TAMANHO_RESERVA", "100"))  # buscas pegas de uma vez
+ESPERA_SEGUNDOS = float(os.getenv("FILA_ESPERA_SEGUNDOS", "5"))  # intervalo para procurar leases expirados
+MAX_TENTATIVAS = 5  # depois disso a busca fica como 'falhou' (ex: derruba todo worker que a pega)
+DIAS_RETENCAO = 7
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    rodada TEXT NOT NULL,
+    busca TEXT NOT NULL,
+    geohash TEXT NOT NULL,
+    termo_origem TEXT NOT NULL,
+    cidade TEXT NOT NULL,
+    ordem INTEGER NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    dono TEXT,
+    expira_em REAL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    concluida_em TEXT,
+    PRIMARY KEY (rodada, busca, geohash, termo_origem)
+);
+CREATE INDEX IF NOT EXISTS tarefas_estado ON tarefas (rodada, estado, ordem);
+"""
+
+
+def identificador_worker():
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class FilaTrabalho:
+    """
+    Fila de (busca, geohash, termo_origem, cidade) de uma rodada (padrão: a data de hoje).
+
+    - `popular(tarefas)` é idempotente; `proxima(esperar)` devolve a próxima busca deste worker
+      (reservando um bloco quando o buffer local acaba) ou None quando a rodada acabou.
+    - `coletada` / `fechar_lote(n)` / `confirmar(numeros)`: mesmo ciclo das marcas incrementais,
+      a busca só vira 'concluida' quando o lote dela sobe.
+    - `encerrar()` para o batimento e devolve para a fila o que o worker pegou e não entregou.
+    """
+
+    def __init__(self, rodada=None, caminho=ARQUIVO_FILA, worker=None,
+                 lease=LEASE_SEGUNDOS, tamanho_reserva=TAMANHO_RESERVA):
+        self.rodada = rodada or datetime.now().strftime("%Y-%m-%d")
+        self.worker = worker or identificador_worker()
+        self.lease = lease
+        self.tamanho_reserva = tamanho_reserva
+        self.reservadas = 0
+        self.retomadas = 0  # buscas cujo lease de outro worker tinha expirado
+        self.concluidas = 0
+        self._buffer = deque()
+        self._abertas = []
+        self._sem_marcar = []
+        self._por_lote = {}
+        self._parar = threading.Event()
+        self._batimento = None
+
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._trava = threading.Lock()
+        # isolation_level=None: as transações são abertas à mão com BEGIN IMMEDIATE
+        self._conexao = sqlite3.connect(caminho, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.executescript(ESQUEMA)
+
+        limite = (datetime.now() - timedelta(days=DIAS_RETENCAO)).strftime("%Y-%m-%d")
+        with self._transacao():
+            self._conexao.execute("DELETE FROM tarefas WHERE rodada < ?", (limite,))
+
+    def _transacao(self):
+        trava, conexao = self._trava, self._conexao
+
+        class Transacao:
+            def __enter__(self):
+                trava.acquire()
+                conexao.execute("BEGIN IMMEDIATE")  # trava de escrita entre processos já na entrada
+                return conexao
+
+            def __exit__(self, tipo, *_):
+                try:
+                    conexao.execute("ROLLBACK" if tipo else "COMMIT")
+                finally:
+                    trava.release()
+
+        return Transacao()
+
+    def popular(self, tarefas):
+        with self._transacao() as c:
+            c.executemany(
+                "INSERT OR IGNORE INTO tarefas (rodada, busca, geohash, termo_origem, cidade, ordem) VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.rodada, t[0], t[1], t[2], t[3], i) for i, t in enumerate(tarefas)],
+            )
+
+    def reservar(self, quantidade):
+        agora = time.time()
+        with self._transacao() as c:
+            c.execute(
+                "UPDATE tarefas SET estado = 'falhou' WHERE rodada = ? AND estado IN ('em_andamento', 'coletada') "
+                "AND expira_em < ? AND tentativas >= ?",
+                (self.rodada, agora, MAX_TENTATIVAS),
+            )
+            linhas = c.execute(
+                "SELECT busca, geohash, termo_origem, cidade, estado FROM tarefas WHERE rodada = ? "
+                "AND (estado = 'pendente' OR (estado IN ('em_andamento', 'coletada') AND expira_em < ?)) "
+                "ORDER BY ordem LIMIT ?",
+                (self.rodada, agora, quantidade),
+            ).fetchall()
+            c.executemany(
+                "UPDATE tarefas SET estado = 'em_andamento', dono = ?, expira_em = ?, tentativas = tentativas + 1 "
+                "WHERE rodada = ? AND busca = ? AND geohash = ? AND termo_origem = ?",
+                [(self.worker, agora + self.lease, self.rodada, l[0], l[1], l[2]) for l in linhas],
+            )
+        self.reservadas += len(linhas)
+        self.retomadas += sum(1 for l in linhas if l[4] != "pendente")
+        return [tuple(l[:4]) for l in linhas]
+
+    def _em_andamento_de_outros(self):
+        # Só as que estão sendo baixadas: as 'coletadas' de um worker vivo não voltam para a fila
+        with self._trava:
+            (qtd,) = self._conexao.execute(
+                "SELECT COUNT(*) FROM tarefas WHERE rodada = ? AND estado = 'em_andamento' AND dono != ? AND tentativas < ?",
+                (self.rodada, self.worker, MAX_TENTATIVAS),
+            ).fetchone()
+        return qtd
+
+    def proxima(self, esperar=False, evento_parada=None):
+        """
+        Próxima busca para este worker. Com `esperar=True` (o worker está ocioso), se outros
+        workers ainda têm buscas em andamento, fica aguardando algum lease expirar.
+        """
+        if not self._buffer:
+            self._buffer.extend(self.reservar(self.tamanho_reserva))
+        if not self._buffer and esperar:
+            # Antes de esperar pelos outros, mostra que as nossas já foram baixadas (senão dois
+            # workers ociosos ficariam esperando um pelo outro)
+            self._marcar_coletadas()
+        while not self._buffer and esperar and self._em_andamento_de_outros():
+            if evento_parada is not None and evento_parada.wait(ESPERA_SEGUNDOS):
+                return None
+            if evento_parada is None:
+                time.sleep(ESPERA_SEGUNDOS)
+            self._buffer.extend(self.reservar(self.tamanho_reserva))
+        return self._buffer.popleft() if self._buffer else None
+
+    def _renovar(self):
+        with self._transacao() as c:
+            c.execute(
+                "UPDATE tarefas SET expira_em = ? WHERE rodada = ? AND dono = ? AND estado IN ('em_andamento', 'coletada')",
+                (time.time() + self.lease, self.rodada, self.worker),
+            )
+
+    def _bater(self):
+        while not self._parar.wait(self.lease / 3):
+            try:
+                self._renovar()
+            except sqlite3.Error:
+                pass  # tenta de novo no próximo batimento, ainda sobra 2/3 do lease
+
+    def iniciar(self):
+        self._batimento = threading.Thread(target=self._bater, name="fila-batimento", daemon=True)
+        self._batimento.start()
+        return self
+
+    def coletada(self, tarefa_info):
+        with self._trava:
+            self._abertas.append(tuple(tarefa_info[:3]))
+            self._sem_marcar.append(tuple(tarefa_info[:3]))
+
+    def _marcar_coletadas(self):
+        # Em blocos (a cada lote e quando o worker fica ocioso), não uma transação por busca
+        with self._trava:
+            chaves, self._sem_marcar = self._sem_marcar, []
+        if not chaves:
+            return
+        with self._transacao() as c:
+            c.executemany(
+                "UPDATE tarefas SET estado = 'coletada' "
+                "WHERE rodada = ? AND busca = ? AND geohash = ? AND termo_origem = ? AND dono = ? AND estado = 'em_andamento'",
+                [(self.rodada, b, g, t, self.worker) for b, g, t in chaves],
+            )
+
+    def fechar_lote(self, numero_lote):
+        with self._trava:
+            self._por_lote.setdefault(numero_lote, []).extend(self._abertas)
+            self._abertas = []
+        self._marcar_coletadas()
+
+    def confirmar(self, numeros_lote):
+        with self._trava:
+            chaves = [chave for numero in numeros_lote for chave in self._por_lote.pop(numero, [])]
+        if not chaves:
+            return
+        agora = datetime.now().isoformat(timespec="seconds")
+        with self._transacao() as c:
+            c.executemany(
+                "UPDATE tarefas SET estado = 'concluida', concluida_em = ? "
+                "WHERE rodada = ? AND busca = ? AND geohash = ? AND termo_origem = ? AND dono = ?",
+                [(agora, self.rodada, b, g, t, self.worker) for b, g, t in chaves],
+            )
+        self.concluidas += len(chaves)
+
+    def contagem(self):
+        with self._trava:
+            return dict(self._conexao.execute(
+                "SELECT estado, COUNT(*) FROM tarefas WHERE rodada = ? GROUP BY estado", (self.rodada,)
+            ).fetchall())
+
+    def resumo(self):
+        estados = self.contagem()
+        return (f"🧵 Fila {self.rodada} (worker {self.worker}): {self.reservadas} buscas pegas "
+                f"({self.retomadas} de leases expirados), {self.concluidas} concluídas por este worker | "
+                f"rodada: {estados.get('concluida', 0)} concluídas, {estados.get('pendente', 0)} pendentes, "
+                f"{estados.get('em_andamento', 0) + estados.get('coletada', 0)} em andamento, "
+                f"{estados.get('falhou', 0)} falharam")
+
+    def encerrar(self):
+        self._parar.set()
+        if self._batimento:
+            self._batimento.join()
+        # O que este worker pegou e não entregou volta para a fila na hora (sem esperar o lease)
+        with self._transacao() as c:
+            c.execute(
+                "UPDATE tarefas SET estado = 'pendente', dono = NULL, expira_em = NULL "
+                "WHERE rodada = ? AND dono = ? AND estado IN ('em_andamento', 'coletada')",
+                (self.rodada, self.worker),
+            )
+        with self._trava:
+            self._conexao.close()
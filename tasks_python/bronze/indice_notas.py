@@ -0,0 +1,203 @@
+import io
+import os
+import hashlib
+import shutil
+import threading
+import uuid
+import polars as pl
+from trava_arquivo import travar, gravar_parquet
+
+# --- ÍNDICE DE NOTAS JÁ GRAVADAS (DEDUPLICAÇÃO ENTRE LOTES E ENTRE DIAS) ---
+# O `unique(subset=["id"])` do processar_e_salvar_lote só enxerga o lote atual. A mesma nota,
+# vinda de geohashes vizinhos ou de outra variação, acabava gravada em vários lotes e em vários
+# dias do mês, inflando o bronze e todas as leituras dele. Aqui guardamos, por mês, as chaves
+# (int64) de todas as notas que já subiram, e o lote novo só leva as que ainda não estão lá.
+#
+# O custo por lote não cresce com o mês:
+#   - cada lote confirmado grava só um arquivo delta com as chaves dele (`AAAA-MM.k2.delta/`,
+#     nome único por processo, sem trava); a cada DELTAS_PARA_JUNTAR deltas, quem registra junta
+#     tudo na base ordenada (`AAAA-MM.k2.parquet`) sob a trava entre processos (trava_arquivo.py);
+#   - a consulta procura as chaves do lote na base por busca binária (`search_sorted`) e nos
+#     poucos deltas com `is_in`; base e deltas ficam em memória e só o que mudou no disco é relido.
+# Vários workers da fila dividem os mesmos arquivos. Um delta lido no meio de uma junção pode
+# faltar por uma consulta: a nota sobe repetida uma vez e a silver deduplica.
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+DIRETORIO_INDICE = os.path.join(DIRETORIO_ESTADO, "indice_notas")
+
+MESES_RETIDOS = 3  # índices de meses mais antigos que isso são apagados (as partições deles não mudam mais)
+DELTAS_PARA_JUNTAR = int(os.getenv("INDICE_DELTAS_PARA_JUNTAR", "32"))
+# Esquema das chaves no nome do arquivo: índices gravados com outro esquema são descartados
+ESQUEMA_CHAVES = "k2"
+
+# Faixas das chaves: decimal em [0, 2^60), hexadecimal em [2^60, 2^61), resto por hash (int64 inteiro)
+LIMITE_NUMERICO = 1 << 60
+PADRAO_DECIMAL = r"^(0|[1-9][0-9]{0,17})$"
+PADRAO_HEXA = r"^[1-9a-f][0-9a-f]{0,14}$"
+
+
+def _hash_texto(valor):
+    # O hash nativo do Polars muda entre versões, então não serve para disco
+    return int.from_bytes(hashlib.blake2b(valor.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def chaves_ids(serie):
+    """
+    Chave int64 estável de cada ID, vetorizada. IDs inteiros viram a própria chave; textos
+    decimais (sem zeros à esquerda) e hexadecimais minúsculos de até 15 dígitos são convertidos
+    em faixas separadas, para "10" e "a" não colidirem. Só o que não casa com nenhum dos dois
+    passa por um blake2b de 8 bytes, um por um (chance de colisão ~1e-6 com milhões por mês).
+    """
+    if serie.dtype.is_integer():
+        return serie.cast(pl.Int64)
+    texto = serie.cast(pl.String)
+    df = pl.DataFrame({"id": texto}).select(
+        pl.when(pl.col("id").str.contains(PADRAO_DECIMAL))
+        .then(pl.col("id").str.to_integer(strict=False))
+        .alias("decimal"),
+        pl.when(pl.col("id").str.contains(PADRAO_HEXA))
+        .then(pl.col("id").str.to_integer(base=16, strict=False) + LIMITE_NUMERICO)
+        .alias("hexa"),
+    )
+    decimal = df.get_column("decimal")
+    chaves = pl.Series(serie.name, decimal.set(decimal >= LIMITE_NUMERICO, None), dtype=pl.Int64)
+    chaves = chaves.fill_null(df.get_column("hexa"))
+    sem_chave = chaves.is_null() & texto.is_not_null()
+    if sem_chave.any():
+        posicoes = sem_chave.arg_true().to_list()
+        valores = texto.gather(posicoes).to_list()
+        chaves = chaves.scatter(posicoes, [_hash_texto(v) for v in valores])
+    return chaves.rename(serie.name)  # ID nulo fica sem chave (nunca é dado como repetido)
+
+
+def _ler_chaves(caminho):
+    # Lê os bytes de uma vez: a base pode ser trocada (os.replace) por outro processo no meio da leitura
+    with open(caminho, "rb") as arquivo:
+        return pl.read_parquet(io.BytesIO(arquivo.read())).get_column("chave")
+
+
+class IndiceNotas:
+    """
+    Conjunto persistente de IDs de notas por mês (base ordenada + deltas por lote).
+
+    - `filtrar_novas(df, ano, mes)` devolve só as notas cujo ID ainda não foi gravado no mês.
+    - `registrar(df, ano, mes)` junta os IDs do lote ao índice; chame só DEPOIS do upload dar certo,
+      senão uma falha faria as notas sumirem das próximas tentativas.
+    """
+
+    def __init__(self, diretorio=DIRETORIO_INDICE):
+        self.diretorio = diretorio
+        self.total_descartadas = 0
+        self._bases = {}     # (ano, mes) -> chaves ordenadas da base
+        self._versoes = {}   # (ano, mes) -> mtime da base lida
+        self._deltas = {}    # (ano, mes) -> {nome do delta: chaves}
+        self._trava = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+        self._limpar_antigos()
+
+    def _arquivo(self, ano, mes):
+        return os.path.join(self.diretorio, f"{ano:04d}-{mes:02d}.{ESQUEMA_CHAVES}.parquet")
+
+    def _pasta_deltas(self, ano, mes):
+        return os.path.join(self.diretorio, f"{ano:04d}-{mes:02d}.{ESQUEMA_CHAVES}.delta")
+
+    def _limpar_antigos(self):
+        sufixo = f".{ESQUEMA_CHAVES}.parquet"
+        for nome in os.listdir(self.diretorio):
+            # Índices do esquema de chaves anterior: as chaves não batem com as de agora
+            if nome.endswith(".parquet") and not nome.endswith(sufixo):
+                os.remove(os.path.join(self.diretorio, nome))
+        meses = sorted(
+            nome.split(".", 1)[0] for nome in os.listdir(self.diretorio)
+            if nome.endswith(sufixo) or nome.endswith(f".{ESQUEMA_CHAVES}.delta")
+        )
+        for mes in sorted(set(meses))[:-MESES_RETIDOS]:
+            base = os.path.join(self.diretorio, f"{mes}{sufixo}")
+            for caminho in (base, base + ".lock"):
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+            shutil.rmtree(os.path.join(self.diretorio, f"{mes}.{ESQUEMA_CHAVES}.delta"), ignore_errors=True)
+
+    def _carregar(self, ano, mes):
+        """(base ordenada, chaves dos deltas). Só relê a base se outro processo a regravou e só os deltas novos."""
+        chave = (ano, mes)
+        arquivo = self._arquivo(ano, mes)
+        versao = os.stat(arquivo).st_mtime_ns if os.path.exists(arquivo) else None
+        if chave not in self._bases or self._versoes.get(chave) != versao:
+            # Base nova: os deltas juntados nela somem da pasta; os que sobraram são relidos
+            self._bases[chave] = (
+                _ler_chaves(arquivo) if versao is not None
+                else pl.Series("chave", [], dtype=pl.Int64)
+            )
+            self._versoes[chave] = versao
+            self._deltas[chave] = {}
+
+        deltas = self._deltas[chave]
+        pasta = self._pasta_deltas(ano, mes)
+        presentes = set(os.listdir(pasta)) if os.path.isdir(pasta) else set()
+        for nome in presentes - deltas.keys():
+            if not nome.endswith(".parquet"):
+                continue
+            try:
+                deltas[nome] = _ler_chaves(os.path.join(pasta, nome))
+            except FileNotFoundError:
+                self._versoes[chave] = None  # juntado agora: a base nova é relida na próxima consulta
+        for nome in deltas.keys() - presentes:
+            del deltas[nome]
+        return self._bases[chave], deltas
+
+    def __len__(self):
+        return sum(len(base) for base in self._bases.values()) + sum(
+            len(chaves) for deltas in self._deltas.values() for chaves in deltas.values()
+        )
+
+    def filtrar_novas(self, df, ano, mes):
+        if df.height == 0 or "id" not in df.columns:
+            return df
+        with self._trava:
+            base, deltas = self._carregar(ano, mes)
+            if len(base) == 0 and not deltas:
+                return df
+            chaves = chaves_ids(df.get_column("id"))
+            existe = pl.Series([False] * len(chaves))
+            if len(base):
+                # Busca binária na base ordenada: não depende do tamanho do mês como um is_in
+                posicoes = base.search_sorted(chaves).clip(0, len(base) - 1)
+                existe = base.gather(posicoes) == chaves
+            if deltas:
+                existe = existe | chaves.is_in(pl.concat(list(deltas.values())).implode())
+        df_novas = df.filter(~existe.fill_null(False))
+        self.total_descartadas += df.height - df_novas.height
+        return df_novas
+
+    def registrar(self, df, ano, mes):
+        if df.height == 0 or "id" not in df.columns:
+            return
+        pasta = self._pasta_deltas(ano, mes)
+        os.makedirs(pasta, exist_ok=True)
+        with self._trava:
+            nome = f"{os.getpid()}_{uuid.uuid4().hex}.parquet"
+            chaves = chaves_ids(df.get_column("id")).rename("chave").drop_nulls().unique()
+            gravar_parquet(chaves.to_frame(), os.path.join(pasta, nome), compression="zstd")
+            self._deltas.setdefault((ano, mes), {})[nome] = chaves
+            if len(os.listdir(pasta)) >= DELTAS_PARA_JUNTAR:
+                self._juntar(ano, mes)
+
+    def _juntar(self, ano, mes):
+        """Junta os deltas na base ordenada (sob a trava entre processos) e apaga os juntados."""
+        arquivo = self._arquivo(ano, mes)
+        pasta = self._pasta_deltas(ano, mes)
+        with travar(arquivo):
+            nomes = [n for n in os.listdir(pasta) if n.endswith(".parquet")]
+            partes = [_ler_chaves(arquivo)] if os.path.exists(arquivo) else []
+            partes += [_ler_chaves(os.path.join(pasta, n)) for n in nomes]
+            base = pl.concat(partes).unique().sort()
+            gravar_parquet(base.to_frame(), arquivo, compression="zstd", statistics=True)
+            for nome in nomes:
+                os.remove(os.path.join(pasta, nome))
+        chave = (ano, mes)
+        self._bases[chave] = base
+        self._versoes[chave] = os.stat(arquivo).st_mtime_ns
+        self._deltas[chave] = {}
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+# --- LIMITADOR DE TAXA COMPARTILHADO (TOKEN BUCKET + AIMD) ---
+# Uma única instância por processo: todas as threads/corrotinas pedem "ficha" aqui
+# antes de bater na API do Menor Preço. Quando chega um 429, a taxa de TODO MUNDO cai
+# junto (e todo mundo pausa junto), em vez de cada worker se virar sozinho.
+
+JANELA_TAXA_EFETIVA = 10.0  # segundos usados para medir a taxa real
+
+
+def ler_retry_after(valor):
+    """Converte o header Retry-After (em segundos) para float. Ignora formatos de data."""
+    try:
+        return max(0.0, float(valor))
+    except (TypeError, ValueError):
+        return None
+
+
+class LimitadorTaxaAdaptativo:
+    """
+    Token bucket com taxa ajustada por AIMD (aumento aditivo, corte multiplicativo).
+
+    - `adquirir()` / `adquirir_async()` bloqueiam até existir uma ficha (ou até o botão de pânico).
+    - `registrar_sucesso()` sobe a taxa em ~`incremento` req/s a cada segundo sem 429.
+    - `registrar_429()` multiplica a taxa por `fator_corte` e pausa todo mundo por `pausa_429`
+      segundos (ou pelo Retry-After, se a API mandar).
+    """
+
+    def __init__(self, taxa_inicial=10.0, taxa_minima=0.5, taxa_maxima=100.0,
+                 incremento=0.5, fator_corte=0.5, pausa_429=2.0, rajada=None):
+        self.taxa = float(taxa_inicial)
+        self.taxa_minima = taxa_minima
+        self.taxa_maxima = taxa_maxima
+        self.incremento = incremento
+        self.fator_corte = fator_corte
+        self.pausa_429 = pausa_429
+        self.rajada = rajada or max(1.0, taxa_inicial)
+
+        self._trava = threading.Lock()
+        self._fichas = 1.0
+        self._ultimo_abastecimento = time.monotonic()
+        self._pausa_ate = 0.0
+        self._ultimo_corte = 0.0
+        self._instantes = deque()  # instantes das requisições liberadas na janela
+
+        self.total_requisicoes = 0
+        self.total_429 = 0
+
+    def _abastecer(self, agora):
+        decorrido = agora - self._ultimo_abastecimento
+        self._ultimo_abastecimento = agora
+        self._fichas = min(self.rajada, self._fichas + decorrido * self.taxa)
+
+    def _reservar(self):
+        """Tenta pegar uma ficha. Retorna 0 se conseguiu, ou quantos segundos esperar."""
+        with self._trava:
+            agora = time.monotonic()
+            self._abastecer(agora)
+
+            if agora < self._pausa_ate:
+                return self._pausa_ate - agora
+
+            if self._fichas >= 1.0:
+                self._fichas -= 1.0
+                self.total_requisicoes += 1
+                self._instantes.append(agora)
+                self._descartar_antigos(agora)
+                return 0.0
+
+            return (1.0 - self._fichas) / self.taxa
+
+    def adquirir(self, evento_parada=None):
+        """Bloqueia até liberar uma requisição. Retorna False se o botão de pânico foi apertado."""
+        while True:
+            espera = self._reservar()
+            if espera <= 0:
+                return True
+            if evento_parada is not None:
+                if evento_parada.wait(espera):
+                    return False
+            else:
+                time.sleep(espera)
+
+    async def adquirir_async(self, evento_parada=None):
+        """Versão para o motor async. Dorme em fatias curtas para obedecer o botão de pânico."""
+        while True:
+            if evento_parada is not None and evento_parada.is_set():
+                return False
+            espera = self._reservar()
+            if espera <= 0:
+                return True
+            await asyncio.sleep(min(espera, 0.25))
+
+    def registrar_sucesso(self):
+        with self._trava:
+            # +incremento req/s por segundo: cada resposta boa soma incremento/taxa
+            self.taxa = min(self.taxa_maxima, self.taxa + self.incremento / self.taxa)
+
+    def registrar_429(self, retry_after=None):
+        with self._trava:
+            agora = time.monotonic()
+            self.total_429 += 1
+
+            # Vários 429 da mesma "rajada" contam como um único corte
+            if agora - self._ultimo_corte >= max(1.0, 1.0 / self.taxa):
+                self.taxa = max(self.taxa_minima, self.taxa * self.fator_corte)
+                self._ultimo_corte = agora
+
+            pausa = retry_after if retry_after is not None else self.pausa_429
+            self._pausa_ate = max(self._pausa_ate, agora + pausa)
+            self._fichas = 0.0
+
+    def _descartar_antigos(self, agora):
+        while self._instantes and agora - self._instantes[0] > JANELA_TAXA_EFETIVA:
+            self._instantes.popleft()
+
+    def taxa_efetiva(self):
+        """Requisições/s realmente liberadas nos últimos JANELA_TAXA_EFETIVA segundos."""
+        with self._trava:
+            self._descartar_antigos(time.monotonic())
+            return len(self._instantes) / JANELA_TAXA_EFETIVA
+
+    def resumo(self):
+        return (f"taxa permitida {self.taxa:.1f} req/s | efetiva {self.taxa_efetiva():.1f} req/s | "
+                f"{self.total_429} respostas 429 em {self.total_requisicoes} requisições")
@@ -0,0 +1,80 @@
+import io
+import polars as pl
+
+# --- LOTE COLUNAR ---
+# Antes cada página virava uma lista de dicts Python, que era mutada (termo/cidade/geohash de origem)
+# e só no upload passava por pl.from_dicts + unnest. Agora a resposta da API vai direto do JSON
+# (leitor nativo do Polars, em Rust) para colunas tipadas, já com o `estabelecimento` achatado,
+# e o lote é só uma lista de DataFrames pequenos concatenados no final.
+
+COLUNAS_ORIGEM = ("termo_origem", "cidade_origem", "geohash_origem")
+PARTES_ANTES_DE_COMPACTAR = 256  # junta os pedaços de vez em quando para não ficar com milhares de chunks
+
+
+def ler_pagina(corpo):
+    """Converte o corpo (bytes) de uma resposta da API num DataFrame de notas já achatado."""
+    df = pl.read_json(io.BytesIO(corpo))
+    if "produtos" not in df.columns or df.height == 0 or df["produtos"].list.len()[0] == 0:
+        return pl.DataFrame()
+
+    df = df.select(pl.col("produtos").explode()).unnest("produtos")
+    if isinstance(df.schema.get("estabelecimento"), pl.Struct):
+        df = df.unnest("estabelecimento")
+    return df
+
+
+def adicionar_origem(df, termo_base, cidade_nome, geohash):
+    """Colunas de origem como categóricas (dicionário): o mesmo valor se repete em todas as linhas."""
+    return df.with_columns(
+        pl.lit(termo_base).cast(pl.Categorical).alias("termo_origem"),
+        pl.lit(cidade_nome).cast(pl.Categorical).alias("cidade_origem"),
+        pl.lit(geohash).cast(pl.Categorical).alias("geohash_origem"),
+    )
+
+
+def adicionar_termos(df, termos):
+    """Todos os termos do CSV que a busca atende (lista): uma busca do plano pode servir a vários."""
+    return df.with_columns(pl.lit(list(termos), dtype=pl.List(pl.String)).alias("termos_origem"))
+
+
+def juntar(partes):
+    partes = [p for p in partes if p.height]
+    if not partes:
+        return pl.DataFrame()
+    if len(partes) == 1:
+        return partes[0]
+    # diagonal_relaxed: páginas podem ter colunas a mais/a menos ou tipos diferentes (null vs string)
+    return pl.concat(partes, how="diagonal_relaxed", rechunk=True)
+
+
+class LoteColunar:
+    """
+    Acumulador de notas de um lote. Recebe os DataFrames de cada busca e entrega um único
+    DataFrame no final, sem nunca passar por lista de dicts. `len(lote)` é o número de notas.
+    """
+
+    def __init__(self, partes=None):
+        self._partes = []
+        self.linhas = 0
+        for parte in partes or ():
+            self.anexar(parte)
+
+    def anexar(self, df):
+        if df is None or df.height == 0:
+            return
+        self._partes.append(df)
+        self.linhas += df.height
+        if len(self._partes) >= PARTES_ANTES_DE_COMPACTAR:
+            self._partes = [juntar(self._partes)]
+
+    def estender(self, outro):
+        for parte in outro._partes:
+            self.anexar(parte)
+
+    def __len__(self):
+        return self.linhas
+
+    def para_dataframe(self):
+        df = juntar(self._partes)
+        # No arquivo as colunas de origem continuam texto (o Parquet já usa dicionário sozinho)
+        return df.with_columns(pl.col(c).cast(pl.String) for c in COLUNAS_ORIGEM if c in df.columns)
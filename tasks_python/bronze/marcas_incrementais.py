@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+import polars as pl
+from trava_arquivo import travar, gravar_parquet
+
+# --- COLETA INCREMENTAL (MARCA D'ÁGUA POR BUSCA + GEOHASH) ---
+# Toda execução baixava até 10 páginas de cada busca, mesmo com quase tudo já coletado ontem.
+# Guardamos, para cada (busca, geohash), a `datahora` mais recente que já está no storage.
+# Na próxima execução, se uma página inteira só tem notas com datahora <= essa marca, as
+# páginas seguintes também são antigas: a paginação daquela busca para ali.
+# Isso só vale se a API devolve as notas da mais nova para a mais antiga, e nada garante isso.
+# Então a ordem é conferida durante a execução: a parada só é liberada depois de
+# CONFIRMACOES_ORDEM viradas de página em ordem decrescente (a primeira nota de uma página não é
+# mais nova que a última da anterior), e a primeira página fora de ordem desliga a parada até o
+# fim da execução. Com a API fora de ordem, o modo incremental pagina tudo, como sem ele.
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+ARQUIVO_MARCAS = os.path.join(DIRETORIO_ESTADO, "marcas_incrementais.parquet")
+
+DIAS_RETENCAO = 30  # marcas de buscas que não rodam há mais tempo que isso são esquecidas
+CONFIRMACOES_ORDEM = 20  # viradas de página em ordem antes de confiar que a API é "mais nova primeiro"
+
+log = logging.getLogger("bronze")
+
+
+def datas_pagina(dados):
+    """Coluna datahora da página como texto ISO (None se a página não tem datahora)."""
+    if dados.height == 0 or "datahora" not in dados.columns:
+        return None
+    return dados.get_column("datahora").cast(pl.String)
+
+
+def em_ordem_decrescente(datas):
+    """True se a página vem da nota mais nova para a mais antiga (sem datahora faltando)."""
+    return datas.null_count() == 0 and bool((datas.head(-1) >= datas.tail(-1)).all())
+
+
+def pagina_conhecida(dados, marca):
+    """True se todas as notas da página são de até `marca` (datahora ISO, comparada como texto)."""
+    if marca is None or dados.height == 0 or "datahora" not in dados.columns:
+        return False
+    mais_recente = dados.get_column("datahora").cast(pl.String).max()
+    return mais_recente is not None and mais_recente <= marca
+
+
+class MarcasIncrementais:
+    """
+    Marcas d'água por (busca, geohash).
+
+    As marcas novas só valem depois que o lote com aquelas notas sobe: `observar` guarda a maior
+    datahora de cada busca, `fechar_lote(n)` associa o que foi observado ao lote N e `confirmar`
+    (chamado pelo estágio de upload) promove as marcas. Um lote que falhou não avança a marca.
+    """
+
+    def __init__(self, caminho=ARQUIVO_MARCAS):
+        self.caminho = caminho
+        self.marcas = {}
+        self.paradas_antecipadas = 0
+        self.viradas_em_ordem = 0
+        self.fora_de_ordem = False
+        self._abertas = {}
+        self._por_lote = {}
+        self._novas = {}
+        self._trava = threading.Lock()
+
+        if os.path.exists(caminho):
+            for linha in pl.read_parquet(caminho).iter_rows(named=True):
+                self.marcas[(linha["busca"], linha["geohash"])] = linha["datahora_max"]
+
+    def marca(self, busca, geohash):
+        return self.marcas.get((busca, geohash))
+
+    def criterio_parada(self, busca, geohash):
+        """Função passada para a extração: decide, página a página, se a busca pode parar."""
+        marca = self.marca(busca, geohash)
+        if marca is None:
+            return None
+        mais_antiga_anterior = None
+
+        def parar(dados):
+            nonlocal mais_antiga_anterior
+            datas = datas_pagina(dados)
+            if datas is None:
+                return False
+            if not em_ordem_decrescente(datas) or (mais_antiga_anterior is not None and datas.max() > mais_antiga_anterior):
+                with self._trava:
+                    if not self.fora_de_ordem:
+                        self.fora_de_ordem = True
+                        log.warning(f"⚠️ Modo incremental: a API devolveu notas fora da ordem de datahora em "
+                                    f"'{busca}' ({geohash}); a parada por marca d'água fica desligada nesta execução.")
+                return False
+            if mais_antiga_anterior is not None:
+                with self._trava:
+                    self.viradas_em_ordem += 1
+            mais_antiga_anterior = datas.min()
+
+            # Página incompleta já é a última: não conta como parada antecipada
+            if dados.height < 50 or not self.ordem_confirmada() or not pagina_conhecida(dados, marca):
+                return False
+            with self._trava:
+                self.paradas_antecipadas += 1
+            return True
+
+        return parar
+
+    def ordem_confirmada(self):
+        with self._trava:
+            return not self.fora_de_ordem and self.viradas_em_ordem >= CONFIRMACOES_ORDEM
+
+    def observar(self, tarefa_info, resultado):
+        if resultado is None or resultado.height == 0 or "datahora" not in resultado.columns:
+            return
+        busca, geohash = tarefa_info[0], tarefa_info[1]
+        mais_recente = resultado.get_column("datahora").cast(pl.String).max()
+        if mais_recente is None:
+            return
+        with self._trava:
+            chave = (busca, geohash)
+            if mais_recente > self._abertas.get(chave, ""):
+                self._abertas[chave] = mais_recente
+
+    def fechar_lote(self, numero_lote):
+        with self._trava:
+            self._por_lote.setdefault(numero_lote, {}).update(self._abertas)
+            self._abertas = {}
+
+    def confirmar(self, numeros_lote):
+        with self._trava:
+            for numero in numeros_lote:
+                for chave, datahora in self._por_lote.pop(numero, {}).items():
+                    # Só interessa se a marca realmente avançou
+                    if datahora > max(self._novas.get(chave, ""), self.marcas.get(chave) or ""):
+                        self._novas[chave] = datahora
+
+    def salvar(self):
+        with self._trava:
+            if not self._novas:
+                return 0
+            hoje = datetime.now().strftime("%Y-%m-%d")
+            df_novas = pl.DataFrame(
+                [{"busca": b, "geohash": g, "datahora_max": d, "atualizado_em": hoje} for (b, g), d in self._novas.items()]
+            )
+            atualizadas = len(self._novas)
+            self._novas = {}
+
+        # Outros workers da fila gravam o mesmo arquivo: relê e junta com a trava entre processos
+        with travar(self.caminho):
+            if os.path.exists(self.caminho):
+                df_novas = pl.concat([pl.read_parquet(self.caminho), df_novas], how="vertical_relaxed")
+
+            limite = (datetime.now() - timedelta(days=DIAS_RETENCAO)).strftime("%Y-%m-%d")
+            df = (
+                df_novas.filter(pl.col("atualizado_em") >= limite)
+                .group_by(["busca", "geohash"])
+                .agg(pl.col("datahora_max").max(), pl.col("atualizado_em").max())
+            )
+            gravar_parquet(df, self.caminho, compression="zstd")
+        return atualizadas
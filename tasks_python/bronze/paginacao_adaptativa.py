@@ -0,0 +1,85 @@
+import threading
+
+# --- PAGINAÇÃO ADAPTATIVA (IDS JÁ VISTOS NESTA EXECUÇÃO) ---
+# Variações do mesmo termo e geohashes vizinhos devolvem muitas notas repetidas: as páginas
+# finais de uma busca costumam trazer só notas que outra busca da mesma execução já baixou.
+# Todas as buscas (threads ou motor async) dividem um conjunto de IDs vistos; a cada página
+# medimos a fração de IDs novos e, se ela cair abaixo do limiar, a busca para de paginar.
+# Não é sem perda: as notas novas da página de corte em diante ficam de fora, por isso o
+# bronze_menor_preco.py deixa desligado por padrão (LIMIAR_IDS_NOVOS=0) e as buscas cortadas
+# não entram nas estatísticas de poda.
+
+TAMANHO_PAGINA = 50
+PAGINAS_MAXIMAS = 10  # a extração para no offset 500
+
+
+class IdsVistos:
+    """
+    Conjunto de IDs compartilhado entre todas as buscas da execução.
+
+    `criterio_parada()` devolve a função que a extração chama a cada página: registra os IDs,
+    calcula a fração de novos e diz se vale parar (só em página cheia, a última já para sozinha).
+    """
+
+    def __init__(self, limiar_novos=0.1):
+        self.limiar_novos = limiar_novos
+        self.paginas_lidas = 0
+        self.buscas_encerradas = 0
+        # Não dá para saber quantas páginas a busca ainda teria: a página cheia garante pelo menos
+        # mais uma requisição, e no máximo as que faltavam até o offset 500
+        self.paginas_evitadas = 0
+        self.paginas_evitadas_teto = 0
+        self._ids = set()
+        self._trava = threading.Lock()
+
+    def registrar_pagina(self, dados):
+        """Adiciona os IDs da página e devolve a fração deles que ninguém tinha visto ainda."""
+        if dados.height == 0 or "id" not in dados.columns:
+            return 1.0
+        ids = dados.get_column("id").to_list()
+        with self._trava:
+            self.paginas_lidas += 1
+            antes = len(self._ids)
+            self._ids.update(ids)
+            novos = len(self._ids) - antes
+        return novos / len(ids)
+
+    def criterio_parada(self):
+        paginas = 0
+
+        def parar(dados):
+            nonlocal paginas
+            paginas += 1
+            fracao_novos = self.registrar_pagina(dados)
+            if dados.height < TAMANHO_PAGINA or fracao_novos >= self.limiar_novos:
+                return False
+            with self._trava:
+                self.buscas_encerradas += 1
+                self.paginas_evitadas += 1
+                self.paginas_evitadas_teto += PAGINAS_MAXIMAS - paginas
+            return True
+
+        return parar
+
+    def resumo(self):
+        return (f"🔁 Paginação adaptativa: {self.buscas_encerradas} buscas pararam com menos de "
+                f"{self.limiar_novos:.0%} de IDs novos por página → entre {self.paginas_evitadas} e "
+                f"{self.paginas_evitadas_teto} páginas evitadas "
+                f"({self.paginas_lidas} lidas, {len(self._ids)} IDs distintos vistos)")
+
+
+def combinar_criterios(*criterios):
+    """
+    Junta vários critérios de parada num só. Todos são chamados em toda página (cada um
+    mantém a própria contabilidade) e a busca para se qualquer um pedir.
+    """
+    criterios = [c for c in criterios if c is not None]
+    if not criterios:
+        return None
+    if len(criterios) == 1:
+        return criterios[0]
+
+    def parar(dados):
+        return any([c(dados) for c in criterios])
+
+    return parar
@@ -0,0 +1,150 @@
+import math
+import os
+import sys
+import polars as pl
+
+# --- PLANEJADOR DE COBERTURA DOS GEOHASHES ---
+# Cada busca na API usa um círculo de `raio` km em volta do geohash. Municípios pequenos e
+# vizinhos têm círculos quase iguais, então as mesmas notas eram baixadas várias vezes.
+# Um geohash só sai do plano quando o círculo dele inteiro continua coberto pelos círculos dos
+# centros que ficam: dois centróides a 15 km um do outro NÃO cobrem a mesma área (um círculo de
+# 20 km nunca cabe dentro de outro do mesmo raio), então na prática só sai quem está cercado de
+# vizinhos. O círculo é verificado numa malha hexagonal de pontos: se cada ponto está a
+# (raio - folga) km de um centro, com a folga maior que a distância de qualquer lugar do círculo
+# ao ponto da malha mais próximo, o círculo inteiro está coberto. E como toda busca para em 500
+# notas (10 páginas de 50), um geohash que já bateu esse teto (ou sem histórico para saber) nunca
+# sai e nem cobre os vizinhos: o círculo dele não devolve tudo o que tem. Desligado por padrão
+# (PLANEJAR_COBERTURA=0): o que sai muda o `cidade_origem` das notas.
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+ARQUIVO_GEOHASHES = os.path.join(RAIZ_PROJETO, "dados", "municipios_pr_geohash.csv")
+
+RAIO_BUSCA_KM = 20
+ESPACO_MALHA_KM = 2.5
+KM_POR_GRAU = 6371.0 * math.pi / 180
+# Distância máxima de um lugar ao ponto da malha mais próximo (espaço / raiz de 3), mais o erro
+# de medir em plano (a partir do município) em vez de na esfera a até 40 km dele
+FOLGA_KM = ESPACO_MALHA_KM / math.sqrt(3) + 0.2
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre dois pontos (fórmula de Haversine)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def malha_do_circulo(raio_km, espaco_km=ESPACO_MALHA_KM):
+    """Pontos (x, y) em km, a partir do centro, de uma malha hexagonal que cobre o círculo."""
+    limite = raio_km + espaco_km / math.sqrt(3)
+    altura = espaco_km * math.sqrt(3) / 2
+    pontos = []
+    for linha in range(-math.ceil(limite / altura), math.ceil(limite / altura) + 1):
+        deslocamento = espaco_km / 2 if linha % 2 else 0.0
+        y = linha * altura
+        for coluna in range(-math.ceil(limite / espaco_km) - 1, math.ceil(limite / espaco_km) + 2):
+            x = coluna * espaco_km + deslocamento
+            if x * x + y * y <= limite * limite:
+                pontos.append((x, y))
+    return pontos
+
+
+def planejar_cobertura(municipios, raio_busca_km=RAIO_BUSCA_KM, fixos=(), folga_km=FOLGA_KM):
+    """
+    Recebe uma lista de dicts com nome, geohash, latitude e longitude e devolve os centros que
+    ficam (na ordem original do CSV), cada um com a lista `municipios_cobertos` (ele e os que
+    saíram e têm nele o centro mais próximo). `fixos`: geohashes que nunca saem nem cobrem
+    vizinhos (buscas que já bateram o teto de 500 notas, ou sem histórico).
+
+    Poda gulosa de redundantes: começa com todos e tira um por vez quando cada ponto da malha
+    do círculo dele, e dos círculos dos que já saíram, ainda fica a (raio - folga) km de um centro.
+    """
+    n = len(municipios)
+    fixos = set(fixos)
+    posicao = [(m["latitude"], m["longitude"]) for m in municipios]
+    malha = malha_do_circulo(raio_busca_km)
+    ajuda = [m["geohash"] not in fixos for m in municipios]
+
+    # cobre[c][i]: índices dos pontos da malha de i que o centro c alcança (c ajuda i). Só
+    # vizinhos a menos de 2 raios podem alcançar algum ponto; fixos não precisam de ajuda
+    alcance2 = (raio_busca_km - folga_km) ** 2
+    cobre = [{} for _ in range(n)]
+    for i in range(n):
+        if not ajuda[i]:
+            continue
+        lat_i, lon_i = posicao[i]
+        km_lon = KM_POR_GRAU * math.cos(math.radians(lat_i))
+        for c in range(n):
+            if c == i or not ajuda[c] or distancia_km(lat_i, lon_i, *posicao[c]) > 2 * raio_busca_km:
+                continue
+            cx, cy = (posicao[c][1] - lon_i) * km_lon, (posicao[c][0] - lat_i) * KM_POR_GRAU
+            alcancados = [k for k, (x, y) in enumerate(malha) if (x - cx) ** 2 + (y - cy) ** 2 <= alcance2]
+            if alcancados:
+                cobre[c][i] = alcancados
+
+    # Quantos centros ativos alcançam cada ponto (o próprio município conta para o círculo dele)
+    contagem = [[1] * len(malha) for _ in range(n)]
+    for c in range(n):
+        for i, alcancados in cobre[c].items():
+            for k in alcancados:
+                contagem[i][k] += 1
+
+    def pode_sair(c):
+        if not ajuda[c] or any(v < 2 for v in contagem[c]):
+            return False
+        return all(contagem[i][k] >= 2 for i, alcancados in cobre[c].items() for k in alcancados)
+
+    # Quem ajuda menos vizinhos sai primeiro; empate fica na ordem do CSV (estável entre execuções)
+    ativos = [True] * n
+    for c in sorted(range(n), key=lambda i: (len(cobre[i]), i)):
+        if pode_sair(c):
+            ativos[c] = False
+            contagem[c] = [v - 1 for v in contagem[c]]
+            for i, alcancados in cobre[c].items():
+                for k in alcancados:
+                    contagem[i][k] -= 1
+
+    centros = {i: [i] for i in range(n) if ativos[i]}
+    for j in range(n):
+        if not ativos[j]:
+            mais_perto = min(centros, key=lambda i: distancia_km(*posicao[i], *posicao[j]))
+            centros[mais_perto].append(j)
+
+    resultado = []
+    for i in sorted(centros):
+        centro = dict(municipios[i])
+        centro["municipios_cobertos"] = [municipios[j]["nome"] for j in sorted(centros[i])]
+        resultado.append(centro)
+    return resultado
+
+
+def relatorio_economia(qtd_original, qtd_planejada, buscas_por_cidade=None):
+    economia = qtd_original - qtd_planejada
+    percentual = (economia / qtd_original * 100) if qtd_original else 0
+    texto = (f"🗺️  Planejador de cobertura: {qtd_planejada} centros no lugar de {qtd_original} municípios "
+             f"(-{economia} geohashes, {percentual:.1f}%)")
+    if buscas_por_cidade:
+        texto += f" → ~{economia * buscas_por_cidade} buscas base a menos por ciclo de 7 dias"
+    return texto
+
+
+def main():
+    from balanceador_fatias import CustosGeohash
+
+    df_geos = pl.read_csv(ARQUIVO_GEOHASHES)
+    municipios = df_geos.select(["nome", "geohash", "latitude", "longitude"]).to_dicts()
+    # Sem o histórico de custos nada sai; "--sem-historico" simula o plano sem o teto de 500 notas
+    fixos = () if "--sem-historico" in sys.argv else CustosGeohash().fixos_cobertura(m["geohash"] for m in municipios)
+    centros = planejar_cobertura(municipios, fixos=fixos)
+
+    for centro in centros:
+        extras = [m for m in centro["municipios_cobertos"] if m != centro["nome"]]
+        print(f"📍 {centro['nome']} ({centro['geohash']}) cobre {len(extras)} vizinhos: {', '.join(extras)}")
+
+    print()
+    print(relatorio_economia(len(municipios), len(centros)))
+
+
+if __name__ == "__main__":
+    main()
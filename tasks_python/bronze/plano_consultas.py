@@ -0,0 +1,205 @@
+import glob
+import hashlib
+import json
+import os
+import polars as pl
+from trava_arquivo import gravar_parquet
+
+# --- PLANO DE CONSULTAS COMPILADO ---
+# O gerar_variacoes era uma cadeia longa de if/elif chamada para cada termo em toda execução, e
+# a mesma busca gerada por dois termos diferentes (ex: "CAFE" e "CAFE TORRADO" → "CAFE 500G") era
+# feita duas vezes em cada geohash. Aqui:
+#   - as variações viram uma tabela de regras declarativa (REGRAS_VARIACOES), avaliada em ordem;
+#   - o CSV de produtos + regras + podas é compilado uma vez num plano: uma linha por busca
+#     distinta, com o termo principal (o primeiro do CSV) e a lista de todos os termos que ela atende;
+#   - o plano é salvo em Parquet com a versão (hash das entradas) no nome: enquanto nada mudar,
+#     as execuções só leem o arquivo (memory-map) e percorrem as buscas sem recompilar.
+#
+#   python tasks_python/bronze/plano_consultas.py   # compila e mostra o plano atual
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+DIRETORIO_PLANOS = os.path.join(DIRETORIO_ESTADO, "planos_consultas")
+ARQUIVO_TERMOS = os.path.join(RAIZ_PROJETO, "dados", "produtos_cesta_basica.csv")
+
+VERSAO_FORMATO = 1  # muda se o layout do Parquet do plano mudar
+PLANOS_GUARDADOS = 5
+
+# Cada regra: categorias (None = qualquer uma), palavras que o termo precisa conter (qualquer uma;
+# None = sempre casa), o prefixo removido para formar {resto} e os modelos das buscas.
+# A primeira regra que casar vale, como no if/elif antigo.
+REGRAS_VARIACOES = [
+    # --- Grãos ---
+    {"categorias": ["Grãos E Básicos"], "contem": ["ARROZ BRANCO"], "modelos": ["ARROZ TIPO 1 5KG", "ARROZ T1 5KG", "ARROZ 5KG"]},
+    {"categorias": ["Grãos E Básicos"], "contem": ["ARROZ PARBOILIZADO"], "modelos": ["ARROZ PARBOILIZADO 5KG", "ARROZ PARB 5KG"]},
+    {"categorias": ["Grãos E Básicos"], "contem": None, "modelos": ["{termo} 1KG", "{termo}"]},
+    # --- Farinhas e Milho ---
+    # Pulo do gato: "FARINHA DE TRIGO" -> "FAR TRIGO" ou "FARINHA TRIGO"
+    {"categorias": ["Farinhas E Milho"], "contem": ["FARINHA DE"], "remover": "FARINHA DE ",
+     "modelos": ["FAR {resto} 1KG", "FARINHA {resto} 1KG", "{termo} 1KG"]},
+    {"categorias": ["Farinhas E Milho"], "contem": None, "modelos": ["{termo} 1KG", "{termo} 500G"]},
+    # --- Óleos e Gorduras ---
+    {"categorias": ["Óleos E Gorduras"], "contem": ["OLEO"], "modelos": ["{termo} 900ML", "{termo}"]},
+    {"categorias": ["Óleos E Gorduras"], "contem": ["AZEITE"], "modelos": ["{termo} 500ML"]},
+    # Cupom fiscal adora abreviar margarina
+    {"categorias": ["Óleos E Gorduras"], "contem": ["MARGARINA"], "modelos": ["MARGARINA 500G", "MARG 500G", "{termo}"]},
+    {"categorias": ["Óleos E Gorduras"], "contem": None, "modelos": ["{termo} 500G", "{termo}"]},
+    # --- Café e Leite ---
+    # Tira o "MOIDO" que quase ninguém usa na nota
+    {"categorias": ["Café E Leite"], "contem": ["CAFE"], "modelos": ["CAFE 500G", "CAFE TORRADO 500G", "{termo} 500G"]},
+    # Adiciona o UHT que os mercados grandes usam
+    {"categorias": ["Café E Leite"], "contem": ["LEITE INTEGRAL"], "modelos": ["LEITE UHT INTEGRAL 1L", "LEITE INTEGRAL 1L", "LEITE 1L"]},
+    {"categorias": ["Café E Leite"], "contem": ["LEITE EM PO"], "modelos": ["LEITE PO 400G", "{termo} 400G"]},
+    {"categorias": ["Café E Leite"], "contem": None, "modelos": ["{termo}"]},
+    # --- Limpeza ---
+    # Foca na embalagem de 800g que é o padrão atual do mercado
+    {"categorias": ["Limpeza"], "contem": ["SABAO EM PO"], "modelos": ["LAVA ROUPAS 800G", "SABAO PO 800G", "SABAO EM PO 800G"]},
+    # Arranca o "liquido" que atrapalha a busca
+    {"categorias": ["Limpeza"], "contem": ["DETERGENTE LIQUIDO"], "modelos": ["DETERGENTE 500ML"]},
+    {"categorias": ["Limpeza"], "contem": ["DESINFETANTE", "AMACIANTE"], "modelos": ["{termo} 2L", "{termo} 1L"]},
+    {"categorias": ["Limpeza"], "contem": ["SACO LIXO"], "modelos": ["{termo} 50L", "{termo} 30L", "{termo}"]},
+    {"categorias": ["Limpeza"], "contem": None, "modelos": ["{termo}"]},
+    # --- Higiene ---
+    {"categorias": ["Higiene"], "contem": ["CREME DENTAL"], "modelos": ["CREME DENTAL 90G", "PASTA DENTAL 90G", "{termo}"]},
+    # Mercados usam a quantidade de rolos ou metragem
+    {"categorias": ["Higiene"], "contem": ["PAPEL HIGIENICO"], "modelos": ["PAPEL HIGIENICO 4", "PAPEL HIGIENICO 30M", "{termo}"]},
+    {"categorias": ["Higiene"], "contem": ["SABONETE"], "modelos": ["SABONETE 90G", "SABONETE 85G", "{termo}"]},
+    {"categorias": ["Higiene"], "contem": None, "modelos": ["{termo}"]},
+    # --- Biscoitos e Massas ---
+    # MACARRAO ESPAGUETE -> MAC ESPAGUETE 500G
+    {"categorias": ["Padaria E Biscoitos", "Massas"], "contem": ["MACARRAO"], "remover": "MACARRAO ",
+     "modelos": ["MAC {resto} 500G", "{termo} 500G"]},
+    {"categorias": ["Padaria E Biscoitos", "Massas"], "contem": ["PAO"], "modelos": ["{termo} 400G", "{termo} 500G", "{termo}"]},
+    # Abreviação clássica
+    {"categorias": ["Padaria E Biscoitos", "Massas"], "contem": ["BISCOITO"], "remover": "BISCOITO ",
+     "modelos": ["BISC {resto} 400G", "BISC {resto}", "{termo} 400G"]},
+    {"categorias": ["Padaria E Biscoitos", "Massas"], "contem": None, "modelos": ["{termo} 400G", "{termo} 200G", "{termo}"]},
+    # --- O Resto (Proteínas Frescas, Enlatados, Bebidas, etc) ---
+    {"categorias": None, "contem": ["OVOS"], "modelos": ["OVO BRANCO", "OVOS DUZIA", "{termo}"]},
+    {"categorias": None, "contem": None, "modelos": ["{termo}"]},
+]
+
+# As categorias com regras próprias: as regras "de qualquer categoria" só valem fora delas
+CATEGORIAS_COM_REGRAS = {c for r in REGRAS_VARIACOES if r["categorias"] for c in r["categorias"]}
+
+
+def _casa(regra, categoria, termo):
+    if regra["categorias"] is None:
+        if categoria in CATEGORIAS_COM_REGRAS:
+            return False
+    elif categoria not in regra["categorias"]:
+        return False
+    return regra["contem"] is None or any(palavra in termo for palavra in regra["contem"])
+
+
+def gerar_variacoes(categoria, termo, regras=REGRAS_VARIACOES):
+    """Buscas de um termo pela primeira regra que casar (mesma saída do antigo if/elif)."""
+    for regra in regras:
+        if _casa(regra, categoria, termo):
+            resto = termo.replace(regra["remover"], "") if regra.get("remover") else termo
+            return [m.format(termo=termo, resto=resto) for m in regra["modelos"]]
+    return []
+
+
+def versao_plano(linhas_referencia, podas, regras=REGRAS_VARIACOES):
+    """Hash curto de tudo que define o plano: formato, regras, CSV de produtos e podas."""
+    entrada = json.dumps({
+        "formato": VERSAO_FORMATO,
+        "regras": regras,
+        "produtos": [(l.get("categoria", "Geral"), l["descricao_busca"]) for l in linhas_referencia],
+        "podas": {t: sorted(v) for t, v in sorted(podas.items())},
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(entrada.encode()).hexdigest()[:12]
+
+
+def compilar_plano(linhas_referencia, podas=None, regras=REGRAS_VARIACOES):
+    """
+    DataFrame com uma linha por busca distinta: ordem, busca, termo_origem (o primeiro termo do CSV
+    que gera a busca) e termos_origem (todos). As variações podadas de um termo não entram por ele.
+    """
+    podas = podas or {}
+    termos_por_busca = {}
+    for linha in linhas_referencia:
+        termo = linha["descricao_busca"]
+        for busca in gerar_variacoes(linha.get("categoria", "Geral"), termo, regras):
+            if busca in podas.get(termo, ()):
+                continue
+            termos = termos_por_busca.setdefault(busca, [])
+            if termo not in termos:
+                termos.append(termo)
+
+    return pl.DataFrame({
+        "ordem": list(range(len(termos_por_busca))),
+        "busca": list(termos_por_busca),
+        "termo_origem": [t[0] for t in termos_por_busca.values()],
+        "termos_origem": list(termos_por_busca.values()),
+    }, schema={"ordem": pl.UInt32, "busca": pl.String, "termo_origem": pl.String, "termos_origem": pl.List(pl.String)})
+
+
+def carregar_plano(linhas_referencia, podas=None, diretorio=DIRETORIO_PLANOS):
+    """
+    Caminho do plano compilado para estas entradas. Compila (e apaga versões antigas além de
+    PLANOS_GUARDADOS) só quando a versão ainda não existe no disco.
+    """
+    podas = podas or {}
+    versao = versao_plano(linhas_referencia, podas)
+    caminho = os.path.join(diretorio, f"plano_{versao}.parquet")
+    if os.path.exists(caminho):
+        return caminho, versao, False
+
+    os.makedirs(diretorio, exist_ok=True)
+    # Temporário por processo: dois workers da fila podem compilar a mesma versão ao mesmo tempo
+    gravar_parquet(compilar_plano(linhas_referencia, podas), caminho, compression="zstd")
+
+    antigos = sorted(glob.glob(os.path.join(diretorio, "plano_*.parquet")), key=os.path.getmtime)
+    for arquivo in antigos[:-PLANOS_GUARDADOS]:
+        os.remove(arquivo)
+    return caminho, versao, True
+
+
+def ler_plano(caminho):
+    # Arquivo local e pequeno: memory-map em vez de copiar para a memória
+    return pl.read_parquet(caminho, memory_map=True)
+
+
+def iterar_tarefas(plano, cidades):
+    """
+    Gera (busca, geohash, termo_origem, cidade) cidade a cidade, na ordem do plano. Os outros
+    termos da busca (`termos_por_busca`) entram nas notas como a lista termos_origem.
+    """
+    buscas = plano.select(["busca", "termo_origem"]).rows()
+    for cidade in cidades:
+        for busca, termo in buscas:
+            yield (busca, cidade["geohash"], termo, cidade["nome"])
+
+
+def termos_por_busca(plano):
+    return dict(zip(plano.get_column("busca").to_list(), plano.get_column("termos_origem").to_list()))
+
+
+def relatorio_consultas(plano, versao, compilado):
+    total_pares = sum(len(t) for t in plano.get_column("termos_origem").to_list())
+    repetidas = total_pares - plano.height
+    origem = "compilado agora" if compilado else "reaproveitado"
+    texto = f"🗂️  Plano de consultas {versao} ({origem}): {plano.height} buscas distintas por geohash"
+    if repetidas:
+        texto += f" ({repetidas} buscas repetidas entre termos deixaram de ser feitas)"
+    return texto
+
+
+def main():
+    from poda_variacoes import carregar_podas
+
+    linhas_referencia = pl.read_csv(ARQUIVO_TERMOS).to_dicts()
+    podas = carregar_podas()[0] if os.getenv("PODAR_VARIACOES", "0") == "1" else {}
+    caminho, versao, compilado = carregar_plano(linhas_referencia, podas)
+    plano = ler_plano(caminho)
+    print(relatorio_consultas(plano, versao, compilado))
+    print(f"📁 {caminho}")
+    with pl.Config(tbl_rows=-1, fmt_str_lengths=60):
+        print(plano.filter(pl.col("termos_origem").list.len() > 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+from datetime import datetime, timedelta
+import polars as pl
+from trava_arquivo import travar, gravar_parquet
+
+# --- PODA APRENDIDA DAS VARIAÇÕES DE BUSCA ---
+# O gerar_variacoes expande cada termo em até 3 buscas ("ARROZ TIPO 1 5KG", "ARROZ T1 5KG", "ARROZ 5KG").
+# Muitas devolvem quase as mesmas notas. Durante a execução guardamos os IDs de cada variação
+# (por termo + geohash), resumimos em estatísticas de sobreposição e, com o histórico de várias
+# execuções, descobrimos quais variações são quase sempre um subconjunto de outra.
+# Só entram nas estatísticas as buscas que paginaram até o fim: uma busca encerrada cedo
+# (modo incremental, paginação adaptativa) parece subconjunto das irmãs sem ser. O mesmo vale
+# para a que bateu o teto da API (500 notas): o resultado está cortado e não prova contenção.
+# Uma variação podada não roda mais e não gera evidência nova, então a poda vence: depois de
+# DIAS_REPROVA dias ela volta a rodar até o histórico ter observações suficientes para refazer
+# o veredito (que pode podá-la de novo, com a data renovada).
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+ARQUIVO_ESTATISTICAS = os.path.join(DIRETORIO_ESTADO, "estatisticas_variacoes.parquet")
+# Última decisão de poda: a variação podada não roda mais e some do histórico, então o veredito
+# fica guardado aqui em vez de ser refeito sem evidência (e ela voltar e sair de novo)
+ARQUIVO_PODAS = os.path.join(DIRETORIO_ESTADO, "podas_variacoes.parquet")
+
+DIAS_HISTORICO = 60         # guarda só as últimas 60 execuções (datas) no histórico
+LIMIAR_CONTENCAO = 0.95     # "subconjunto" = pelo menos 95% dos IDs aparecem na outra variação
+FREQUENCIA_MINIMA = 0.9     # ...em pelo menos 90% das observações
+MINIMO_OBSERVACOES = 5      # e só decide com um mínimo de evidência
+DIAS_REPROVA = 28           # poda mais velha que isso volta a rodar para gerar evidência nova
+NOTAS_MAXIMAS = 500         # teto da API por busca (10 páginas de 50)
+
+
+class RegistroVariacoes:
+    """
+    Acumula os IDs de cada variação de um (termo, geohash) até todas as variações daquele grupo
+    terminarem; aí resume em linhas de estatística e joga os IDs fora (memória fica limitada).
+    Grupos que não fecham (buscas retomadas do diário, ou feitas por outro worker da fila) são
+    resumidos com as variações que chegaram quando o registro é salvo.
+    """
+
+    def __init__(self, variacoes_por_termo):
+        self.variacoes_por_termo = variacoes_por_termo
+        self.data_execucao = datetime.now().strftime("%Y-%m-%d")
+        self._grupos = {}
+        self.linhas = []
+
+    def registrar(self, tarefa_info, resultado, truncada=False):
+        """`truncada`: a busca parou de paginar antes do fim (não é uma observação completa)."""
+        busca, geohash, termo_base, _ = tarefa_info
+        tem_ids = resultado is not None and "id" in resultado.columns
+        truncada = truncada or (resultado is not None and len(resultado) >= NOTAS_MAXIMAS)
+        ids = set(resultado.get_column("id").to_list()) if tem_ids else set()
+        # Páginas realmente pedidas: 50 notas por página, até 10 páginas (offset < 500)
+        paginas = min(10, (len(resultado) if resultado is not None else 0) // 50 + 1)
+
+        grupo = self._grupos.setdefault((termo_base, geohash), {})
+        grupo[busca] = (ids, paginas, truncada)
+        if len(grupo) == len(self.variacoes_por_termo.get(termo_base, ())):
+            self._resumir(termo_base, geohash, self._grupos.pop((termo_base, geohash)))
+
+    def _resumir(self, termo_base, geohash, grupo):
+        grupo = {v: (ids, paginas) for v, (ids, paginas, truncada) in grupo.items() if not truncada}
+        if len(grupo) < 2:
+            return
+
+        uniao = set().union(*(ids for ids, _ in grupo.values()))
+        for variacao, (ids, paginas) in grupo.items():
+            outras = [ids_outra for outra, (ids_outra, _) in grupo.items() if outra != variacao]
+            exclusivos = len(ids - set().union(*outras))
+            for outra, (ids_outra, _) in grupo.items():
+                if outra == variacao:
+                    continue
+                self.linhas.append({
+                    "data_execucao": self.data_execucao,
+                    "termo_origem": termo_base,
+                    "geohash": geohash,
+                    "variacao": variacao,
+                    "outra_variacao": outra,
+                    "qtd_variacao": len(ids),
+                    "qtd_intersecao": len(ids & ids_outra),
+                    "qtd_exclusivos": exclusivos,
+                    "qtd_termo": len(uniao),
+                    "paginas": paginas,
+                })
+
+    def salvar(self, caminho=ARQUIVO_ESTATISTICAS):
+        # Com menos variações a exclusividade sai maior que a real: erra para o lado de não podar
+        for (termo_base, geohash), grupo in self._grupos.items():
+            self._resumir(termo_base, geohash, grupo)
+        self._grupos = {}
+        if not self.linhas:
+            return
+
+        df_novo = pl.DataFrame(self.linhas)
+        # Outros workers da fila gravam o mesmo dia: relê com a trava e troca só as observações
+        # repetidas (mesma data, termo, geohash e par de variações), sem apagar as dos outros
+        with travar(caminho):
+            if os.path.exists(caminho):
+                df_novo = pl.concat([pl.read_parquet(caminho), df_novo], how="vertical_relaxed").unique(
+                    subset=["data_execucao", "termo_origem", "geohash", "variacao", "outra_variacao"],
+                    keep="last", maintain_order=True,
+                )
+
+            datas = sorted(df_novo["data_execucao"].unique().to_list())
+            if len(datas) > DIAS_HISTORICO:
+                df_novo = df_novo.filter(pl.col("data_execucao").is_in(datas[-DIAS_HISTORICO:]))
+
+            gravar_parquet(df_novo, caminho, compression="zstd")
+        self.linhas.clear()
+
+
+def calcular_podas(df, limiar_contencao=LIMIAR_CONTENCAO, frequencia_minima=FREQUENCIA_MINIMA,
+                   minimo_observacoes=MINIMO_OBSERVACOES, anteriores=None, hoje=None):
+    """
+    Devolve um DataFrame com as variações que podem ser removidas: termo_origem, variacao,
+    contida_em, frequencia, observacoes, paginas_por_execucao, cobertura_perdida (fração das
+    notas do termo que só essa variação trazia) e podada_em (data do veredito).
+    `anteriores` (as podas da última decisão): a que não tem mais `minimo_observacoes` no
+    histórico continua podada como estava, com a data antiga; só evidência nova muda o veredito.
+    """
+    hoje = hoje or datetime.now().strftime("%Y-%m-%d")
+    execucoes = max(1, df["data_execucao"].n_unique())
+
+    pares = (
+        df.with_columns(
+            pl.when(pl.col("qtd_variacao") == 0).then(1.0)
+            .otherwise(pl.col("qtd_intersecao") / pl.col("qtd_variacao"))
+            .alias("contencao")
+        )
+        .group_by(["termo_origem", "variacao", "outra_variacao"])
+        .agg(
+            (pl.col("contencao") >= limiar_contencao).mean().alias("frequencia"),
+            pl.len().alias("observacoes"),
+        )
+        .filter((pl.col("frequencia") >= frequencia_minima) & (pl.col("observacoes") >= minimo_observacoes))
+    )
+
+    # Custo e cobertura de cada variação (uma linha por observação, sem repetir os pares)
+    por_variacao = (
+        df.unique(subset=["data_execucao", "termo_origem", "geohash", "variacao"])
+        .group_by(["termo_origem", "variacao"])
+        .agg(
+            (pl.col("paginas").sum() / execucoes).alias("paginas_por_execucao"),
+            pl.col("qtd_exclusivos").sum().alias("exclusivos"),
+            pl.col("qtd_termo").sum().alias("total_termo"),
+        )
+        .with_columns(
+            pl.when(pl.col("total_termo") > 0)
+            .then(pl.col("exclusivos") / pl.col("total_termo"))
+            .otherwise(0.0)
+            .alias("cobertura_perdida")
+        )
+    )
+
+    candidatos = pares.join(por_variacao, on=["termo_origem", "variacao"]).sort(
+        ["paginas_por_execucao", "frequencia"], descending=True
+    )
+
+    colunas = ["termo_origem", "variacao", "contida_em", "frequencia", "observacoes",
+               "paginas_por_execucao", "cobertura_perdida", "podada_em"]
+
+    # Guloso: remove a variação mais cara primeiro, mas nunca a que está "segurando" outra já removida
+    removidas = {}
+    protegidas = set()
+    if anteriores is not None and not anteriores.is_empty():
+        observadas = set(
+            df.unique(subset=["data_execucao", "termo_origem", "geohash", "variacao"])
+            .group_by(["termo_origem", "variacao"]).len()
+            .filter(pl.col("len") >= minimo_observacoes)
+            .select(["termo_origem", "variacao"]).rows()
+        )
+        for linha in anteriores.iter_rows(named=True):
+            chave = (linha["termo_origem"], linha["variacao"])
+            contem = (linha["termo_origem"], linha["contida_em"])
+            if chave in observadas or contem in removidas:
+                continue
+            removidas[chave] = {c: linha.get(c) for c in colunas}  # sem podada_em (arquivo antigo): reprova já
+            protegidas.add(contem)
+    for linha in candidatos.iter_rows(named=True):
+        chave = (linha["termo_origem"], linha["variacao"])
+        contem = (linha["termo_origem"], linha["outra_variacao"])
+        if chave in removidas or chave in protegidas or contem in removidas:
+            continue
+        removidas[chave] = {**{c: linha.get(c) for c in colunas}, "contida_em": linha["outra_variacao"], "podada_em": hoje}
+        protegidas.add(contem)
+
+    if not removidas:
+        return pl.DataFrame(schema={c: candidatos.schema.get(c, pl.String) for c in colunas})
+    return pl.DataFrame(list(removidas.values()), schema_overrides={"podada_em": pl.String}).select(colunas)
+
+
+def carregar_podas(caminho=ARQUIVO_ESTATISTICAS, caminho_podas=ARQUIVO_PODAS, dias_reprova=DIAS_REPROVA):
+    """
+    Retorna ({termo_origem: {variações a remover}}, DataFrame das podas em vigor) a partir do
+    histórico salvo e da última decisão (que é atualizada). Podas com mais de `dias_reprova` dias
+    ficam no arquivo mas não entram no retorno: a variação roda de novo. Sem histórico, devolve ({}, None).
+    """
+    if not os.path.exists(caminho):
+        return {}, None
+    with travar(caminho_podas):
+        anteriores = pl.read_parquet(caminho_podas) if os.path.exists(caminho_podas) else None
+        df_podas = calcular_podas(pl.read_parquet(caminho), anteriores=anteriores)
+        gravar_parquet(df_podas, caminho_podas, compression="zstd")
+    limite = (datetime.now() - timedelta(days=dias_reprova)).strftime("%Y-%m-%d")
+    df_podas = df_podas.filter(pl.col("podada_em").is_not_null() & (pl.col("podada_em") > limite))
+    podas = {}
+    for linha in df_podas.iter_rows(named=True):
+        podas.setdefault(linha["termo_origem"], set()).add(linha["variacao"])
+    return podas, df_podas
+
+
+def relatorio_podas(df_podas):
+    if df_podas is None or df_podas.is_empty():
+        return "✂️  Poda de variações: nenhuma variação redundante com evidência suficiente."
+    paginas = df_podas["paginas_por_execucao"].sum()
+    perda_media = df_podas["cobertura_perdida"].mean() * 100
+    return (f"✂️  Poda de variações: {len(df_podas)} variações removidas → ~{paginas:.0f} requisições "
+            f"a menos por execução (cobertura perdida média {perda_media:.2f}% das notas de cada termo)")
+
+
+def main():
+    if not os.path.exists(ARQUIVO_ESTATISTICAS):
+        print(f"⚠️ Ainda não existem estatísticas em {ARQUIVO_ESTATISTICAS}. Rode a extração primeiro.")
+        return
+
+    _, df_podas = carregar_podas()
+    for linha in df_podas.iter_rows(named=True):
+        print(f"✂️  [{linha['termo_origem']}] {linha['variacao']} ⊂ {linha['contida_em']} "
+              f"({linha['frequencia']:.0%} de {linha['observacoes']} obs.) → "
+              f"-{linha['paginas_por_execucao']:.0f} req/execução, perde {linha['cobertura_perdida']:.2%}")
+    print()
+    print(relatorio_podas(df_podas))
+
+
+if __name__ == "__main__":
+    main()
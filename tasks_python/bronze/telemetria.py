@@ -0,0 +1,309 @@
+import bisect
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- TELEMETRIA DA EXTRAÇÃO ---
+# Antes a única visibilidade eram os prints com emoji de cada busca e a mensagem final do Telegram.
+# Aqui ficam:
+#   - métricas do processo: contadores, medidores (valores do momento) e histogramas de latência
+#     por fase (http, parse, dataframe, compressao, upload), com p50/p90/p99;
+#   - exportação: um JSON gravado a cada METRICAS_INTERVALO segundos e, se METRICAS_PORTA estiver
+#     definida, um endpoint local (/metricas em JSON, /metrics no formato texto do Prometheus);
+#   - log com nível (LOG_NIVEL) e formato (LOG_FORMATO texto|json), no lugar dos
+#     print(..., flush=True) de cada busca. Cada linha sai na hora: no CI o log do job acompanha a
+#     execução e um job morto não perde as últimas linhas. LOG_BUFFER=N (opcional) guarda até N
+#     linhas em memória e despeja em blocos, para terminal/arquivo onde a escrita por linha pesa.
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+
+METRICAS_ARQUIVO = os.getenv("METRICAS_ARQUIVO", os.path.join(DIRETORIO_ESTADO, "metricas_bronze.json"))
+METRICAS_INTERVALO = float(os.getenv("METRICAS_INTERVALO", "30"))
+METRICAS_PORTA = os.getenv("METRICAS_PORTA")  # ex: 9108; vazio = sem endpoint
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_FORMATO = os.getenv("LOG_FORMATO", "texto")
+LOG_BUFFER = int(os.getenv("LOG_BUFFER", "0"))  # linhas guardadas antes de escrever de uma vez (0 = sem buffer)
+
+# Limites (em segundos) das faixas dos histogramas: de 1 ms a 2 min
+FAIXAS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+class Histograma:
+    """Histograma de faixas fixas: soma, contagem, máximo e percentis aproximados pela faixa."""
+
+    def __init__(self, faixas=FAIXAS_SEGUNDOS):
+        self.faixas = faixas
+        self.contagens = [0] * (len(faixas) + 1)
+        self.quantidade = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.faixas, valor)] += 1
+        self.quantidade += 1
+        self.soma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p):
+        if not self.quantidade:
+            return 0.0
+        alvo = p * self.quantidade
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                # Limite superior da faixa (a última faixa aberta usa o máximo observado)
+                return min(self.faixas[i], self.maximo) if i < len(self.faixas) else self.maximo
+        return self.maximo
+
+    def resumo(self):
+        return {
+            "quantidade": self.quantidade,
+            "soma": round(self.soma, 4),
+            "media": round(self.soma / self.quantidade, 4) if self.quantidade else 0.0,
+            "p50": round(self.percentil(0.5), 4),
+            "p90": round(self.percentil(0.9), 4),
+            "p99": round(self.percentil(0.99), 4),
+            "maximo": round(self.maximo, 4),
+        }
+
+
+class Metricas:
+    """
+    Registro de métricas do processo (seguro entre threads e com o event loop do motor async).
+
+    - `incrementar(nome, valor=1, **rotulos)`: contador, ex: incrementar("requisicoes", status="429").
+    - `observar(nome, segundos)` / `with medir(fase)`: histograma de latência.
+    - `medidor(nome, funcao)`: valor lido na hora do snapshot (taxa do limitador, concorrência...).
+    """
+
+    def __init__(self):
+        self.inicio = time.time()
+        self._contadores = {}
+        self._histogramas = {}
+        self._medidores = {}
+        self._trava = threading.Lock()
+
+    @staticmethod
+    def _chave(nome, rotulos):
+        return nome, tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+    @staticmethod
+    def _texto_chave(chave, aspas=""):
+        nome, rotulos = chave
+        if not rotulos:
+            return nome
+        return nome + "{" + ",".join(f"{k}={aspas}{v}{aspas}" for k, v in rotulos) + "}"
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = self._chave(nome, rotulos)
+        with self._trava:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome, segundos):
+        with self._trava:
+            if nome not in self._histogramas:
+                self._histogramas[nome] = Histograma()
+            self._histogramas[nome].observar(segundos)
+
+    @contextmanager
+    def medir(self, fase):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(fase, time.perf_counter() - inicio)
+
+    def medidor(self, nome, funcao):
+        with self._trava:
+            self._medidores[nome] = funcao
+
+    def contador(self, nome, **rotulos):
+        with self._trava:
+            return self._contadores.get(self._chave(nome, rotulos), 0)
+
+    def histograma(self, nome):
+        with self._trava:
+            return self._histogramas[nome].resumo() if nome in self._histogramas else Histograma().resumo()
+
+    def snapshot(self):
+        with self._trava:
+            contadores = {self._texto_chave(c): v for c, v in sorted(self._contadores.items())}
+            histogramas = {n: h.resumo() for n, h in self._histogramas.items()}
+            medidores = dict(self._medidores)
+        valores = {}
+        for nome, funcao in medidores.items():
+            try:
+                valores[nome] = funcao()
+            except Exception:
+                valores[nome] = None
+        return {
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "segundos_execucao": round(time.time() - self.inicio, 1),
+            "contadores": contadores,
+            "medidores": valores,
+            "latencias_segundos": histogramas,
+        }
+
+    def formato_prometheus(self):
+        with self._trava:
+            contadores = sorted(self._contadores.items())
+        foto = self.snapshot()
+        linhas = [f"bronze_{self._texto_chave(chave, aspas=chr(34))} {valor}" for chave, valor in contadores]
+        for nome, valor in sorted(foto["medidores"].items()):
+            if isinstance(valor, (int, float)):
+                linhas.append(f"bronze_{nome} {valor}")
+        for nome, h in sorted(foto["latencias_segundos"].items()):
+            for p, quantil in (("p50", "0.5"), ("p90", "0.9"), ("p99", "0.99")):
+                linhas.append(f'bronze_latencia_segundos{{fase="{nome}",quantil="{quantil}"}} {h[p]}')
+            linhas.append(f'bronze_latencia_segundos_soma{{fase="{nome}"}} {h["soma"]}')
+            linhas.append(f'bronze_latencia_segundos_quantidade{{fase="{nome}"}} {h["quantidade"]}')
+        return "\n".join(linhas) + "\n"
+
+    def zerar(self):
+        with self._trava:
+            self.inicio = time.time()
+            self._contadores.clear()
+            self._histogramas.clear()
+
+
+# Instância única do processo (as fases acontecem em threads diferentes)
+metricas = Metricas()
+
+
+def classe_status(codigo):
+    """Rótulo do contador de requisições: 200, 429 ou a classe (4xx/5xx) do resto."""
+    return str(codigo) if codigo in (200, 429) else f"{codigo // 100}xx"
+
+
+class ExportadorMetricas:
+    """Grava o snapshot em JSON periodicamente e, opcionalmente, serve as métricas por HTTP."""
+
+    def __init__(self, registro=metricas, arquivo=METRICAS_ARQUIVO, intervalo=METRICAS_INTERVALO, porta=METRICAS_PORTA):
+        self.registro = registro
+        self.arquivo = arquivo
+        self.intervalo = intervalo
+        self.porta = int(porta) if porta else None
+        self._parar = threading.Event()
+        self._thread = None
+        self._servidor = None
+
+    def gravar(self):
+        if not self.arquivo:
+            return
+        os.makedirs(os.path.dirname(self.arquivo) or ".", exist_ok=True)
+        temporario = self.arquivo + ".tmp"
+        with open(temporario, "w") as f:
+            json.dump(self.registro.snapshot(), f, indent=2, ensure_ascii=False)
+        os.replace(temporario, self.arquivo)
+
+    def _periodico(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.gravar()
+            except OSError:
+                pass
+            descarregar_log()
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._periodico, name="metricas", daemon=True)
+        self._thread.start()
+        if self.porta:
+            registro = self.registro
+
+            class Manipulador(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.startswith("/metrics"):
+                        corpo, tipo = registro.formato_prometheus().encode(), "text/plain; version=0.0.4"
+                    elif self.path.startswith("/metricas"):
+                        corpo, tipo = json.dumps(registro.snapshot(), ensure_ascii=False).encode(), "application/json"
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", tipo)
+                    self.send_header("Content-Length", str(len(corpo)))
+                    self.end_headers()
+                    self.wfile.write(corpo)
+
+                def log_message(self, *args):
+                    pass
+
+            self._servidor = ThreadingHTTPServer(("127.0.0.1", self.porta), Manipulador)
+            threading.Thread(target=self._servidor.serve_forever, name="metricas-http", daemon=True).start()
+        return self
+
+    def encerrar(self):
+        self._parar.set()
+        if self._servidor:
+            self._servidor.shutdown()
+        self.gravar()
+
+
+# --- LOG ESTRUTURADO ---
+
+class FormatadorEstruturado(logging.Formatter):
+    """
+    texto: "2026-10-17 14:02:11 INFO  🏙️ Região: Curitiba | buscas=241 notas=5310"
+    json:  {"ts": "...", "nivel": "INFO", "logger": "bronze", "msg": "...", "buscas": 241, ...}
+    Campos extras vão em `extra={"campos": {...}}`.
+    """
+
+    def __init__(self, formato=LOG_FORMATO):
+        super().__init__()
+        self.formato = formato
+
+    def format(self, record):
+        campos = getattr(record, "campos", None) or {}
+        if self.formato == "json":
+            return json.dumps({
+                "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                "nivel": record.levelname,
+                "logger": record.name,
+                "msg": record.getMessage(),
+                **campos,
+            }, ensure_ascii=False, default=str)
+        texto = f"{datetime.fromtimestamp(record.created):%Y-%m-%d %H:%M:%S} {record.levelname:<5} {record.getMessage()}"
+        if campos:
+            texto += " | " + " ".join(f"{k}={v}" for k, v in campos.items())
+        return texto
+
+
+_saida_log = None
+
+
+def configurar_log(nome="bronze", nivel=LOG_NIVEL, formato=LOG_FORMATO, capacidade=LOG_BUFFER):
+    """
+    Logger na saída padrão, uma linha escrita por registro. Com `capacidade` > 0 as linhas ficam
+    em memória e saem em blocos (ao encher, a cada snapshot de métricas, em WARNING ou acima, e
+    no fim do processo). Chamar de novo não duplica handlers; chamar com outro `nome` põe esse
+    logger na mesma saída.
+    """
+    global _saida_log
+    logger = logging.getLogger(nome)
+    logger.setLevel(getattr(logging, nivel, logging.INFO))
+    if _saida_log is None:
+        saida = logging.StreamHandler(sys.stdout)
+        saida.setFormatter(FormatadorEstruturado(formato))
+        _saida_log = (
+            logging.handlers.MemoryHandler(capacidade, flushLevel=logging.WARNING, target=saida)
+            if capacidade > 0 else saida
+        )
+    if _saida_log not in logger.handlers:
+        logger.addHandler(_saida_log)
+        logger.propagate = False
+    return logger
+
+
+def descarregar_log():
+    if _saida_log is not None:
+        _saida_log.flush()
@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+
+# --- TRANSBORDO DE LOTES PARA O DISCO ---
+# Com o storage fora do ar, cada lote que falhava ficava retido na memória e ia se juntando ao
+# próximo: numa queda longa o processo crescia até ser morto pelo OOM e perdia tudo. Agora o
+# estágio de upload só segura na memória até MEMORIA_RETIDA_MAX notas; passou disso, o lote vira
+# um Parquet zstd (o mesmo arquivo que iria para a nuvem) numa pasta local, espelhando o caminho
+# do blob. Esses arquivos são drenados quando o storage volta: depois de qualquer upload que dê
+# certo, no início da próxima execução ou rodando este script sozinho. As notas transbordadas já
+# entram no índice de notas (indice_notas.py) ao ir para o disco: para a deduplicação elas já
+# estão guardadas.
+#
+#   python tasks_python/bronze/transbordo_lotes.py   # drena para o STORAGE_PROVIDER do .env
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+DIRETORIO_TRANSBORDO = os.getenv("DIRETORIO_TRANSBORDO", os.path.join(DIRETORIO_ESTADO, "transbordo"))
+
+# Notas de lotes que falharam que ainda podem ficar na memória (para ir junto com o próximo lote)
+MEMORIA_RETIDA_MAX = int(os.getenv("MEMORIA_RETIDA_MAX", "20000"))
+
+log = logging.getLogger("bronze")
+
+
+class TransbordoLotes:
+    """
+    Pasta de lotes já serializados esperando o storage voltar.
+
+    - `guardar(dados, caminho_blob)` grava o Parquet de forma atômica (temporário + rename).
+    - `drenar(armazenamento)` sobe os arquivos na ordem, apaga cada um que subiu e
+      para no primeiro erro (o storage ainda está fora: tenta de novo depois).
+    """
+
+    def __init__(self, diretorio=DIRETORIO_TRANSBORDO):
+        self.diretorio = diretorio
+        self.lotes_guardados = 0
+        self.lotes_drenados = 0
+        self._trava = threading.Lock()
+        self._drenando = threading.Lock()
+
+    def _arquivo(self, caminho_blob):
+        return os.path.join(self.diretorio, *caminho_blob.split("/"))
+
+    def guardar(self, dados, caminho_blob):
+        arquivo = self._arquivo(caminho_blob)
+        os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+        temporario = arquivo + ".tmp"
+        with open(temporario, "wb") as f:
+            f.write(dados)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, arquivo)
+        with self._trava:
+            self.lotes_guardados += 1
+        log.warning(f"💾 Lote transbordado para o disco ({len(dados) / 1e6:.1f} MB): {arquivo}")
+
+    def pendentes(self):
+        """Caminhos de blob (relativos à pasta) que ainda não subiram, em ordem."""
+        if not os.path.isdir(self.diretorio):
+            return []
+        caminhos = []
+        for pasta, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                if nome.endswith(".parquet"):
+                    relativo = os.path.relpath(os.path.join(pasta, nome), self.diretorio)
+                    caminhos.append(relativo.replace(os.sep, "/"))
+        return sorted(caminhos)
+
+    def drenar(self, armazenamento):
+        """Envia tudo que está na pasta. Retorna quantos arquivos subiram."""
+        # Uma drenagem por vez (o estágio de upload e o main() podem chamar ao mesmo tempo)
+        if not self._drenando.acquire(blocking=False):
+            return 0
+        enviados = 0
+        try:
+            for caminho_blob in self.pendentes():
+                arquivo = self._arquivo(caminho_blob)
+                with open(arquivo, "rb") as f:
+                    dados = f.read()
+                try:
+                    armazenamento.enviar(dados, caminho_blob)
+                except Exception as e:
+                    log.warning(f"⚠️ Storage ainda indisponível, drenagem do transbordo adiada: {e}")
+                    break
+                os.remove(arquivo)
+                enviados += 1
+                log.info(f"📤 Lote transbordado enviado {armazenamento.destino}: {caminho_blob}")
+            with self._trava:
+                self.lotes_drenados += enviados
+        finally:
+            self._drenando.release()
+        return enviados
+
+
+def main():
+    from dotenv import load_dotenv
+    from armazenamento import obter_armazenamento
+    from telemetria import configurar_log, descarregar_log
+
+    load_dotenv()
+    configurar_log()
+    transbordo = TransbordoLotes()
+    pendentes = transbordo.pendentes()
+    log.info(f"💾 {len(pendentes)} lotes no transbordo ({transbordo.diretorio}).")
+    if pendentes:
+        armazenamento = obter_armazenamento(os.getenv("STORAGE_PROVIDER", "azure"))
+        enviados = transbordo.drenar(armazenamento)
+        log.info(f"✅ {enviados}/{len(pendentes)} lotes drenados.")
+    descarregar_log()
+
+
+if __name__ == "__main__":
+    main()
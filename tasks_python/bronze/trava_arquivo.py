@@ -0,0 +1,51 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock (lá o pipeline roda num processo só, dentro do container é Linux)
+    fcntl = None
+
+# --- TRAVA ENTRE PROCESSOS PARA OS ARQUIVOS DE ESTADO ---
+# Índice de notas, marcas d'água, custos por geohash e estatísticas de variações são arquivos em
+# DIRETORIO_ESTADO que todo worker lê, junta com o que coletou e regrava. Com vários workers da
+# fila no mesmo diretório, ler-juntar-regravar sem trava faz o último a gravar apagar o que os
+# outros gravaram no meio. `travar(caminho)` segura um flock exclusivo num arquivo ao lado
+# (`<arquivo>.lock`) durante o ciclo inteiro; quem grava relê o arquivo do disco já com a trava.
+
+
+@contextmanager
+def travar(caminho):
+    """Trava exclusiva (bloqueante) de `caminho` entre processos do mesmo host/volume."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho + ".lock", "a") as arquivo_trava:
+        if fcntl is not None:
+            fcntl.flock(arquivo_trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo_trava, fcntl.LOCK_UN)
+
+
+def tentar_travar(caminho):
+    """
+    Trava exclusiva sem esperar: devolve o arquivo de trava aberto (a trava vale enquanto ele
+    estiver aberto) ou None se outro processo já a tem.
+    """
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    arquivo_trava = open(caminho + ".lock", "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(arquivo_trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo_trava.close()
+            return None
+    return arquivo_trava
+
+
+def gravar_parquet(df, caminho, **opcoes):
+    """Grava num temporário deste processo e renomeia: um crash no meio nunca corrompe o arquivo."""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    df.write_parquet(temporario, **opcoes)
+    os.replace(temporario, caminho)
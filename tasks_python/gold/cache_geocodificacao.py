@@ -0,0 +1,103 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# --- CACHE PERSISTENTE DE GEOCODIFICAÇÃO ---
+# O gold consultava o Nominatim para todo CNPJ em toda execução, com 1,5 s de espera obrigatória
+# entre chamadas: alguns milhares de lojas davam mais de uma hora, sendo que loja quase nunca
+# muda de lugar. Aqui cada resposta fica num SQLite chaveado por CNPJ + hash do endereço
+# normalizado (sem acento, maiúsculo, espaços colapsados):
+#   - endereço igual dentro do TTL → usa o cache, sem chamada e sem espera;
+#   - endereço mudou (a chave muda) ou o registro venceu → consulta de novo;
+#   - "não encontrado" também é guardado (cache negativo), com um TTL menor, para o endereço
+#     ruim não gastar 1,5 s em toda execução mas ainda ganhar outra chance depois.
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+DIRETORIO_ESTADO = os.getenv("DIRETORIO_ESTADO", os.path.join(RAIZ_PROJETO, "estado"))
+ARQUIVO_CACHE = os.getenv("GEOCODE_CACHE_ARQUIVO", os.path.join(DIRETORIO_ESTADO, "cache_geocodificacao.sqlite3"))
+
+TTL_DIAS = float(os.getenv("GEOCODE_TTL_DIAS", "180"))
+TTL_NEGATIVO_DIAS = float(os.getenv("GEOCODE_TTL_NEGATIVO_DIAS", "14"))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS geocodificacao (
+    cnpj TEXT NOT NULL,
+    hash_endereco TEXT NOT NULL,
+    endereco TEXT NOT NULL,
+    latitude TEXT,
+    longitude TEXT,
+    fonte TEXT,
+    consultado_em REAL NOT NULL,
+    PRIMARY KEY (cnpj, hash_endereco)
+);
+"""
+
+
+def normalizar_endereco(endereco):
+    sem_acento = unicodedata.normalize("NFKD", str(endereco)).encode("ascii", "ignore").decode()
+    return re.sub(r"\s+", " ", sem_acento.upper()).strip(" ,")
+
+
+def hash_endereco(endereco):
+    return hashlib.sha1(normalizar_endereco(endereco).encode()).hexdigest()[:16]
+
+
+class CacheGeocodificacao:
+    """
+    `buscar(cnpj, endereco)` devolve (lat, lon, fonte) de um registro válido, (None, None, fonte)
+    de um negativo válido, ou None se precisa consultar. `guardar` grava a resposta (lat/lon None
+    = não encontrado).
+    """
+
+    def __init__(self, caminho=ARQUIVO_CACHE, ttl_dias=TTL_DIAS, ttl_negativo_dias=TTL_NEGATIVO_DIAS):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.ttl = ttl_dias * 86400
+        self.ttl_negativo = ttl_negativo_dias * 86400
+        self.acertos = 0
+        self.acertos_negativos = 0
+        self.faltas = 0
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.executescript(ESQUEMA)
+
+    def buscar(self, cnpj, endereco, agora=None):
+        agora = agora or time.time()
+        with self._trava:
+            linha = self._conexao.execute(
+                "SELECT latitude, longitude, fonte, consultado_em FROM geocodificacao WHERE cnpj = ? AND hash_endereco = ?",
+                (str(cnpj), hash_endereco(endereco)),
+            ).fetchone()
+        if linha is not None:
+            lat, lon, fonte, consultado_em = linha
+            encontrado = lat is not None and lon is not None
+            if agora - consultado_em < (self.ttl if encontrado else self.ttl_negativo):
+                if encontrado:
+                    self.acertos += 1
+                else:
+                    self.acertos_negativos += 1
+                return lat, lon, fonte
+        self.faltas += 1
+        return None
+
+    def guardar(self, cnpj, endereco, lat, lon, fonte="nominatim", agora=None):
+        with self._trava, self._conexao:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO geocodificacao VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(cnpj), hash_endereco(endereco), normalizar_endereco(endereco),
+                 lat, lon, fonte, agora or time.time()),
+            )
+
+    def resumo(self):
+        return (f"🗃️  Cache de geocodificação: {self.acertos} acertos, {self.acertos_negativos} negativos "
+                f"(não encontrados recentes), {self.faltas} consultas novas")
+
+    def fechar(self):
+        with self._trava:
+            self._conexao.close()
@@ -0,0 +1,171 @@
+import difflib
+import math
+import os
+import polars as pl
+
+from cache_geocodificacao import normalizar_endereco
+
+# --- GEOCODIFICAÇÃO OFFLINE (CENTRÓIDES DOS MUNICÍPIOS) ---
+# Quando o Nominatim não acha o endereço a loja ficava sem coordenada nenhuma, e endereço sem rua
+# (que nunca ia ser achado) ainda pagava 1,5 s de espera. Aqui há um nível local, sem rede, que
+# sempre devolve alguma coordenada com o grau de precisão dela (`precisao_geo`):
+#   - 'origem_busca': a nota diz que a loja está a no máximo LIMITE_ORIGEM_KM do centro do
+#                  geohash da busca (distkm), então esse ponto é melhor que o centróide da cidade.
+#                  É o ponto de onde a busca partiu, não o bairro da loja: o erro é de até esses km;
+#   - 'municipio': centróide do município da loja (`mun`), pelo nome normalizado ou, se o nome
+#                  vier abreviado/com erro, pelo nome mais parecido entre os municípios ao alcance
+#                  da busca (índice espacial em grade sobre dados/municipios_pr_geohash.csv);
+#   - 'regiao':    nem o nome casou: centróide do município mais próximo do ponto da busca.
+# Loja de outra UF (o CSV só tem o Paraná) longe do ponto da busca fica sem coordenada: o
+# município do Paraná mais próximo ou de nome parecido não é o dela.
+# O índice é montado uma vez em memória (399 municípios, células de TAMANHO_CELULA graus).
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, '..', '..'))
+ARQUIVO_MUNICIPIOS = os.path.join(RAIZ_PROJETO, "dados", "municipios_pr_geohash.csv")
+
+UF_MUNICIPIOS = "PR"  # o CSV só tem o Paraná
+TAMANHO_CELULA = 0.25  # graus (~28 km): a grade do índice espacial
+LIMITE_ORIGEM_KM = float(os.getenv("GEOCODE_LIMITE_ORIGEM_KM", os.getenv("GEOCODE_LIMITE_BAIRRO_KM", "2")))
+FOLGA_BUSCA_KM = 10  # além do distkm, para o centróide de um município grande ainda entrar na busca
+SEMELHANCA_MINIMA = 0.8
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def decodificar_geohash(geohash):
+    """Centro (lat, lon) de um geohash."""
+    lat, lon = [-90.0, 90.0], [-180.0, 180.0]
+    par = True
+    for caractere in geohash:
+        valor = BASE32.index(caractere)
+        for bit in (16, 8, 4, 2, 1):
+            intervalo = lon if par else lat
+            meio = (intervalo[0] + intervalo[1]) / 2
+            intervalo[0 if valor & bit else 1] = meio
+            par = not par
+    return (lat[0] + lat[1]) / 2, (lon[0] + lon[1]) / 2
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre dois pontos (fórmula de Haversine)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+class IndiceMunicipios:
+    """
+    Centróides dos municípios com busca por nome normalizado e por proximidade (grade fixa:
+    cada célula guarda os municípios cujo centróide cai nela).
+    """
+
+    def __init__(self, caminho=ARQUIVO_MUNICIPIOS):
+        df = pl.read_csv(caminho).select(["nome", "latitude", "longitude"])
+        self.municipios = df.with_columns(
+            pl.col("nome").map_elements(normalizar_endereco, return_dtype=pl.String).alias("mun_normalizado")
+        )
+        self._celulas = {}
+        for i, (lat, lon) in enumerate(self.municipios.select(["latitude", "longitude"]).iter_rows()):
+            self._celulas.setdefault(self._celula(lat, lon), []).append(i)
+        self._linhas = self.municipios.rows(named=True)
+
+    @staticmethod
+    def _celula(lat, lon):
+        return math.floor(lat / TAMANHO_CELULA), math.floor(lon / TAMANHO_CELULA)
+
+    def proximos(self, lat, lon, raio_km):
+        """Municípios com centróide a até `raio_km`, do mais perto para o mais longe."""
+        alcance = math.ceil(raio_km / (TAMANHO_CELULA * 111.0) / max(math.cos(math.radians(lat)), 0.1)) + 1
+        base_lat, base_lon = self._celula(lat, lon)
+        encontrados = []
+        for d_lat in range(-alcance, alcance + 1):
+            for d_lon in range(-alcance, alcance + 1):
+                for i in self._celulas.get((base_lat + d_lat, base_lon + d_lon), ()):
+                    municipio = self._linhas[i]
+                    distancia = distancia_km(lat, lon, municipio["latitude"], municipio["longitude"])
+                    if distancia <= raio_km:
+                        encontrados.append((distancia, municipio))
+        return [m for _, m in sorted(encontrados, key=lambda p: p[0])]
+
+    def mais_proximo(self, lat, lon):
+        raio = TAMANHO_CELULA * 111.0
+        while raio < 2000:
+            encontrados = self.proximos(lat, lon, raio)
+            if encontrados:
+                return encontrados[0]
+            raio *= 2
+        return None
+
+    def parecido(self, mun_normalizado, candidatos):
+        """Candidato com o nome mais parecido (abreviações, letra trocada), se for parecido o bastante."""
+        melhor, nota = None, SEMELHANCA_MINIMA
+        for municipio in candidatos:
+            semelhanca = difflib.SequenceMatcher(None, mun_normalizado, municipio["mun_normalizado"]).ratio()
+            if semelhanca >= nota:
+                melhor, nota = municipio, semelhanca
+        return melhor
+
+
+def geocodificar_offline(lojas, indice):
+    """
+    Recebe um DataFrame com cnpj, mun, uf, geohash_origem e distkm (os dois últimos podem ser
+    nulos) e devolve cnpj, latitude, longitude (texto, como as do Nominatim) e precisao_geo.
+    'origem_busca' e o nome exato saem em colunas (joins); só as lojas do Paraná que sobram passam
+    pelo índice espacial, uma a uma.
+    """
+    # Os geohashes de busca são poucas centenas: decodifica cada um uma vez
+    geohashes = lojas.get_column("geohash_origem").drop_nulls().unique().to_list()
+    origens = pl.DataFrame(
+        [(g, *decodificar_geohash(g)) for g in geohashes], orient="row",
+        schema={"geohash_origem": lojas.schema["geohash_origem"], "lat_origem": pl.Float64, "lon_origem": pl.Float64},
+    )
+    # ...e o mesmo vale para os nomes de município (milhares de lojas, centenas de nomes)
+    nomes = lojas.get_column("mun").drop_nulls().unique().to_list()
+    normalizados = pl.DataFrame(
+        [(n, normalizar_endereco(n)) for n in nomes], orient="row",
+        schema={"mun": lojas.schema["mun"], "mun_normalizado": pl.String},
+    )
+    mesma_uf = pl.col("uf").is_null() | (pl.col("uf") == UF_MUNICIPIOS)  # homônimo de outro estado não é o do CSV
+    perto_da_origem = pl.col("lat_origem").is_not_null() & (pl.col("distkm") <= LIMITE_ORIGEM_KM)
+
+    base = (
+        lojas.join(normalizados, on="mun", how="left")
+        .join(origens, on="geohash_origem", how="left")
+        .join(
+            indice.municipios.select(["mun_normalizado", pl.col("latitude").alias("lat_mun"), pl.col("longitude").alias("lon_mun")]),
+            on="mun_normalizado", how="left",
+        )
+        .with_columns(
+            pl.when(perto_da_origem).then(pl.col("lat_origem")).when(mesma_uf).then(pl.col("lat_mun")).alias("latitude"),
+            pl.when(perto_da_origem).then(pl.col("lon_origem")).when(mesma_uf).then(pl.col("lon_mun")).alias("longitude"),
+        )
+        .with_columns(
+            pl.when(perto_da_origem).then(pl.lit("origem_busca"))
+            .when(pl.col("latitude").is_not_null()).then(pl.lit("municipio"))
+            .alias("precisao_geo")
+        )
+    )
+
+    # Nome sem correspondência exata: município parecido ao alcance da busca, senão o mais próximo
+    # (só para lojas do Paraná: a de outra UF continua nula)
+    sobras = base.filter(pl.col("precisao_geo").is_null() & pl.col("lat_origem").is_not_null() & mesma_uf)
+    resolvidas = []
+    for cnpj, mun, lat_origem, lon_origem, distkm in sobras.select(
+        ["cnpj", "mun_normalizado", "lat_origem", "lon_origem", "distkm"]
+    ).iter_rows():
+        raio = (distkm or 0) + FOLGA_BUSCA_KM
+        candidato = indice.parecido(mun or "", indice.proximos(lat_origem, lon_origem, raio))
+        precisao = "municipio"
+        if candidato is None:
+            candidato, precisao = indice.mais_proximo(lat_origem, lon_origem), "regiao"
+        if candidato is not None:
+            resolvidas.append((cnpj, candidato["latitude"], candidato["longitude"], precisao))
+
+    colunas = ["cnpj", "latitude", "longitude", "precisao_geo"]
+    if resolvidas:
+        df_resolvidas = pl.DataFrame(resolvidas, orient="row", schema=base.select(colunas).schema)
+        base = base.select(colunas).update(df_resolvidas, on="cnpj")
+    return base.select(colunas).with_columns(
+        pl.col("latitude").round(6).cast(pl.String), pl.col("longitude").round(6).cast(pl.String)
+    )
@@ -0,0 +1,303 @@
+import hashlib
+import math
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIRETORIO_SCRIPT, '..', 'bronze'))
+
+from limitador_taxa import LimitadorTaxaAdaptativo, ler_retry_after
+
+# --- GEOCODIFICAÇÃO CONCORRENTE EM VÁRIOS PROVEDORES ---
+# O gold consultava um provedor só, em série, com um sleep fixo de 1,5 s e uma conexão nova
+# (requests.get) a cada chamada. Aqui os endereços vão para uma fila compartilhada e cada
+# provedor configurado (o Nominatim público, instâncias próprias do Nominatim, o falso) tem suas
+# threads puxando dessa fila:
+#   - uma sessão HTTP com keep-alive para todos (pool de conexões reaproveitado);
+#   - um limitador de taxa por provedor (o token bucket da extração, limitador_taxa.py, com a taxa
+#     fixa): a vazão total é a soma das taxas permitidas, sem nenhum provedor passar da sua. Um 429
+#     pausa o provedor (Retry-After) sem cortar a taxa, que volta a ser a combinada depois da pausa;
+#   - um disjuntor por provedor: depois de FALHAS_PARA_ABRIR erros seguidos ele para de receber
+#     endereços por PAUSA_DISJUNTOR segundos e depois testa com uma consulta só. O endereço que
+#     deu erro volta para a fila e outro provedor pega (qualquer exceção, não só as de rede: um
+#     endereço nunca some sem resposta, e o chamador não espera para sempre por threads mortas).
+#
+# GEOCODE_PROVEDORES: lista "nome=url@req_por_segundo" separada por vírgula. A url 'falso' usa o
+# provedor local (sem rede, coordenadas determinísticas dentro do PR), para testes e benchmark:
+#   GEOCODE_PROVEDORES=osm=https://nominatim.openstreetmap.org/search@0.66,meu=http://nominatim:8080/search@20
+#   python tasks_python/gold/geocodificacao_provedores.py 2000   # benchmark só com provedores falsos
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "ComparaTudoApp/1.0 (seu_email@exemplo.com)" # Substitua pelo seu email se quiser
+# O público permite 1 req/s; 0.66 é o mesmo ritmo do antigo sleep de 1,5 s
+PROVEDORES_PADRAO = f"osm={NOMINATIM_URL}@0.66"
+PROVEDORES = os.getenv("GEOCODE_PROVEDORES", PROVEDORES_PADRAO)
+THREADS_POR_PROVEDOR = int(os.getenv("GEOCODE_THREADS_POR_PROVEDOR", "4"))
+TIMEOUT_SEGUNDOS = 15
+
+FALHAS_PARA_ABRIR = 5
+PAUSA_DISJUNTOR = 60.0
+MAX_TENTATIVAS = 3  # erros (não "não encontrado") de um endereço antes de desistir dele nesta execução
+
+LATENCIA_FALSO_MS = os.getenv("GEOCODE_FALSO_LATENCIA_MS", "50-150")
+PROB_ERRO_FALSO = float(os.getenv("GEOCODE_FALSO_PROB_ERRO", "0.0"))
+
+
+class ErroProvedor(Exception):
+    """Falha de rede/HTTP: o endereço volta para a fila e conta para o disjuntor."""
+
+
+class Disjuntor:
+    """Fechado → (FALHAS_PARA_ABRIR erros seguidos) → aberto → (pausa) → meio-aberto: uma consulta de teste."""
+
+    def __init__(self, falhas_para_abrir=FALHAS_PARA_ABRIR, pausa=PAUSA_DISJUNTOR):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.pausa = pausa
+        self.aberturas = 0
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._testando = False
+        self._trava = threading.Lock()
+
+    def liberar(self):
+        """0 se pode consultar agora, senão quantos segundos esperar."""
+        with self._trava:
+            agora = time.monotonic()
+            if self._falhas < self.falhas_para_abrir:
+                return 0.0
+            if agora < self._aberto_ate or self._testando:
+                return max(self._aberto_ate - agora, 0.5)
+            self._testando = True  # meio-aberto: só esta thread passa
+            return 0.0
+
+    def sucesso(self):
+        with self._trava:
+            self._falhas = 0
+            self._testando = False
+
+    def falha(self):
+        with self._trava:
+            self._falhas += 1
+            if self._falhas >= self.falhas_para_abrir:
+                # Conta a passagem para aberto (ou o teste que falhou), não as consultas que já estavam no ar
+                if self._testando or self._falhas == self.falhas_para_abrir:
+                    self.aberturas += 1
+                    self._aberto_ate = time.monotonic() + self.pausa
+            self._testando = False
+
+    def estado(self):
+        with self._trava:
+            if self._falhas < self.falhas_para_abrir:
+                return "fechado"
+            return "aberto" if time.monotonic() < self._aberto_ate else "meio-aberto"
+
+
+class Provedor:
+    """Um endpoint com a API de busca do Nominatim (`q`, `format=jsonv2`)."""
+
+    def __init__(self, nome, url, taxa, sessao=None, threads=THREADS_POR_PROVEDOR):
+        self.nome = nome
+        self.url = url
+        self.taxa = taxa
+        self.sessao = sessao
+        self.threads = threads
+        # Taxa fixa (sem incremento nem corte): o limite do provedor não é descoberto, é o combinado;
+        # com incremento 0 um corte no 429 nunca mais voltaria, então o 429 só pausa
+        self.limitador = LimitadorTaxaAdaptativo(taxa_inicial=taxa, taxa_minima=taxa, taxa_maxima=taxa,
+                                                 incremento=0.0, fator_corte=1.0, pausa_429=5.0, rajada=1.0)
+        self.disjuntor = Disjuntor()
+        self.consultas = 0
+        self.encontrados = 0
+        self.falhas = 0
+        self._trava = threading.Lock()
+
+    def _contar(self, **incrementos):
+        with self._trava:
+            for nome, valor in incrementos.items():
+                setattr(self, nome, getattr(self, nome) + valor)
+
+    def consultar(self, endereco):
+        """(lat, lon), ou (None, None) se não encontrado. Levanta ErroProvedor em falha."""
+        params = {"q": endereco, "format": "jsonv2", "addressdetails": 1, "limit": 1}
+        try:
+            resposta = self.sessao.get(self.url, params=params, headers={"User-Agent": USER_AGENT}, timeout=TIMEOUT_SEGUNDOS)
+        except requests.RequestException as e:
+            raise ErroProvedor(f"{self.nome}: {e}") from e
+        if resposta.status_code == 429:
+            self.limitador.registrar_429(ler_retry_after(resposta.headers.get("Retry-After")))
+            raise ErroProvedor(f"{self.nome}: HTTP 429")
+        if resposta.status_code != 200:
+            raise ErroProvedor(f"{self.nome}: HTTP {resposta.status_code}")
+        try:
+            dados = resposta.json()
+        except ValueError as e:  # página de erro/manutenção com status 200
+            raise ErroProvedor(f"{self.nome}: resposta não é JSON") from e
+        if isinstance(dados, list) and len(dados) > 0:
+            return str(dados[0].get("lat")), str(dados[0].get("lon"))
+        return None, None
+
+    def resumo(self):
+        return (f"   {self.nome}: {self.consultas} consultas, {self.encontrados} encontrados, {self.falhas} falhas, "
+                f"disjuntor {self.disjuntor.estado()} (abriu {self.disjuntor.aberturas}x), limite {self.taxa:g} req/s")
+
+
+class ProvedorFalso(Provedor):
+    """
+    Provedor local para testes e benchmark: latência sorteada, erros com PROB_ERRO_FALSO e
+    coordenadas estáveis por endereço dentro do Paraná (1 em cada 10 endereços "não existe").
+    """
+
+    def __init__(self, nome, taxa, latencia_ms=LATENCIA_FALSO_MS, prob_erro=PROB_ERRO_FALSO, sessao=None):
+        minimo, _, maximo = latencia_ms.partition("-")
+        latencia = (float(minimo) / 1000, float(maximo or minimo) / 1000)
+        # Threads suficientes para a latência não segurar a taxa (taxa x latência consultas no ar)
+        super().__init__(nome, "falso", taxa, sessao, threads=max(THREADS_POR_PROVEDOR, math.ceil(taxa * latencia[1]) + 1))
+        self.latencia = latencia
+        self.prob_erro = prob_erro
+
+    def consultar(self, endereco):
+        time.sleep(random.uniform(*self.latencia))
+        if random.random() < self.prob_erro:
+            raise ErroProvedor(f"{self.nome}: erro simulado")
+        semente = int(hashlib.md5(endereco.encode()).hexdigest()[:12], 16)
+        if semente % 10 == 0:
+            return None, None
+        lat = -26.7 + (semente % 10_000) / 10_000 * 4.3
+        lon = -54.6 + (semente // 10_000 % 10_000) / 10_000 * 6.5
+        return f"{lat:.6f}", f"{lon:.6f}"
+
+
+def criar_sessao(tamanho_pool):
+    """Uma sessão para todos os provedores: conexões keep-alive reaproveitadas entre as consultas."""
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=8, pool_maxsize=max(tamanho_pool, 10))
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+
+def criar_provedores(configuracao=PROVEDORES):
+    """Lê "nome=url@taxa,..." (url 'falso' = ProvedorFalso)."""
+    entradas = [e.strip() for e in configuracao.split(",") if e.strip()]
+    sessao = criar_sessao(len(entradas) * THREADS_POR_PROVEDOR)
+    provedores = []
+    for entrada in entradas:
+        nome, _, resto = entrada.partition("=")
+        url, _, taxa = resto.rpartition("@")
+        if not nome or not url:
+            raise ValueError(f"GEOCODE_PROVEDORES inválido: '{entrada}' (use nome=url@req_por_segundo)")
+        taxa = float(taxa or 1)
+        provedores.append(ProvedorFalso(nome, taxa, sessao=sessao) if url == "falso" else Provedor(nome, url, taxa, sessao))
+    return provedores
+
+
+class GeocodificadorConcorrente:
+    """
+    `geocodificar(itens, ao_resolver)` consulta todos os (chave, endereco) usando todos os
+    provedores ao mesmo tempo. `ao_resolver(chave, endereco, lat, lon, provedor)` é chamado
+    (na thread do chamador) para cada endereço respondido; os que esgotaram as tentativas não
+    são passados. Retorna {chave: (lat, lon)}.
+    """
+
+    def __init__(self, provedores):
+        self.provedores = provedores
+        self.desistidos = 0
+
+    def _trabalhar(self, provedor, fila, respostas, parar):
+        while not parar.is_set():
+            try:
+                chave, endereco, tentativas = fila.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            espera = provedor.disjuntor.liberar()
+            if espera:
+                # Disjuntor aberto: o endereço fica para os outros provedores
+                fila.put((chave, endereco, tentativas))
+                parar.wait(min(espera, 1.0))
+                continue
+            if not provedor.limitador.adquirir(parar):
+                fila.put((chave, endereco, tentativas))
+                return
+            try:
+                lat, lon = provedor.consultar(endereco)
+            except Exception:  # ErroProvedor ou bug no provedor: o endereço não pode se perder
+                provedor.disjuntor.falha()
+                provedor._contar(consultas=1, falhas=1)
+                if tentativas + 1 >= MAX_TENTATIVAS:
+                    respostas.put((chave, endereco, None, provedor.nome))
+                else:
+                    fila.put((chave, endereco, tentativas + 1))  # outro provedor (ou este, mais tarde) tenta
+                continue
+            provedor.disjuntor.sucesso()
+            provedor._contar(consultas=1, encontrados=int(lat is not None))
+            respostas.put((chave, endereco, (lat, lon), provedor.nome))
+
+    def geocodificar(self, itens, ao_resolver=None):
+        fila = queue.Queue()
+        for chave, endereco in itens:
+            fila.put((chave, endereco, 0))
+        total = fila.qsize()
+        respostas = queue.Queue()
+        parar = threading.Event()
+        threads = [
+            threading.Thread(target=self._trabalhar, args=(p, fila, respostas, parar), name=f"geo-{p.nome}-{i}", daemon=True)
+            for p in self.provedores for i in range(p.threads)
+        ]
+        for thread in threads:
+            thread.start()
+
+        resultados = {}
+        try:
+            for recebidas in range(total):
+                while True:
+                    try:
+                        chave, endereco, coordenadas, provedor = respostas.get(timeout=5.0)
+                        break
+                    except queue.Empty:
+                        if not any(thread.is_alive() for thread in threads):
+                            raise RuntimeError(f"Geocodificação: todas as threads dos provedores terminaram "
+                                               f"com {total - recebidas} endereços sem resposta")
+                if coordenadas is None:
+                    self.desistidos += 1
+                    continue
+                resultados[chave] = coordenadas
+                if ao_resolver is not None:
+                    ao_resolver(chave, endereco, *coordenadas, provedor)
+        finally:
+            parar.set()
+            for thread in threads:
+                thread.join()
+        return resultados
+
+    def resumo(self):
+        linhas = [f"🛰️  Provedores de geocodificação ({self.desistidos} endereços desistidos após {MAX_TENTATIVAS} erros):"]
+        linhas.extend(p.resumo() for p in self.provedores)
+        return "\n".join(linhas)
+
+
+def main():
+    """Benchmark offline: N endereços sintéticos em provedores falsos (GEOCODE_PROVEDORES, se só tiver falsos)."""
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    configuracao = PROVEDORES if "falso" in PROVEDORES and "http" not in PROVEDORES else "falso1=falso@50,falso2=falso@50,falso3=falso@100"
+    provedores = criar_provedores(configuracao)
+    geocodificador = GeocodificadorConcorrente(provedores)
+    itens = [(str(i), f"RUA TESTE {i}, {i % 900 + 1}, CENTRO, PR, BRASIL") for i in range(quantidade)]
+
+    inicio = time.perf_counter()
+    resultados = geocodificador.geocodificar(itens)
+    segundos = time.perf_counter() - inicio
+    limite = sum(p.taxa for p in provedores)
+    print(f"⏱️  {quantidade} endereços em {segundos:.1f}s ({quantidade / segundos:.1f}/s; soma dos limites {limite:g}/s), "
+          f"{sum(1 for lat, _ in resultados.values() if lat)} encontrados")
+    print(geocodificador.resumo())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,136 +1,213 @@
-import pandas as pd
-import requests
-import time
+import io
+import polars as pl
 import os
-import glob
+import sys
 from datetime import datetime
 
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIRETORIO_SCRIPT, '..', 'bronze'))
+
+from armazenamento import obter_armazenamento
+from compactar_bronze import arquivos_validos, prefixo_dia, PREFIXO_BRONZE
+from cache_geocodificacao import CacheGeocodificacao
+from geocodificacao_offline import IndiceMunicipios, geocodificar_offline
+from geocodificacao_provedores import GeocodificadorConcorrente, criar_provedores
+
 # --- CONFIGURAÇÕES ---
-PASTA_BRONZE_NOTAS = "dados_lake/bronze/notas"
+CONTAINER_BRONZE = os.getenv("CONTAINER_BRONZE", "bronze")
 PASTA_BRONZE_LOJAS = "dados_lake/bronze/lojas"
-NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
-USER_AGENT = "ComparaTudoApp/1.0 (seu_email@exemplo.com)" # Substitua pelo seu email se quiser
+# 'remoto': Nominatim para endereços com rua, centróides locais para o resto e para o que ele não achar
+# 'offline': só os centróides locais (sem rede)
+GEOCODE_MODO = os.getenv("GEOCODE_MODO", "remoto")
+
+# Colunas do estabelecimento usadas no endereço, na ordem do padrão "RUA NOME, NUMERO, BAIRRO, UF, BRASIL"
+CAMPOS_ENDERECO = ["tp_logr", "nm_logr", "nr_logr", "bairro", "uf"]
 
-def formatar_endereco(row):
+
+def prefixo_estabelecimento(colunas):
     """
-    Monta a string de endereço baseada nas colunas que vieram achatadas do JSON.
-    As colunas geradas pelo pd.json_normalize têm o prefixo 'estabelecimento.'
+    Arquivos gerados pelo pd.json_normalize têm o prefixo 'estabelecimento.'; os do bronze atual
+    (lote_colunar.py) já vêm achatados sem prefixo.
     """
-    tp_logr = str(row.get('estabelecimento.tp_logr', '')).strip()
-    nm_logr = str(row.get('estabelecimento.nm_logr', '')).strip()
-    nr_logr = str(row.get('estabelecimento.nr_logr', '')).strip()
-    bairro = str(row.get('estabelecimento.bairro', '')).strip()
-    uf = str(row.get('estabelecimento.uf', '')).strip()
-    
-    # Trata valores nulos ou strings 'nan'
-    tp_logr = "" if tp_logr.lower() == 'nan' else tp_logr
-    nm_logr = "" if nm_logr.lower() == 'nan' else nm_logr
-    nr_logr = "" if nr_logr.lower() == 'nan' else nr_logr
-    bairro = "" if bairro.lower() == 'nan' else bairro
-    uf = "" if uf.lower() == 'nan' else uf
-
-    # Monta padrão: "RUA NOME, NUMERO, BAIRRO, UF, BRASIL"
-    partes = []
-    rua = f"{tp_logr} {nm_logr}".strip()
-    
-    if rua: partes.append(rua)
-    if nr_logr: partes.append(nr_logr)
-    if bairro: partes.append(bairro)
-    if uf: partes.append(uf)
-    partes.append("BRASIL") # Ajuda o Nominatim a não se perder
-    
-    return ", ".join(partes).replace(" ,", ",")
+    return "estabelecimento." if "estabelecimento.cnpj" in colunas else ""
 
-def buscar_coordenadas(endereco):
-    """Faz a requisição na API do Nominatim."""
-    if not endereco or len(endereco) < 10:
-        return None, None
-        
-    params = {
-        "q": endereco,
-        "format": "jsonv2",
-        "addressdetails": 1,
-        "limit": 1,
+
+def _campo_limpo(coluna):
+    """Texto sem espaços nas pontas; vazio, 'nan' e 'None' viram nulo."""
+    limpo = pl.col(coluna).cast(pl.String).str.strip_chars()
+    return pl.when(limpo.str.to_lowercase().is_in(["", "nan", "none"])).then(None).otherwise(limpo)
+
+
+def expressao_endereco(colunas):
+    """Expressão Polars com o endereço de busca (a mesma string do antigo formatar_endereco por linha)."""
+    prefixo = prefixo_estabelecimento(colunas)
+    campos = {
+        c: _campo_limpo(prefixo + c) if prefixo + c in colunas else pl.lit(None, dtype=pl.String)
+        for c in CAMPOS_ENDERECO
     }
-    headers = {"User-Agent": USER_AGENT}
-    
-    try:
-        resposta = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=15)
-        if resposta.status_code == 200:
-            dados = resposta.json()
-            if isinstance(dados, list) and len(dados) > 0:
-                return str(dados[0].get("lat")), str(dados[0].get("lon"))
-    except Exception as e:
-        print(f"Erro na API ({endereco}): {e}")
-        
-    return None, None
+    rua = pl.concat_str([campos["tp_logr"], campos["nm_logr"]], separator=" ", ignore_nulls=True)
+    rua = pl.when(rua == "").then(None).otherwise(rua)
+    return (
+        pl.concat_str(
+            [rua, campos["nr_logr"], campos["bairro"], campos["uf"], pl.lit("BRASIL")],  # BRASIL ajuda o Nominatim a não se perder
+            separator=", ", ignore_nulls=True,
+        )
+        .str.replace_all(" ,", ",", literal=True)
+        .alias("endereco_busca")
+    )
+
+
+def ler_notas_recentes(bronze):
+    """
+    Notas do dia mais recente do bronze (menor_preco/ano_hive=/mes_hive=/dia_hive=). Lê só os
+    `arquivos_validos`: no meio de uma compactação não junta os lotes originais e os compactados.
+    Retorna (prefixo do dia, DataFrame), ou (None, None) se o bronze está vazio.
+    """
+    listados = bronze.listar(f"{PREFIXO_BRONZE}/")
+    dias = set()
+    for caminho in listados:
+        partes = caminho.split("/")
+        if len(partes) == 5 and partes[1].startswith("ano_hive="):
+            dias.add(tuple(int(p.split("=", 1)[1]) for p in partes[1:4]))
+    if not dias:
+        return None, None
+    prefixo = prefixo_dia(*max(dias))
+    arquivos = arquivos_validos(bronze, prefixo, [c for c in listados if c.startswith(prefixo)])
+    if not arquivos:
+        return prefixo, None
+    partes = [pl.read_parquet(io.BytesIO(bronze.ler(caminho))) for caminho in sorted(arquivos)]
+    return prefixo, pl.concat(partes, how="diagonal_relaxed")
+
+
+def extrair_lojas(df_notas):
+    """Uma linha por CNPJ (a primeira nota de cada loja) com a coluna endereco_busca."""
+    coluna_cnpj = prefixo_estabelecimento(df_notas.columns) + "cnpj"
+    return (
+        df_notas.lazy()
+        .filter(pl.col(coluna_cnpj).is_not_null())
+        .unique(subset=[coluna_cnpj], keep="first", maintain_order=True)
+        .with_columns(expressao_endereco(df_notas.columns))
+        .collect()
+    )
+
+
+def referencias_offline(df_notas, coluna_cnpj):
+    """
+    Por CNPJ: município/UF da loja e a busca (geohash_origem, distkm) em que ela apareceu mais
+    perto do centro, que é o que o nível offline usa para refinar a posição.
+    """
+    prefixo = prefixo_estabelecimento(df_notas.columns)
+    coluna = lambda nome, tipo: (pl.col(nome).cast(tipo) if nome in df_notas.columns else pl.lit(None, dtype=tipo)).alias(nome.removeprefix(prefixo))
+    return (
+        df_notas.lazy()
+        .select(
+            pl.col(coluna_cnpj).alias("cnpj"),
+            coluna(prefixo + "mun", pl.String), coluna(prefixo + "uf", pl.String),
+            coluna("geohash_origem", pl.String), coluna("distkm", pl.Float64),
+        )
+        .filter(pl.col("cnpj").is_not_null())
+        .sort("distkm", nulls_last=True)
+        .unique(subset=["cnpj"], keep="first")
+        .collect()
+    )
+
 
 def main():
     print("🚀 Iniciando Enriquecimento de Lojas (Nominatim)")
     
-    # 1. Encontra o arquivo parquet mais recente na pasta Bronze
-    arquivos = glob.glob(os.path.join(PASTA_BRONZE_NOTAS, "*.parquet"))
-    if not arquivos:
+    # 1. Notas do dia mais recente da Bronze (respeitando uma compactação em andamento)
+    bronze = obter_armazenamento(os.getenv("STORAGE_PROVIDER", "azure"), CONTAINER_BRONZE)
+    prefixo, df_notas = ler_notas_recentes(bronze)
+    if df_notas is None:
         print("❌ Nenhum arquivo de notas encontrado na Bronze para processar.")
         return
-        
-    arquivo_recente = max(arquivos, key=os.path.getmtime)
-    print(f"📦 Lendo arquivo: {arquivo_recente}")
-    
-    df_notas = pd.read_parquet(arquivo_recente)
+    print(f"📦 Lendo partição: {prefixo} ({df_notas.height} notas)")
     
     # Verifica se a coluna CNPJ existe (chave primária da loja)
-    coluna_cnpj = 'estabelecimento.cnpj'
+    coluna_cnpj = prefixo_estabelecimento(df_notas.columns) + "cnpj"
     if coluna_cnpj not in df_notas.columns:
         print(f"❌ Coluna {coluna_cnpj} não encontrada. Impossível extrair lojas.")
         return
 
-    # 2. Extrai apenas as lojas únicas do arquivo de notas
-    # Remove as duplicatas baseadas no CNPJ e pega a primeira ocorrência
-    df_lojas = df_notas.drop_duplicates(subset=[coluna_cnpj]).copy()
-    print(f"🏪 Encontradas {len(df_lojas)} lojas únicas. Formatando endereços...")
+    # 2 e 3. Lojas únicas (primeira nota de cada CNPJ) já com o endereço formatado, tudo em colunas
+    df_lojas = extrair_lojas(df_notas)
+    print(f"🏪 Encontradas {df_lojas.height} lojas únicas com endereço formatado.")
     
-    # 3. Cria a coluna de endereço formatado
-    df_lojas['endereco_busca'] = df_lojas.apply(formatar_endereco, axis=1)
-    
-    # Adicionando colunas vazias para preencher depois
-    df_lojas['latitude'] = None
-    df_lojas['longitude'] = None
-    
-    # 4. Loop batendo na API (com controle de tempo)
-    sucessos = 0
-    for index, row in df_lojas.iterrows():
-        endereco = row['endereco_busca']
-        cnpj = row[coluna_cnpj]
-        
-        print(f"Buscando [{cnpj}] -> {endereco}...", end=" ")
-        
-        lat, lon = buscar_coordenadas(endereco)
-        
-        if lat and lon:
-            df_lojas.at[index, 'latitude'] = lat
-            df_lojas.at[index, 'longitude'] = lon
-            sucessos += 1
-            print(f"✅ {lat}, {lon}")
-        else:
-            print("❌ Não encontrado")
-            
-        # OBRIGATÓRIO: A API do Nominatim bane IPs que fazem mais de 1 req por segundo
-        time.sleep(1.5)
-
-    # 5. Salvando o resultado na nova pasta
+    # 4. Nível offline para todas (centróide do município / ponto da busca), sem rede
+    df_offline = geocodificar_offline(referencias_offline(df_notas, coluna_cnpj), IndiceMunicipios())
+    df_offline = df_offline.rename({
+        "cnpj": coluna_cnpj, "latitude": "latitude_offline", "longitude": "longitude_offline", "precisao_geo": "precisao_offline",
+    })
+
+    # 5. Só endereço com rua vai para os provedores (sem ela o Nominatim não acha nada); o que está
+    # no cache nem sai da máquina. O resto é consultado em paralelo em todos os provedores de
+    # GEOCODE_PROVEDORES, cada um no seu limite de req/s (geocodificacao_provedores.py).
+    # As coordenadas vão para uma lista e entram no DataFrame de uma vez, num join pelo CNPJ
+    coordenadas = []
+    if GEOCODE_MODO != "offline":
+        prefixo = prefixo_estabelecimento(df_lojas.columns)
+        com_rua = df_lojas.filter(
+            _campo_limpo(prefixo + "nm_logr").is_not_null() & (pl.col("endereco_busca").str.len_chars() >= 10)
+        ) if prefixo + "nm_logr" in df_lojas.columns else df_lojas.clear()
+        cache = CacheGeocodificacao()
+        pendentes = []
+        for cnpj, endereco in com_rua.select([coluna_cnpj, "endereco_busca"]).iter_rows():
+            guardado = cache.buscar(cnpj, endereco)
+            if guardado is not None:
+                coordenadas.append((cnpj, guardado[0], guardado[1]))
+            else:
+                pendentes.append((cnpj, endereco))
+        print(cache.resumo())
+
+        if pendentes:
+            geocodificador = GeocodificadorConcorrente(criar_provedores())
+            print(f"🌐 {len(pendentes)} lojas com rua vão para {len(geocodificador.provedores)} provedor(es); "
+                  f"as outras ficam com a posição offline.")
+
+            def ao_resolver(cnpj, endereco, lat, lon, provedor):
+                cache.guardar(cnpj, endereco, lat, lon, fonte=provedor)
+                print(f"[{provedor}] {cnpj} -> {endereco}: " + (f"✅ {lat}, {lon}" if lat and lon else "❌ Não encontrado (fica com a posição offline)"))
+
+            resolvidas = geocodificador.geocodificar(pendentes, ao_resolver)
+            coordenadas.extend((cnpj, lat, lon) for cnpj, (lat, lon) in resolvidas.items())
+            print(geocodificador.resumo())
+        cache.fechar()
+
+    df_coordenadas = pl.DataFrame(
+        coordenadas, schema={coluna_cnpj: df_lojas.schema[coluna_cnpj], "latitude": pl.String, "longitude": pl.String},
+        orient="row",
+    )
+    df_lojas = (
+        df_lojas.join(df_coordenadas, on=coluna_cnpj, how="left")
+        .join(df_offline, on=coluna_cnpj, how="left")
+        .with_columns(
+            pl.when(pl.col("latitude").is_not_null()).then(pl.lit("endereco")).otherwise(pl.col("precisao_offline")).alias("precisao_geo"),
+            pl.coalesce("latitude", "latitude_offline").alias("latitude"),
+            pl.coalesce("longitude", "longitude_offline").alias("longitude"),
+        )
+        .drop(["latitude_offline", "longitude_offline", "precisao_offline"])
+    )
+    sucessos = df_lojas.select(pl.col("latitude").is_not_null().sum()).item()
+    precisoes = dict(df_lojas.get_column("precisao_geo").value_counts().iter_rows())
+
+    # 6. Salvando o resultado na nova pasta
     os.makedirs(PASTA_BRONZE_LOJAS, exist_ok=True)
     hoje = datetime.now().strftime("%Y%m%d_%H%M%S")
     caminho_salvar = os.path.join(PASTA_BRONZE_LOJAS, f"lojas_raw_{hoje}.parquet")
     
-    # Salva garantindo que é tudo string (VARCHAR)
-    df_lojas = df_lojas.astype(str)
-    df_lojas.to_parquet(caminho_salvar, index=False)
+    # Salva garantindo que é tudo string (VARCHAR); vazio continua nulo. A lista de termos que a
+    # busca atendia (termos_origem) vira texto separado por "|"
+    if "termos_origem" in df_lojas.columns:
+        df_lojas = df_lojas.with_columns(pl.col("termos_origem").list.join("|"))
+    df_lojas = df_lojas.with_columns(pl.all().cast(pl.String))
+    df_lojas.write_parquet(caminho_salvar)
     
     print("\n" + "="*50)
     print(f"🏁 Processamento finalizado!")
-    print(f"📊 Lojas com coordenadas encontradas: {sucessos}/{len(df_lojas)}")
+    print(f"📊 Lojas com coordenadas encontradas: {sucessos}/{df_lojas.height} "
+          f"(endereço: {precisoes.get('endereco', 0)}, origem da busca: {precisoes.get('origem_busca', 0)}, "
+          f"município: {precisoes.get('municipio', 0)}, região: {precisoes.get('regiao', 0)})")
     print(f"💾 Arquivo salvo em: {caminho_salvar}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
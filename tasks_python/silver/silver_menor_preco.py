@@ -0,0 +1,209 @@
+import io
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+import polars as pl
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIRETORIO_SCRIPT, '..', 'bronze'))
+
+from armazenamento import obter_armazenamento
+from compactar_bronze import arquivos_validos, ARQUIVO_DIARIO, PREFIXO_BRONZE
+
+# --- CAMADA SILVER: NOTAS TIPADAS, INCREMENTAL POR PARTIÇÃO ---
+# O bronze guarda as notas como vieram da API: preços e data em texto, CNPJ às vezes sem os zeros
+# à esquerda, colunas vazias em vez de nulas. Esta etapa lê o bronze (menor_preco/ano_hive=/
+# mes_hive=/dia_hive=) e grava no container 'silver' a mesma árvore com uma tabela tipada por dia.
+#
+#   - A leitura é um `pl.scan_parquet` preguiçoso direto nos arquivos do destino (ver
+#     `Armazenamento.fonte_scan`): só as COLUNAS_BRONZE são lidas e os filtros descem para o
+#     leitor do Parquet. A memória não tem URI, então lá os bytes são lidos e o resto segue lazy.
+#     Um scan por arquivo, juntos com concat diagonal: o scan de uma lista usa o esquema do
+#     primeiro arquivo e descartaria colunas que só os lotes mais novos têm (termos_origem).
+#   - Só as partições novas ou alteradas são processadas. O manifesto (`_manifesto/menor_preco.json`
+#     no container silver) guarda, por partição, a lista de arquivos do bronze que geraram a tabela;
+#     se a lista mudou (lote novo, compactação), a partição é refeita inteira. O custo de cada
+#     execução acompanha o volume do dia, não o histórico todo.
+#   - Mudou a transformação? Suba VERSAO_TRANSFORMACAO e todas as partições são refeitas.
+#
+#   python tasks_python/silver/silver_menor_preco.py             # partições novas/alteradas
+#   python tasks_python/silver/silver_menor_preco.py --refazer   # todas
+
+CONTAINER_SILVER = os.getenv("CONTAINER_SILVER", "silver")
+CONTAINER_BRONZE = os.getenv("CONTAINER_BRONZE", "bronze")
+ARQUIVO_MANIFESTO = "_manifesto/menor_preco.json"
+NOME_TABELA = "notas.parquet"
+VERSAO_TRANSFORMACAO = 2
+
+# Colunas lidas do bronze (o resto nem sai do arquivo)
+COLUNAS_BRONZE = [
+    "id", "desc", "valor", "valor_desconto", "valor_tabela", "datahora", "distkm", "gtin", "ncm",
+    "cnpj", "nm_emp", "nm_fan", "tp_logr", "nm_logr", "nr_logr", "complemento", "bairro", "mun", "uf",
+    "termo_origem", "termos_origem", "cidade_origem", "geohash_origem",
+]
+COLUNAS_TEXTO = ["desc", "nm_emp", "nm_fan", "tp_logr", "nm_logr", "nr_logr", "complemento", "bairro", "mun"]
+
+log = logging.getLogger("silver")
+
+
+def _texto(coluna):
+    """Sem espaços nas pontas e vazio vira nulo."""
+    limpo = pl.col(coluna).str.strip_chars()
+    return pl.when(limpo == "").then(None).otherwise(limpo).alias(coluna)
+
+
+def _preco(coluna):
+    # A API manda "12.34"; aceita "12,34" por garantia
+    return pl.col(coluna).str.replace(",", ".", literal=True).cast(pl.Float64, strict=False).alias(coluna)
+
+
+def transformar(lf):
+    """Bronze (LazyFrame) → silver tipado. Tudo lazy: o plano inteiro é otimizado no collect."""
+    return (
+        lf.filter(pl.col("id").is_not_null())
+        .with_columns(
+            [_texto(c) for c in COLUNAS_TEXTO]
+            + [_preco(c) for c in ("valor", "valor_desconto", "valor_tabela")]
+            + [
+                pl.col("datahora").str.to_datetime("%Y-%m-%dT%H:%M:%S%.fZ", strict=False, time_zone="UTC"),
+                pl.col("distkm").cast(pl.Float64, strict=False),
+                pl.col("cnpj").str.replace_all(r"\D", "").str.zfill(14),
+                pl.col("gtin").str.strip_chars().str.replace(r"^0*$", ""),
+                pl.col("ncm").str.strip_chars(),
+                pl.col("uf").str.strip_chars().str.to_uppercase(),
+                pl.date(pl.col("ano_hive"), pl.col("mes_hive"), pl.col("dia_hive")).alias("data_coleta"),
+            ]
+        )
+        .with_columns(
+            pl.when(pl.col("gtin") == "").then(None).otherwise(pl.col("gtin")).alias("gtin"),
+            # Lote de antes da lista: a busca servia só ao próprio termo
+            pl.coalesce(pl.col("termos_origem"), pl.concat_list(pl.col("termo_origem"))).alias("termos_origem"),
+        )
+        .filter(pl.col("valor") > 0)
+        .unique(subset=["id"], keep="first", maintain_order=True)
+        .with_columns(pl.col(["termo_origem", "cidade_origem", "geohash_origem", "uf"]).cast(pl.Categorical))
+        .select(["data_coleta", *COLUNAS_BRONZE])
+        .sort(["cidade_origem", "termo_origem", "id"])
+    )
+
+
+def particoes_bronze(caminhos):
+    """{(ano, mes, dia): [caminhos]} a partir da listagem do bronze."""
+    particoes = {}
+    for caminho in caminhos:
+        partes = caminho.split("/")
+        if len(partes) != 5 or not partes[1].startswith("ano_hive="):
+            continue
+        ano, mes, dia = (int(p.split("=", 1)[1]) for p in partes[1:4])
+        particoes.setdefault((ano, mes, dia), []).append(caminho)
+    return particoes
+
+
+def chave_particao(ano, mes, dia):
+    return f"ano_hive={ano}/mes_hive={mes:02d}/dia_hive={dia:02d}"
+
+
+def _esquema_hive():
+    return {"ano_hive": pl.Int32, "mes_hive": pl.Int32, "dia_hive": pl.Int32}
+
+
+def escanear(bronze, arquivos):
+    """LazyFrame dos arquivos do bronze com as colunas de partição (hive) e as COLUNAS_BRONZE."""
+    fonte = bronze.fonte_scan(arquivos)
+    if fonte is None:
+        scans = [pl.read_parquet(io.BytesIO(bronze.ler(caminho))).lazy() for caminho in arquivos]
+    else:
+        uris, opcoes = fonte
+        scans = [pl.scan_parquet(uri, storage_options=opcoes) for uri in uris]
+    partes = []
+    for caminho, lf in zip(arquivos, scans):
+        valores = dict(p.split("=", 1) for p in caminho.split("/")[1:4])
+        partes.append(lf.with_columns(pl.lit(int(valores[k]), dtype=tipo).alias(k) for k, tipo in _esquema_hive().items()))
+    lf = pl.concat(partes, how="diagonal_relaxed")
+    # Lote antigo sem alguma coluna: entra nula (a tabela silver tem sempre o mesmo esquema)
+    faltando = [c for c in COLUNAS_BRONZE if c not in lf.collect_schema().names()]
+    return lf.with_columns(
+        pl.lit(None, dtype=pl.List(pl.String) if c == "termos_origem" else pl.String).alias(c) for c in faltando
+    )
+
+
+class Manifesto:
+    """Partições já processadas: {chave: {"arquivos": [...], "versao": n, "linhas": n, "em": iso}}."""
+
+    def __init__(self, silver):
+        self.silver = silver
+        self.particoes = {}
+        if ARQUIVO_MANIFESTO in silver.listar(ARQUIVO_MANIFESTO):
+            self.particoes = json.loads(silver.ler(ARQUIVO_MANIFESTO))["particoes"]
+
+    def alterada(self, chave, arquivos):
+        anterior = self.particoes.get(chave)
+        return anterior is None or anterior["versao"] != VERSAO_TRANSFORMACAO or anterior["arquivos"] != arquivos
+
+    def registrar(self, chave, arquivos, linhas):
+        self.particoes[chave] = {
+            "arquivos": arquivos,
+            "versao": VERSAO_TRANSFORMACAO,
+            "linhas": linhas,
+            "em": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def salvar(self):
+        # Depois de cada partição: se cair no meio, o que já subiu não é refeito
+        dados = json.dumps({"particoes": self.particoes}, indent=1, sort_keys=True).encode()
+        self.silver.enviar(dados, ARQUIVO_MANIFESTO)
+
+
+def processar_particao(bronze, silver, ano, mes, dia, arquivos):
+    df = transformar(escanear(bronze, arquivos)).collect()
+    buffer = io.BytesIO()
+    df.write_parquet(buffer, compression="zstd", statistics=True, row_group_size=131072)
+    silver.enviar(buffer.getvalue(), f"{PREFIXO_BRONZE}/{chave_particao(ano, mes, dia)}/{NOME_TABELA}")
+    return df.height
+
+
+def executar(bronze, silver, refazer=False):
+    """Processa as partições novas/alteradas. Retorna (processadas, puladas, linhas)."""
+    manifesto = Manifesto(silver)
+    listagem = particoes_bronze(bronze.listar(f"{PREFIXO_BRONZE}/"))
+    processadas = puladas = linhas = 0
+    for (ano, mes, dia), caminhos in sorted(listagem.items()):
+        chave = chave_particao(ano, mes, dia)
+        prefixo = f"{PREFIXO_BRONZE}/{chave}/"
+        arquivos = sorted(arquivos_validos(bronze, prefixo, caminhos))
+        if not arquivos or (not refazer and not manifesto.alterada(chave, arquivos)):
+            puladas += 1
+            continue
+        if prefixo + ARQUIVO_DIARIO in caminhos:
+            log.info(f"⏳ {chave}: compactação em andamento, lendo os arquivos válidos agora")
+        qtd = processar_particao(bronze, silver, ano, mes, dia, arquivos)
+        manifesto.registrar(chave, arquivos, qtd)
+        manifesto.salvar()
+        processadas += 1
+        linhas += qtd
+        log.info(f"🥈 {chave}: {len(arquivos)} arquivos do bronze → {qtd} notas", extra={"campos": {"particao": chave, "notas": qtd}})
+    return processadas, puladas, linhas
+
+
+def main():
+    from dotenv import load_dotenv
+    from telemetria import configurar_log, descarregar_log
+
+    load_dotenv()
+    configurar_log("silver")
+    configurar_log("bronze")  # avisos da compactação (troca interrompida) no mesmo log
+    provedor = os.getenv("STORAGE_PROVIDER", "azure")
+    bronze = obter_armazenamento(provedor, CONTAINER_BRONZE)
+    silver = obter_armazenamento(provedor, CONTAINER_SILVER)
+
+    inicio = datetime.now()
+    processadas, puladas, linhas = executar(bronze, silver, refazer="--refazer" in sys.argv)
+    segundos = (datetime.now() - inicio).total_seconds()
+    log.info(f"✅ Silver: {processadas} partições processadas ({linhas} notas), {puladas} sem mudança, em {segundos:.1f}s")
+    descarregar_log()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tasks_python", "bronze"))
+
+import marcas_incrementais
+from marcas_incrementais import MarcasIncrementais
+
+MARCA = "2026-10-10T12:00:00.000Z"
+
+
+def pagina(dias, inicio=0):
+    """Página da API com uma nota por dia de outubro (na ordem dada)."""
+    return pl.DataFrame({
+        "id": [str(inicio + i) for i in range(len(dias))],
+        "datahora": [f"2026-10-{d:02d}T08:00:00.000Z" for d in dias],
+    })
+
+
+def paginar(parar, paginas):
+    """Imita a extração: entrega página a página até o critério pedir para parar."""
+    lidas = []
+    for dados in paginas:
+        lidas.append(dados)
+        if parar(dados):
+            break
+    return pl.concat(lidas)
+
+
+def marcas_com(tmp_path, buscas):
+    marcas = MarcasIncrementais(caminho=str(tmp_path / "marcas.parquet"))
+    for busca in buscas:
+        marcas.marcas[(busca, "6gkz")] = MARCA
+    return marcas
+
+
+def test_notas_novas_intercaladas_entre_paginas_nao_sao_perdidas(tmp_path):
+    # Cada página isolada parece ordenada, mas a segunda traz notas mais novas que a marca
+    marcas = marcas_com(tmp_path, ["ARROZ 5KG"])
+    paginas = [pagina([9] * 50), pagina([20] * 10 + [5] * 40, inicio=50), pagina([3] * 20, inicio=100)]
+
+    notas = paginar(marcas.criterio_parada("ARROZ 5KG", "6gkz"), paginas)
+
+    assert notas.height == 120
+    assert marcas.paradas_antecipadas == 0
+    assert marcas.fora_de_ordem
+
+
+def test_api_fora_de_ordem_nunca_para(tmp_path, monkeypatch):
+    monkeypatch.setattr(marcas_incrementais, "CONFIRMACOES_ORDEM", 0)
+    marcas = marcas_com(tmp_path, ["CAFE 500G"])
+    # Primeira página toda antiga, mas sem ordem: a nova (dia 25) está na página seguinte
+    paginas = [pagina([3, 8, 1, 9, 2] * 10), pagina([25] + [4] * 49, inicio=50)]
+
+    notas = paginar(marcas.criterio_parada("CAFE 500G", "6gkz"), paginas)
+
+    assert notas.height == 100
+    assert marcas.paradas_antecipadas == 0
+
+
+def test_para_na_pagina_antiga_depois_de_confirmar_a_ordem(tmp_path, monkeypatch):
+    monkeypatch.setattr(marcas_incrementais, "CONFIRMACOES_ORDEM", 2)
+    marcas = marcas_com(tmp_path, ["LEITE 1L", "OVOS DUZIA"])
+    # Buscas sem nada antigo mostram que a API vem da mais nova para a mais antiga
+    paginar(marcas.criterio_parada("LEITE 1L", "6gkz"), [pagina([28] * 50), pagina([27] * 50, 50), pagina([26] * 50, 100)])
+    assert marcas.ordem_confirmada()
+
+    paginas = [pagina([15] * 50), pagina([12] * 10 + [9] * 40, 50), pagina([8] * 50, 100), pagina([7] * 50, 150)]
+    notas = paginar(marcas.criterio_parada("OVOS DUZIA", "6gkz"), paginas)
+
+    # A segunda página ainda tem notas novas; a terceira é toda antiga e encerra a busca
+    assert notas.height == 150
+    assert marcas.paradas_antecipadas == 1